@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+PFP压测机Agent
+
+在压测机上常驻运行，与平台后端保持一条WebSocket长连接：
+- 定期推送资源样本（基于/proc的差值计算，无需top/sar等工具）
+- 推送正在运行的Locust压测的实时统计
+- 接收并执行启动/停止/取结果命令
+
+用法:
+    python3 pfp_agent.py --server ws://platform:8000/api/v1/agents/ws/<压测机ID> --token <AGENT_TOKEN>
+
+加--simulate时不读取/proc、不启动Locust，推送合成的资源样本与统计并直接确认启动/停止命令，
+用于在没有真实压测机的环境（本地开发、测试）中联调后端。
+
+依赖: websockets（见同目录requirements.txt）
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import signal
+import socket
+import subprocess
+import time
+
+import websockets
+
+logger = logging.getLogger("pfp_agent")
+
+# 脚本与结果文件位置，与后端SSH模式保持一致
+WORK_DIR = "/tmp"
+
+
+def read_cpu_times():
+    """读取/proc/stat，返回{cpu名: (空闲, 总计)}"""
+    times = {}
+    with open("/proc/stat") as f:
+        for line in f:
+            if not line.startswith("cpu"):
+                break
+            fields = line.split()
+            values = [int(value) for value in fields[1:]]
+            idle = values[3] + (values[4] if len(values) > 4 else 0)
+            times[fields[0]] = (idle, sum(values))
+    return times
+
+
+def read_net_counters():
+    """读取/proc/net/dev，返回{网卡: (接收字节, 发送字节)}（不含回环）"""
+    counters = {}
+    with open("/proc/net/dev") as f:
+        for line in f.readlines()[2:]:
+            name, _, data = line.partition(":")
+            name = name.strip()
+            if name == "lo":
+                continue
+            fields = data.split()
+            counters[name] = (int(fields[0]), int(fields[8]))
+    return counters
+
+
+def read_link_speed(name):
+    """网卡线速(Mbps)，虚拟网卡等无法识别时返回None"""
+    try:
+        with open(f"/sys/class/net/{name}/speed") as f:
+            speed = int(f.read().strip())
+        return speed if speed > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def read_memory_usage():
+    """读取/proc/meminfo，返回内存使用率(%)"""
+    meminfo = {}
+    with open("/proc/meminfo") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            try:
+                meminfo[key] = int(value.split()[0])
+            except (ValueError, IndexError):
+                pass
+    total = meminfo.get("MemTotal", 0)
+    available = meminfo.get("MemAvailable", meminfo.get("MemFree", 0))
+    return round((total - available) / total * 100, 2) if total else 0.0
+
+
+class ResourceSampler:
+    """基于相邻两次读数的差值计算资源使用率（与后端RESOURCE_PROBE输出格式一致）"""
+
+    def __init__(self):
+        self._cpu = read_cpu_times()
+        self._net = read_net_counters()
+        self._at = time.monotonic()
+
+    def sample(self):
+        cpu = read_cpu_times()
+        net = read_net_counters()
+        now = time.monotonic()
+        elapsed = max(now - self._at, 1e-6)
+
+        usage = {}
+        for name, (idle, total) in cpu.items():
+            prev_idle, prev_total = self._cpu.get(name, (idle, total))
+            delta_total = total - prev_total
+            usage[name] = round((1 - (idle - prev_idle) / delta_total) * 100, 1) if delta_total > 0 else 0.0
+
+        interfaces = []
+        for name, (rx, tx) in sorted(net.items()):
+            prev_rx, prev_tx = self._net.get(name, (rx, tx))
+            rx_mbps = max(rx - prev_rx, 0) * 8 / elapsed / 1000000
+            tx_mbps = max(tx - prev_tx, 0) * 8 / elapsed / 1000000
+            speed = read_link_speed(name)
+            interfaces.append({
+                "name": name,
+                "rx_mbps": round(rx_mbps, 3),
+                "tx_mbps": round(tx_mbps, 3),
+                "speed_mbps": speed,
+                "utilization": round(max(rx_mbps, tx_mbps) / speed * 100, 2) if speed else None
+            })
+        utilizations = [item["utilization"] for item in interfaces if item["utilization"] is not None]
+
+        self._cpu, self._net, self._at = cpu, net, now
+        return {
+            "cpu_usage": usage.pop("cpu", 0.0),
+            "cpu_per_core": [usage[name] for name in sorted(usage, key=lambda n: int(n[3:]))],
+            "memory_usage": read_memory_usage(),
+            "network_usage": max(utilizations) if utilizations else 0.0,
+            "network_mbps": round(sum(item["rx_mbps"] + item["tx_mbps"] for item in interfaces), 3),
+            "interfaces": interfaces
+        }
+
+
+def read_aggregated_stats(stats_csv):
+    """读取Locust统计CSV中的Aggregated行"""
+    try:
+        with open(stats_csv) as f:
+            for row in csv.DictReader(f):
+                if row.get("Name") == "Aggregated":
+                    return row
+    except (OSError, csv.Error):
+        pass
+    return None
+
+
+def raise_nofile_limit():
+    """将文件句柄软限制提升到硬限制（在Locust子进程中执行）"""
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def to_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class LocustRun:
+    """Agent启动的一次Locust压测"""
+
+    def __init__(self, execution_id, process):
+        self.execution_id = execution_id
+        self.process = process
+        self.csv_prefix = os.path.join(WORK_DIR, f"locust_results_{execution_id}")
+
+    @property
+    def stats_csv(self):
+        return f"{self.csv_prefix}_stats.csv"
+
+    def is_running(self):
+        return self.process.poll() is None
+
+    def live_stats(self):
+        """当前聚合统计"""
+        row = read_aggregated_stats(self.stats_csv) or {}
+        return {
+            "execution_id": self.execution_id,
+            "finished": not self.is_running(),
+            "total_requests": int(to_number(row.get("Request Count"))),
+            "failed_requests": int(to_number(row.get("Failure Count"))),
+            "avg_response_time": to_number(row.get("Average Response Time")),
+            "min_response_time": to_number(row.get("Min Response Time")),
+            "max_response_time": to_number(row.get("Max Response Time")),
+            "requests_per_second": to_number(row.get("Requests/s")),
+            "p95_response_time": to_number(row.get("95%")),
+            "p99_response_time": to_number(row.get("99%"))
+        }
+
+
+class SimulatedSampler:
+    """模拟模式下的资源采样：生成与ResourceSampler格式一致的合成样本"""
+
+    def __init__(self, runs):
+        self.runs = runs
+        self.cores = os.cpu_count() or 1
+
+    def sample(self):
+        # 有模拟压测在运行时抬高负载，便于观察后端的饱和度判断
+        base = 60.0 if any(run.is_running() for run in self.runs.values()) else 5.0
+        per_core = [round(min(base + random.uniform(-5, 15), 100.0), 1) for _ in range(self.cores)]
+        rx_mbps = round(base * random.uniform(1.5, 2.5), 3)
+        tx_mbps = round(base * random.uniform(0.5, 1.0), 3)
+        return {
+            "cpu_usage": round(sum(per_core) / len(per_core), 1),
+            "cpu_per_core": per_core,
+            "memory_usage": round(30.0 + random.uniform(0, 10), 2),
+            "network_usage": round(max(rx_mbps, tx_mbps) / 10000 * 100, 2),
+            "network_mbps": round(rx_mbps + tx_mbps, 3),
+            "interfaces": [{
+                "name": "eth0",
+                "rx_mbps": rx_mbps,
+                "tx_mbps": tx_mbps,
+                "speed_mbps": 10000,
+                "utilization": round(max(rx_mbps, tx_mbps) / 10000 * 100, 2)
+            }]
+        }
+
+
+class SimulatedLocustRun:
+    """模拟模式下的一次压测：按运行时长与并发用户数生成合成统计，不启动Locust"""
+
+    # 每个用户每秒的合成请求数与失败率
+    RPS_PER_USER = 2.0
+    FAILURE_RATE = 0.01
+
+    def __init__(self, execution_id, payload):
+        self.execution_id = execution_id
+        self.users = int(payload.get("users") or 1)
+        self.run_time = float(payload.get("run_time") or 0)
+        self.started_at = time.monotonic()
+        self.stopped_at = None
+
+    def stop(self):
+        if self.stopped_at is None:
+            self.stopped_at = time.monotonic()
+
+    def elapsed(self):
+        end = self.stopped_at if self.stopped_at is not None else time.monotonic()
+        elapsed = end - self.started_at
+        return min(elapsed, self.run_time) if self.run_time > 0 else elapsed
+
+    def is_running(self):
+        return self.stopped_at is None and (self.run_time <= 0 or self.elapsed() < self.run_time)
+
+    def live_stats(self):
+        """当前合成的聚合统计（字段与LocustRun.live_stats一致）"""
+        elapsed = self.elapsed()
+        rps = self.users * self.RPS_PER_USER if elapsed > 0 else 0.0
+        total = int(rps * elapsed)
+        return {
+            "execution_id": self.execution_id,
+            "finished": not self.is_running(),
+            "total_requests": total,
+            "failed_requests": int(total * self.FAILURE_RATE),
+            "avg_response_time": 50.0,
+            "min_response_time": 5.0 if total else 0.0,
+            "max_response_time": 500.0 if total else 0.0,
+            "requests_per_second": round(rps, 2),
+            "p95_response_time": 120.0 if total else 0.0,
+            "p99_response_time": 250.0 if total else 0.0
+        }
+
+    def stats_csv(self):
+        """按Locust统计CSV格式输出Aggregated行"""
+        stats = self.live_stats()
+        header = [
+            "Type", "Name", "Request Count", "Failure Count", "Median Response Time",
+            "Average Response Time", "Min Response Time", "Max Response Time",
+            "Requests/s", "95%", "99%"
+        ]
+        row = [
+            "", "Aggregated", stats["total_requests"], stats["failed_requests"], 45,
+            stats["avg_response_time"], stats["min_response_time"], stats["max_response_time"],
+            stats["requests_per_second"], stats["p95_response_time"], stats["p99_response_time"]
+        ]
+        return ",".join(header) + "\n" + ",".join(str(value) for value in row) + "\n"
+
+
+class Agent:
+    """Agent主体：维护连接、推送样本、处理命令"""
+
+    def __init__(self, server, token=None, interval=5.0, simulate=False):
+        self.server = server
+        self.token = token
+        self.interval = interval
+        self.simulate = simulate
+        self.runs = {}
+        # 模拟模式下保留已结束的压测以便取结果
+        self.simulated_runs = {}
+        self.sampler = SimulatedSampler(self.runs) if simulate else ResourceSampler()
+
+    @property
+    def url(self):
+        if not self.token:
+            return self.server
+        separator = "&" if "?" in self.server else "?"
+        return f"{self.server}{separator}token={self.token}"
+
+    async def run_forever(self):
+        """保持连接，断开后指数退避重连"""
+        backoff = 1
+        while True:
+            try:
+                async with websockets.connect(self.url, ping_interval=20) as websocket:
+                    backoff = 1
+                    logger.info("Connected to %s", self.server)
+                    await self.serve(websocket)
+            except (OSError, websockets.WebSocketException) as e:
+                logger.warning("Connection lost: %s, retrying in %ss", e, backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+    async def serve(self, websocket):
+        await self.send(websocket, "hello", {
+            "hostname": socket.gethostname(),
+            "python_version": platform.python_version(),
+            "pid": os.getpid(),
+            "simulated": self.simulate
+        })
+        pusher = asyncio.ensure_future(self.push_loop(websocket))
+        try:
+            async for raw in websocket:
+                message = json.loads(raw)
+                if message.get("type") == "command":
+                    result = await self.handle_command(message.get("command"), message.get("payload") or {})
+                    await self.send_raw(websocket, {"type": "command_result", "id": message.get("id"), "result": result})
+        finally:
+            pusher.cancel()
+
+    async def push_loop(self, websocket):
+        """定期推送资源样本与Locust统计"""
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.send(websocket, "sample", self.sampler.sample())
+            for execution_id, locust_run in list(self.runs.items()):
+                await self.send(websocket, "locust_stats", locust_run.live_stats())
+                if not locust_run.is_running():
+                    self.runs.pop(execution_id, None)
+
+    async def send(self, websocket, message_type, data):
+        await self.send_raw(websocket, {"type": message_type, "data": data})
+
+    async def send_raw(self, websocket, message):
+        await websocket.send(json.dumps(message))
+
+    async def handle_command(self, command, payload):
+        """执行后端下发的命令"""
+        try:
+            if command == "start":
+                return self.start_locust(payload)
+            if command == "stop":
+                return self.stop_locust(payload["execution_id"])
+            if command == "results":
+                return self.read_results(payload["execution_id"])
+            if command == "ping":
+                return {"success": True, "message": "pong"}
+            return {"success": False, "message": f"Unknown command: {command}"}
+        except Exception as e:
+            logger.exception("Command %s failed", command)
+            return {"success": False, "message": str(e)}
+
+    def start_locust(self, payload):
+        execution_id = payload["execution_id"]
+        if self.simulate:
+            locust_run = SimulatedLocustRun(execution_id, payload)
+            self.runs[execution_id] = locust_run
+            self.simulated_runs[execution_id] = locust_run
+            logger.info("Simulated Locust run %s started (%s users)", execution_id, locust_run.users)
+            return {"success": True, "message": "Locust started (simulated)", "pid": None}
+
+        script_path = os.path.join(WORK_DIR, f"locust_script_{execution_id}.py")
+        with open(script_path, "w") as f:
+            f.write(payload["script_content"])
+
+        csv_prefix = os.path.join(WORK_DIR, f"locust_results_{execution_id}")
+        command = [
+            payload.get("locust_bin") or "locust", "-f", script_path,
+            "--host", payload["host"],
+            "--users", str(payload["users"]),
+            "--spawn-rate", str(payload["spawn_rate"]),
+            "--run-time", f"{payload['run_time']}s",
+            "--headless",
+            "--csv", csv_prefix,
+            "--html", f"{csv_prefix}.html"
+        ]
+        if int(payload.get("processes") or 1) > 1:
+            command += ["--processes", str(payload["processes"])]
+        log_file = open(os.path.join(WORK_DIR, f"locust_{execution_id}.log"), "w")
+        process = subprocess.Popen(
+            command, stdout=log_file, stderr=subprocess.STDOUT, cwd=WORK_DIR, preexec_fn=raise_nofile_limit
+        )
+        log_file.close()
+        self.runs[execution_id] = LocustRun(execution_id, process)
+        return {"success": True, "message": "Locust started", "pid": process.pid}
+
+    def stop_locust(self, execution_id):
+        locust_run = self.runs.get(execution_id)
+        if locust_run is None or not locust_run.is_running():
+            return {"success": True, "message": "Locust not running"}
+        if self.simulate:
+            locust_run.stop()
+            return {"success": True, "message": "Locust stopping (simulated)"}
+        # SIGINT让Locust写出最终统计
+        locust_run.process.send_signal(signal.SIGINT)
+        return {"success": True, "message": "Locust stopping"}
+
+    def read_results(self, execution_id):
+        if self.simulate:
+            locust_run = self.simulated_runs.get(execution_id)
+            if locust_run is None:
+                return {"success": False, "message": f"Simulated run not found: {execution_id}"}
+            return {"success": True, "message": "ok", "stats_csv": locust_run.stats_csv()}
+        stats_csv = os.path.join(WORK_DIR, f"locust_results_{execution_id}_stats.csv")
+        if not os.path.exists(stats_csv):
+            return {"success": False, "message": f"Results file not found: {stats_csv}"}
+        with open(stats_csv) as f:
+            return {"success": True, "message": "ok", "stats_csv": f.read()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PFP压测机Agent")
+    parser.add_argument("--server", required=True, help="后端Agent地址，如 ws://host:8000/api/v1/agents/ws/1")
+    parser.add_argument("--token", default=os.environ.get("PFP_AGENT_TOKEN"), help="Agent认证令牌")
+    parser.add_argument("--interval", type=float, default=5.0, help="资源样本推送间隔(秒)")
+    parser.add_argument("--simulate", action="store_true", help="模拟模式：推送合成数据，不启动Locust")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    agent = Agent(args.server, token=args.token, interval=args.interval, simulate=args.simulate)
+    try:
+        asyncio.run(agent.run_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+压测机Agent API端点
+"""
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from typing import Optional
+from ....core.config import settings
+from ....core.database import SessionLocal
+from ....models.load_generator import LoadGenerator
+from ....services.agent_service import agent_registry, AgentSession
+
+router = APIRouter()
+
+
+@router.websocket("/ws/{load_generator_id}")
+async def agent_websocket(
+    websocket: WebSocket,
+    load_generator_id: int,
+    token: Optional[str] = None
+):
+    """Agent长连接：接收资源样本、Locust统计和命令结果，下发启动/停止命令"""
+    if settings.AGENT_TOKEN and token != settings.AGENT_TOKEN:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    db = SessionLocal()
+    try:
+        exists = db.query(LoadGenerator.id).filter(
+            LoadGenerator.id == load_generator_id,
+            LoadGenerator.is_active == True
+        ).first()
+    finally:
+        db.close()
+    if not exists:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    
+    # 第一条消息为Agent自我介绍
+    hello = await websocket.receive_json()
+    session = AgentSession(load_generator_id, websocket, hello.get("data") if hello.get("type") == "hello" else None)
+    await agent_registry.register(session)
+    
+    try:
+        while True:
+            message = await websocket.receive_json()
+            await agent_registry.handle_message(session, message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await agent_registry.unregister(session)
+
+
+@router.get("/")
+async def get_agents():
+    """获取当前连接的Agent列表（包括连接在其他API进程中的Agent）"""
+    return await agent_registry.list_sessions()
+
+
+@router.get("/{load_generator_id}/")
+async def get_agent(load_generator_id: int):
+    """获取单个Agent状态"""
+    info = await agent_registry.get_info(load_generator_id)
+    if not info:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Agent not connected"
+        )
+    return info
+
+
+@router.get("/{load_generator_id}/executions/{execution_id}/stats")
+async def get_agent_locust_stats(load_generator_id: int, execution_id: int):
+    """获取Agent推送的Locust实时统计"""
+    stats = await agent_registry.locust_stats(load_generator_id, execution_id)
+    if stats is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No live stats for this execution"
+        )
+    return stats
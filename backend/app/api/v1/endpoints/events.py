@@ -0,0 +1,56 @@
+"""
+状态变更事件推送API（Server-Sent Events）
+"""
+import json
+import logging
+from typing import Optional
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from ....core.config import settings
+from ....core.redis import redis_client
+from ....services.event_bus import EVENT_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/stream")
+async def stream_events(request: Request, types: Optional[str] = None):
+    """
+    订阅状态变更事件
+    
+    事件类型：load_generator.status（压测机状态变化）、execution.status（执行状态转换）。
+    types为逗号分隔的事件类型，为空时推送全部事件。
+    """
+    wanted = {item.strip() for item in types.split(",") if item.strip()} if types else None
+    redis = await redis_client.get_redis()
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(EVENT_CHANNEL)
+    
+    async def event_stream():
+        try:
+            yield f"retry: {settings.EVENT_STREAM_RETRY_MS}\n\n"
+            while not await request.is_disconnected():
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=settings.EVENT_STREAM_KEEPALIVE_SECONDS
+                )
+                if message is None:
+                    # 保持连接，防止代理因空闲断开
+                    yield ": keepalive\n\n"
+                    continue
+                event_type = json.loads(message["data"]).get("type")
+                if wanted and event_type not in wanted:
+                    continue
+                yield f"event: {event_type}\ndata: {message['data']}\n\n"
+        except Exception as e:
+            logger.warning(f"Event stream closed: {str(e)}")
+        finally:
+            await pubsub.unsubscribe(EVENT_CHANNEL)
+            await pubsub.close()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
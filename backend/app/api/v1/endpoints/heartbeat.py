@@ -1,10 +1,15 @@
 """
 心跳检测API端点
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from ....core.config import settings
 from ....core.database import get_db
+from ....core.redis import redis_client
+from ....services.failure_detector import FailureDetector
+from ....services.fleet_status_service import FleetStatusService
+from ....services.status_event_service import StatusEventService
 from ....services.heartbeat_service import HeartbeatService
 from ....celery_tasks import heartbeat_check, cleanup_stale_load_generators
 
@@ -45,51 +50,54 @@ async def check_all_heartbeats_async():
 
 @router.get("/status")
 async def get_heartbeat_status(db: Session = Depends(get_db)):
-    """获取心跳检测状态"""
+    """获取心跳检测状态（集群状态汇总，带缓存）"""
     try:
-        service = HeartbeatService(db)
-        
-        # 获取所有在线压测机
-        from ....models.load_generator import LoadGenerator
-        from sqlalchemy import and_
-        
-        online_count = db.query(LoadGenerator).filter(
-            and_(
-                LoadGenerator.status == "online",
-                LoadGenerator.is_active == True
-            )
-        ).count()
-        
-        offline_count = db.query(LoadGenerator).filter(
-            and_(
-                LoadGenerator.status == "offline",
-                LoadGenerator.is_active == True
-            )
-        ).count()
-        
-        # 获取长时间没有心跳的压测机
-        stale_load_generators = await service.get_stale_load_generators(stale_minutes=10)
-        
+        return await FleetStatusService(db).get_summary()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get heartbeat status: {str(e)}"
+        )
+
+
+@router.get("/suspicion")
+async def get_failure_suspicion(db: Session = Depends(get_db)):
+    """获取各压测机的故障怀疑度（phi-accrual）"""
+    try:
+        detector = FailureDetector(db, await redis_client.get_redis())
         return {
-            "online_count": online_count,
-            "offline_count": offline_count,
-            "stale_count": len(stale_load_generators),
-            "stale_load_generators": [
-                {
-                    "id": lg.id,
-                    "name": lg.name,
-                    "last_heartbeat": lg.last_heartbeat.isoformat() if lg.last_heartbeat else None
-                }
-                for lg in stale_load_generators
-            ]
+            "phi_threshold": settings.FAILURE_DETECTOR_PHI_THRESHOLD,
+            "load_generators": await detector.get_suspicion()
         }
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get heartbeat status: {str(e)}"
+            detail=f"Failed to get failure suspicion: {str(e)}"
         )
 
 
+@router.get("/events")
+async def get_status_events(
+    load_generator_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """获取压测机状态变更事件"""
+    events = StatusEventService(db).get_events(load_generator_id=load_generator_id, limit=limit)
+    return [
+        {
+            "id": event.id,
+            "load_generator_id": event.load_generator_id,
+            "from_status": event.from_status,
+            "to_status": event.to_status,
+            "source": event.source,
+            "reason": event.reason,
+            "created_at": event.created_at.isoformat() if event.created_at else None
+        }
+        for event in events
+    ]
+
+
 @router.post("/cleanup-stale")
 async def cleanup_stale_load_generators_endpoint():
     """清理长时间离线的压测机"""
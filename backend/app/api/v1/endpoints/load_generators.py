@@ -1,16 +1,21 @@
 """
 压测机管理API
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+import json
+from datetime import datetime, timedelta
 from typing import List, Optional
 from app.core.database import get_db
 from app.models.load_generator import LoadGenerator, LoadGeneratorConfig
 from app.schemas.load_generator import (
     LoadGeneratorCreate, LoadGeneratorUpdate, LoadGeneratorResponse,
-    LoadGeneratorConfigCreate, LoadGeneratorConfigUpdate, LoadGeneratorConfigResponse
+    LoadGeneratorConfigCreate, LoadGeneratorConfigUpdate, LoadGeneratorConfigResponse,
+    BulkTestConnectionRequest
 )
 from app.services.load_generator_service import LoadGeneratorService
+from app.services.resource_history_service import ResourceHistoryService
 
 router = APIRouter()
 
@@ -27,6 +32,27 @@ async def get_load_generators(
     return await service.get_load_generators(skip=skip, limit=limit, status=status)
 
 
+@router.post("/bulk-test-connection/")
+async def bulk_test_connection(
+    request: BulkTestConnectionRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    批量并发测试压测机连接
+    
+    以NDJSON流式返回，每完成一台压测机输出一行结果。
+    """
+    service = LoadGeneratorService(db)
+    
+    async def stream():
+        async for result in service.bulk_test_connection(
+            request.load_generator_ids, request.concurrency, request.timeout
+        ):
+            yield json.dumps(result, ensure_ascii=False, default=str) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 @router.get("/{load_generator_id}/", response_model=LoadGeneratorResponse)
 async def get_load_generator(
     load_generator_id: int,
@@ -102,6 +128,78 @@ async def test_connection(
     return result
 
 
+@router.get("/{load_generator_id}/recommended-config/")
+async def get_recommended_config(
+    load_generator_id: int,
+    db: Session = Depends(get_db)
+):
+    """根据硬件拓扑推荐压测机配置"""
+    service = LoadGeneratorService(db)
+    recommendation = await service.recommend_config(load_generator_id)
+    if recommendation is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="压测机不存在"
+        )
+    return recommendation
+
+
+@router.get("/{load_generator_id}/capacity/")
+async def get_load_generator_capacity(
+    load_generator_id: int,
+    worker_cpu_cores: int = Query(1, ge=1),
+    worker_memory_gb: float = Query(2.0, ge=1),
+    master_enabled: bool = True,
+    master_cpu_cores: int = Query(1, ge=1),
+    master_memory_gb: float = Query(2.0, ge=1),
+    system_cpu_cores: int = Query(1, ge=0),
+    system_memory_gb: float = Query(1.0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """获取压测机当前剩余资源及可运行的最大Worker数量"""
+    service = LoadGeneratorService(db)
+    capacity = await service.get_fit_now(
+        load_generator_id,
+        worker_cpu_cores=worker_cpu_cores,
+        worker_memory_gb=worker_memory_gb,
+        master_enabled=master_enabled,
+        master_cpu_cores=master_cpu_cores,
+        master_memory_gb=master_memory_gb,
+        system_cpu_cores=system_cpu_cores,
+        system_memory_gb=system_memory_gb
+    )
+    if capacity is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="压测机不存在"
+        )
+    return capacity
+
+
+@router.get("/{load_generator_id}/resource-history/")
+async def get_resource_history(
+    load_generator_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = Query("auto", pattern="^(auto|raw|5m|1h)$"),
+    db: Session = Depends(get_db)
+):
+    """获取压测机资源使用历史（默认最近1小时，UTC时间）"""
+    if not db.query(LoadGenerator.id).filter(LoadGenerator.id == load_generator_id).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="压测机不存在"
+        )
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(hours=1)
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="开始时间必须早于结束时间"
+        )
+    return ResourceHistoryService(db).get_history(load_generator_id, start, end, resolution)
+
+
 @router.get("/{load_generator_id}/configs/", response_model=List[LoadGeneratorConfigResponse])
 async def get_load_generator_configs(
     load_generator_id: int,
@@ -0,0 +1,33 @@
+"""
+容量规划API端点
+"""
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from ....core.database import get_db
+from ....schemas.planning import CapacityPredictionRequest
+from ....services.capacity_model_service import CapacityModelService
+
+router = APIRouter()
+
+
+@router.get("/capacity-model")
+async def get_capacity_model(db: Session = Depends(get_db)):
+    """获取从历史执行学习到的单核RPS（按压测机、场景类型和脚本类型）"""
+    service = CapacityModelService(db)
+    return service.get_model()
+
+
+@router.post("/predict")
+async def predict_capacity(
+    request: CapacityPredictionRequest,
+    db: Session = Depends(get_db)
+):
+    """预测达到目标RPS所需的Worker数量与压测机"""
+    service = CapacityModelService(db)
+    return await service.predict(
+        request.target_rps,
+        scenario_type=request.scenario_type,
+        script_type=request.script_type,
+        load_generator_ids=request.load_generator_ids,
+        use_live_capacity=request.use_live_capacity
+    )
@@ -0,0 +1,71 @@
+"""
+压测机运行环境预置API端点
+"""
+import html
+import os
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import FileResponse, HTMLResponse
+from celery.result import AsyncResult
+from ....core.config import settings
+from ....schemas.load_generator import ProvisionRequest
+from ....services.provisioning_service import has_pinned_locust, wheelhouse_files
+from ....celery_tasks import celery_app, provision_load_generators
+
+router = APIRouter()
+
+
+@router.get("/wheelhouse/", response_class=HTMLResponse)
+async def get_wheelhouse_index():
+    """wheel缓存索引页（供压测机上的pip --find-links使用）"""
+    links = "\n".join(
+        f'<a href="{html.escape(name)}">{html.escape(name)}</a><br/>'
+        for name in wheelhouse_files()
+    )
+    return f"<!DOCTYPE html>\n<html><body>\n{links}\n</body></html>"
+
+
+@router.get("/wheelhouse/{filename}")
+async def download_wheel(filename: str):
+    """下载wheel缓存中的文件"""
+    if filename not in wheelhouse_files():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="文件不存在"
+        )
+    return FileResponse(
+        os.path.join(settings.WHEELHOUSE_DIR, filename),
+        media_type="application/octet-stream",
+        filename=filename
+    )
+
+
+@router.post("/jobs")
+async def start_provisioning(request: ProvisionRequest):
+    """为选中的压测机批量预置固定版本的Locust环境"""
+    if not has_pinned_locust():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"wheel缓存中缺少locust {settings.LOCUST_VERSION_PIN}"
+        )
+    
+    task = provision_load_generators.delay(request.load_generator_ids)
+    return {
+        "message": "Provisioning task started",
+        "task_id": task.id,
+        "locust_version": settings.LOCUST_VERSION_PIN,
+        "status": "pending"
+    }
+
+
+@router.get("/jobs/{task_id}")
+async def get_provisioning_progress(task_id: str):
+    """查询预置任务进度（每台压测机的状态）"""
+    result = AsyncResult(task_id, app=celery_app)
+    
+    if result.state == "PROGRESS":
+        return {"task_id": task_id, "status": "running", "hosts": result.info.get("hosts", {})}
+    if result.state == "SUCCESS":
+        return {"task_id": task_id, "status": "completed", **result.result}
+    if result.state == "FAILURE":
+        return {"task_id": task_id, "status": "failed", "message": str(result.result)}
+    return {"task_id": task_id, "status": result.state.lower()}
@@ -1,17 +1,71 @@
 """
 场景文件管理API端点
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from ....core.config import settings
 from ....core.database import get_db
 from ....models.test_management import ScenarioFile, TestScenario
-from ....services.file_storage_service import FileStorageService
-from ....schemas.test_management import ScenarioFileResponse, ScenarioFileCreate
+from ....services.file_storage_service import (
+    ARCHIVE_EXTENSIONS, ArchiveError, FileStorageService, FileTooLargeError, content_disposition
+)
+from ....schemas.test_management import (
+    ScenarioFileResponse, ScenarioFileCreate, ScenarioFileByHashCreate, ScenarioFileArchiveResponse,
+    ScenarioFilePresignedUploadCreate, ScenarioFilePresignedUploadComplete, ScenarioFilePresignedUploadResponse
+)
 
 router = APIRouter()
 
 
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match是否命中（弱比较）"""
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in [value[2:] if value.startswith("W/") else value for value in candidates]
+
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单段Range请求头
+    
+    Returns:
+        (start, end)闭区间；格式无法识别或为多段范围时返回None，按完整内容响应
+    
+    Raises:
+        HTTPException: 范围无法满足(416)
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_text, sep, end_text = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start_text == "":
+            # 后缀范围：最后N个字节
+            start = max(size - int(end_text), 0) if int(end_text) > 0 else size
+            end = size - 1
+        else:
+            start = int(start_text)
+            end = min(int(end_text), size - 1) if end_text else size - 1
+            if end_text and int(end_text) < start:
+                return None
+    except ValueError:
+        return None
+    
+    if start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
 @router.get("/scenario/{scenario_id}/files/", response_model=List[ScenarioFileResponse])
 async def get_scenario_files(
     scenario_id: int,
@@ -48,7 +102,6 @@ async def upload_scenario_file(
         )
     
     # 验证文件类型和大小
-    from ....core.config import settings
     file_extension = "." + file.filename.split(".")[-1].lower() if "." in file.filename else ""
     if file_extension not in settings.ALLOWED_FILE_TYPES:
         raise HTTPException(
@@ -56,16 +109,23 @@ async def upload_scenario_file(
             detail=f"File type {file_extension} not allowed"
         )
     
-    if file.size and file.size > settings.MAX_FILE_SIZE:
+    file_service = FileStorageService(db)
+    max_file_size = file_service.max_file_size(file.filename)
+    if file.size and file.size > max_file_size:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File size exceeds maximum allowed size of {settings.MAX_FILE_SIZE} bytes"
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File size exceeds maximum allowed size of {max_file_size} bytes"
         )
     
     try:
-        file_service = FileStorageService(db)
-        scenario_file = file_service.save_file(scenario_id, file, description)
+        # 大文件上传耗时较长，在线程池中执行避免阻塞事件循环
+        scenario_file = await run_in_threadpool(file_service.save_file, scenario_id, file, description)
         return scenario_file
+    except FileTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -73,6 +133,151 @@ async def upload_scenario_file(
         )
 
 
+@router.post("/scenario/{scenario_id}/files/archive/", response_model=ScenarioFileArchiveResponse)
+async def upload_scenario_archive(
+    scenario_id: int,
+    file: UploadFile = File(...),
+    description: Optional[str] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """上传压缩包，批量解压为场景文件"""
+    scenario = db.query(TestScenario).filter(TestScenario.id == scenario_id).first()
+    if not scenario:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test scenario not found"
+        )
+    
+    if not (file.filename or "").lower().endswith(ARCHIVE_EXTENSIONS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Archive type not allowed, expected one of: {', '.join(ARCHIVE_EXTENSIONS)}"
+        )
+    if file.size and file.size > settings.MAX_DATA_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File size exceeds maximum allowed size of {settings.MAX_DATA_FILE_SIZE} bytes"
+        )
+    
+    file_service = FileStorageService(db)
+    try:
+        # 解压和上传耗时较长，在线程池中执行避免阻塞事件循环
+        return await run_in_threadpool(file_service.save_archive, scenario_id, file, description)
+    except FileTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except ArchiveError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to save archive: {str(e)}"
+        )
+
+
+@router.post("/scenario/{scenario_id}/files/by-hash/", response_model=ScenarioFileResponse)
+async def create_scenario_file_by_hash(
+    scenario_id: int,
+    file_data: ScenarioFileByHashCreate,
+    db: Session = Depends(get_db)
+):
+    """按内容哈希秒传：平台已有相同内容时直接创建文件记录，否则返回404，客户端再走普通上传"""
+    scenario = db.query(TestScenario).filter(TestScenario.id == scenario_id).first()
+    if not scenario:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test scenario not found"
+        )
+    
+    file_service = FileStorageService(db)
+    scenario_file = file_service.save_file_by_hash(
+        scenario_id, file_data.file_name, file_data.sha256, file_data.description
+    )
+    if not scenario_file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Content not found, upload the file instead"
+        )
+    return scenario_file
+
+
+@router.post("/scenario/{scenario_id}/files/presigned-upload/", response_model=ScenarioFilePresignedUploadResponse)
+async def create_presigned_upload(
+    scenario_id: int,
+    upload_data: ScenarioFilePresignedUploadCreate,
+    db: Session = Depends(get_db)
+):
+    """申请预签名直传：大文件由客户端直接PUT到MinIO，不经过API进程；内容已存在时直接创建文件记录"""
+    scenario = db.query(TestScenario).filter(TestScenario.id == scenario_id).first()
+    if not scenario:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test scenario not found"
+        )
+    
+    file_extension = "." + upload_data.file_name.split(".")[-1].lower() if "." in upload_data.file_name else ""
+    if file_extension not in settings.ALLOWED_FILE_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File type {file_extension} not allowed"
+        )
+    
+    file_service = FileStorageService(db)
+    try:
+        return file_service.create_presigned_upload(
+            scenario_id, upload_data.file_name, upload_data.sha256, upload_data.size, upload_data.description
+        )
+    except FileTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+
+
+@router.post("/scenario/{scenario_id}/files/presigned-upload/complete/", response_model=ScenarioFileResponse)
+async def complete_presigned_upload(
+    scenario_id: int,
+    upload_data: ScenarioFilePresignedUploadComplete,
+    db: Session = Depends(get_db)
+):
+    """完成预签名直传：校验上传内容的哈希后创建文件记录"""
+    scenario = db.query(TestScenario).filter(TestScenario.id == scenario_id).first()
+    if not scenario:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test scenario not found"
+        )
+    
+    file_service = FileStorageService(db)
+    try:
+        # 校验需要读取整个对象，在线程池中执行避免阻塞事件循环
+        scenario_file = await run_in_threadpool(
+            file_service.complete_presigned_upload,
+            scenario_id, upload_data.file_name, upload_data.sha256, upload_data.upload_id, upload_data.description
+        )
+    except FileTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if not scenario_file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Uploaded object not found"
+        )
+    return scenario_file
+
+
 @router.get("/files/{file_id}/", response_model=ScenarioFileResponse)
 async def get_file_info(
     file_id: int,
@@ -117,6 +322,92 @@ async def get_file_content(
     }
 
 
+@router.get("/files/{file_id}/download/")
+async def download_file(
+    file_id: int,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """流式下载文件内容，支持Range断点续传和ETag/If-None-Match缓存校验"""
+    file_service = FileStorageService(db)
+    scenario_file = file_service.get_file(file_id)
+    if not scenario_file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    
+    etag = file_service.file_etag(scenario_file)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": content_disposition(scenario_file.file_name)
+    }
+    if etag:
+        headers["ETag"] = etag
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    try:
+        size = await run_in_threadpool(file_service.get_file_size, scenario_file)
+        
+        byte_range = None
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        # If-Range与当前ETag不一致说明内容已变化，返回完整内容
+        if range_header and (if_range is None or (etag and if_range == etag)):
+            byte_range = _parse_range(range_header, size)
+        
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        else:
+            start, length = 0, size
+            status_code = status.HTTP_200_OK
+        
+        chunks = await run_in_threadpool(
+            file_service.open_file_stream, scenario_file, start, length if byte_range else 0
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to read file content: {str(e)}"
+        )
+    
+    headers["Content-Length"] = str(length)
+    return StreamingResponse(
+        chunks,
+        status_code=status_code,
+        media_type=scenario_file.file_type or "application/octet-stream",
+        headers=headers
+    )
+
+
+@router.get("/files/{file_id}/presigned-download/")
+async def get_presigned_download_url(
+    file_id: int,
+    db: Session = Depends(get_db)
+):
+    """获取预签名下载地址，大文件由客户端直接从MinIO下载"""
+    file_service = FileStorageService(db)
+    scenario_file = file_service.get_file(file_id)
+    if not scenario_file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    
+    return {
+        "file_id": file_id,
+        "file_name": scenario_file.file_name,
+        "url": file_service.presigned_download_url(scenario_file),
+        "expires_in": settings.MINIO_PRESIGNED_EXPIRE_SECONDS
+    }
+
+
 @router.put("/files/{file_id}/content/")
 async def update_file_content(
     file_id: int,
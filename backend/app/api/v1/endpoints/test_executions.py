@@ -6,12 +6,14 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
 from ....core.database import get_db
-from ....models.test_management import TestExecution, TestTask, TestStrategy
+from ....models.test_management import TestExecution, TestTask, TestStrategy, ExecutionResourceSample
 from ....models.load_generator import LoadGenerator, LoadGeneratorConfig
 from ....services.test_execution_service import TestExecutionService
+from ....services.event_bus import publish_execution_status
 from ....schemas.test_management import (
     TestExecutionCreate, TestExecutionUpdate, TestExecutionResponse,
-    TestExecutionWithDetailsResponse, TestExecutionStartRequest, TestExecutionStopRequest
+    TestExecutionWithDetailsResponse, TestExecutionStartRequest, TestExecutionStopRequest,
+    ExecutionResourceSampleResponse
 )
 
 router = APIRouter()
@@ -77,6 +79,9 @@ async def get_test_execution(
         "requests_per_second": execution.requests_per_second,
         "error_message": execution.error_message,
         "error_rate": execution.error_rate,
+        "generator_bound": execution.generator_bound or False,
+        "generator_peak_cpu": execution.generator_peak_cpu,
+        "saturation_message": execution.saturation_message,
         "created_at": execution.created_at,
         "started_at": execution.started_at,
         "completed_at": execution.completed_at,
@@ -101,6 +106,27 @@ async def get_test_execution(
     return execution_dict
 
 
+@router.get("/{execution_id}/resource-samples", response_model=List[ExecutionResourceSampleResponse])
+async def get_execution_resource_samples(
+    execution_id: int,
+    db: Session = Depends(get_db)
+):
+    """获取执行期间压测机资源采样"""
+    execution = db.query(TestExecution).filter(
+        TestExecution.id == execution_id
+    ).first()
+    
+    if not execution:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test execution not found"
+        )
+    
+    return db.query(ExecutionResourceSample).filter(
+        ExecutionResourceSample.execution_id == execution_id
+    ).order_by(ExecutionResourceSample.sampled_at).all()
+
+
 @router.post("/", response_model=TestExecutionResponse)
 async def create_test_execution(
     execution: TestExecutionCreate,
@@ -172,23 +198,49 @@ async def update_test_execution(
             detail="Test execution not found"
         )
     
+    previous_status = execution.status
     update_data = execution_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(execution, field, value)
     
     db.commit()
     db.refresh(execution)
+    await publish_execution_status(execution, previous_status)
     return execution
 
 
 @router.post("/{execution_id}/start")
 async def start_test_execution(
     execution_id: int,
+    apply_tuning: bool = False,
+    skip_preflight: bool = False,
+    db: Session = Depends(get_db)
+):
+    """启动测试执行（启动前进行内核与网络预检）"""
+    execution_service = TestExecutionService(db)
+    result = await execution_service.start_execution(
+        execution_id, apply_tuning=apply_tuning, skip_preflight=skip_preflight
+    )
+    
+    if not result["success"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": result["message"], "preflight": result["preflight"]}
+            if result.get("preflight") else result["message"]
+        )
+    
+    return result
+
+
+@router.post("/{execution_id}/preflight")
+async def preflight_test_execution(
+    execution_id: int,
+    apply_tuning: bool = False,
     db: Session = Depends(get_db)
 ):
-    """启动测试执行"""
+    """执行内核与网络预检（不启动执行）"""
     execution_service = TestExecutionService(db)
-    result = await execution_service.start_execution(execution_id)
+    result = await execution_service.run_preflight(execution_id, apply_tuning=apply_tuning)
     
     if not result["success"]:
         raise HTTPException(
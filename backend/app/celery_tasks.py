@@ -43,11 +43,27 @@ celery_app.conf.beat_schedule = {
         "task": "app.celery_tasks.heartbeat_check",
         "schedule": 120.0,  # 120秒 = 2分钟
     },
+    # 故障检测（phi-accrual）调度 - 按FAILURE_DETECTOR_TICK_SECONDS执行，到期的压测机才会被探测
+    "failure-detection": {
+        "task": "app.celery_tasks.failure_detection",
+        "schedule": float(settings.FAILURE_DETECTOR_TICK_SECONDS),
+        "options": {"expires": settings.FAILURE_DETECTOR_TICK_SECONDS},
+    },
+    # 清理无引用的场景文件对象 - 每小时执行一次
+    "purge-unreferenced-blobs": {
+        "task": "app.celery_tasks.purge_unreferenced_blobs",
+        "schedule": 3600.0,  # 3600秒 = 1小时
+    },
     # 清理长时间离线的压测机 - 每10分钟执行一次
     "cleanup-stale-load-generators": {
         "task": "app.celery_tasks.cleanup_stale_load_generators",
         "schedule": 600.0,  # 600秒 = 10分钟
     },
+    # 资源使用历史汇总与过期清理 - 每5分钟执行一次
+    "rollup-resource-history": {
+        "task": "app.celery_tasks.rollup_resource_history",
+        "schedule": 300.0,  # 300秒 = 5分钟
+    },
 }
 
 # 任务定义
@@ -71,6 +87,21 @@ def heartbeat_check(self):
         logger.error(f"Heartbeat check task failed: {str(e)}")
         raise self.retry(exc=e, countdown=60, max_retries=3)
 
+@celery_app.task
+def failure_detection():
+    """故障检测任务（轻量探测+phi-accrual怀疑度）"""
+    from .services.failure_detector import failure_detection_task
+    
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        result = loop.run_until_complete(failure_detection_task())
+        if result["marked_offline"]:
+            logger.info(f"Failure detection marked offline: {result['marked_offline']}")
+        return result
+    finally:
+        loop.close()
+
 @celery_app.task(bind=True)
 def cleanup_stale_load_generators(self):
     """清理长时间离线的压测机"""
@@ -79,13 +110,20 @@ def cleanup_stale_load_generators(self):
         
         from .services.heartbeat_service import HeartbeatService
         from .core.database import get_db
+        from .core.redis import redis_client
         
         db = next(get_db())
         try:
             service = HeartbeatService(db)
             
-            # 标记30分钟没有心跳的压测机为离线
-            stale_count = asyncio.run(service.mark_stale_as_offline(stale_minutes=30))
+            async def mark_stale():
+                try:
+                    return await service.mark_stale_as_offline()
+                finally:
+                    await redis_client.close()
+            
+            # 标记超过HEARTBEAT_STALE_MINUTES没有心跳的压测机为离线
+            stale_count = asyncio.run(mark_stale())
             
             logger.info(f"Marked {stale_count} stale load generators as offline")
             return {"stale_marked_offline": stale_count}
@@ -97,6 +135,64 @@ def cleanup_stale_load_generators(self):
         logger.error(f"Cleanup stale load generators task failed: {str(e)}")
         raise self.retry(exc=e, countdown=300, max_retries=2)
 
+@celery_app.task(bind=True, time_limit=3600, soft_time_limit=3500)
+def provision_load_generators(self, load_generator_ids):
+    """批量预置压测机Locust运行环境"""
+    from .services.provisioning_service import ProvisioningService
+    from .core.database import SessionLocal
+    
+    logger.info(f"Starting provisioning for load generators: {load_generator_ids}")
+    
+    def report_progress(progress):
+        self.update_state(state="PROGRESS", meta={"hosts": progress})
+    
+    db = SessionLocal()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        service = ProvisioningService(db)
+        result = loop.run_until_complete(service.provision(load_generator_ids, report_progress))
+        logger.info(f"Provisioning completed: {result['succeeded']}/{result['total']} succeeded")
+        return result
+    finally:
+        loop.close()
+        db.close()
+
+@celery_app.task(bind=True)
+def rollup_resource_history(self):
+    """汇总压测机资源使用历史并清理过期数据"""
+    from .services.resource_history_service import ResourceHistoryService
+    from .core.database import SessionLocal
+    
+    db = SessionLocal()
+    try:
+        service = ResourceHistoryService(db)
+        result = {**service.rollup(), **service.purge()}
+        logger.info(f"Resource history rollup completed: {result}")
+        return result
+    except Exception as e:
+        logger.error(f"Resource history rollup failed: {str(e)}")
+        db.rollback()
+        raise self.retry(exc=e, countdown=60, max_retries=2)
+    finally:
+        db.close()
+
+@celery_app.task
+def purge_unreferenced_blobs():
+    """清理没有场景文件引用的对象（如随场景级联删除的文件）及未登记的直传暂存对象"""
+    from .services.file_storage_service import FileStorageService
+    from .core.database import SessionLocal
+    
+    db = SessionLocal()
+    try:
+        file_service = FileStorageService(db)
+        purged = file_service.purge_unreferenced_blobs()
+        purged_uploads = file_service.purge_stale_uploads()
+        logger.info(f"Purged {purged} unreferenced blobs and {purged_uploads} stale uploads")
+        return {"purged": purged, "purged_uploads": purged_uploads}
+    finally:
+        db.close()
+
 @celery_app.task
 def test_task():
     """测试任务"""
@@ -54,10 +54,23 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str = "pfp123456"
     MINIO_BUCKET_NAME: str = "scenario-files"
     MINIO_SECURE: bool = False  # 本地开发使用HTTP
+    MINIO_POOL_MAXSIZE: int = 32  # 连接池大小，需不小于并发文件请求数
+    MINIO_CONNECT_TIMEOUT: float = 5  # 连接超时(秒)
+    MINIO_READ_TIMEOUT: float = 300  # 读取超时(秒)，大文件分片传输需要较长时间
+    MINIO_REGION: str = "us-east-1"  # 生成预签名URL使用的区域（避免额外的区域查询请求）
+    MINIO_PUBLIC_ENDPOINT: Optional[str] = None  # 预签名URL中的外部访问地址，为空时使用MINIO_ENDPOINT
+    MINIO_PRESIGNED_EXPIRE_SECONDS: int = 3600  # 预签名URL有效期(秒)
     
     # 文件存储配置
-    MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
-    ALLOWED_FILE_TYPES: list = [".py", ".js", ".ts", ".java", ".go", ".rs", ".sh", ".bat", ".txt", ".json", ".yaml", ".yml"]
+    MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 脚本文件大小上限(10MB)
+    MAX_DATA_FILE_SIZE: int = 20 * 1024 * 1024 * 1024  # 数据文件（参数化数据等）大小上限(20GB)
+    MINIO_UPLOAD_PART_SIZE: int = 16 * 1024 * 1024  # 分片上传的分片大小(字节)，不小于5MB
+    ALLOWED_FILE_TYPES: list = [".py", ".js", ".ts", ".java", ".go", ".rs", ".sh", ".bat", ".txt", ".json", ".yaml", ".yml", ".csv", ".tsv", ".dat"]
+    ARCHIVE_UPLOAD_CONCURRENCY: int = 8  # 压缩包批量上传时并发上传到MinIO的文件数（不超过MINIO_POOL_MAXSIZE）
+    ARCHIVE_MAX_MEMBERS: int = 1000  # 压缩包内文件数上限
+    FILE_CACHE_DIR: str = "file_cache"  # MinIO对象本地缓存目录，按内容哈希命名
+    FILE_CACHE_MAX_SIZE: int = 2 * 1024 * 1024 * 1024  # 本地缓存总大小上限(2GB)，超出时按LRU淘汰
+    FILE_CACHE_MAX_ENTRY_SIZE: int = 256 * 1024 * 1024  # 单个对象超过该大小(256MB)时不缓存，避免挤掉其他热点文件
     
     # Celery配置
     CELERY_BROKER_URL: str = "redis://localhost:6379/1"
@@ -70,10 +83,73 @@ class Settings(BaseSettings):
     # Locust配置
     LOCUST_MASTER_PORT: int = 5557
     LOCUST_WEB_PORT: int = 8089
+    # 每次执行启动的Locust进程数：默认单个headless进程（gevent单进程最多用满一个CPU核心）；
+    # 大于1时以--processes启动，预检的句柄估算和容量模型都按该值计算
+    LOCUST_PROCESSES_PER_EXECUTION: int = 1
+    
+    # 压测机运行环境预置配置
+    LOCUST_VERSION_PIN: str = "2.17.0"  # 全部压测机统一的Locust版本
+    WHEELHOUSE_DIR: str = "wheelhouse"  # 离线wheel缓存目录（由后端对压测机提供下载）
+    PLATFORM_BASE_URL: str = "http://localhost:8000"  # 压测机访问后端使用的地址
+    PROVISION_VENV_ROOT: str = "~/.pfp"  # 压测机上虚拟环境的根目录
+    PROVISION_CONCURRENCY: int = 8  # 同时预置的压测机数量
+    PROVISION_HOST_TIMEOUT: int = 600  # 单台压测机预置超时(秒)
+    
+    # SSH连接池配置
+    SSH_CONNECT_TIMEOUT: int = 10  # 建立连接超时(秒)
+    SSH_KEEPALIVE_INTERVAL: int = 30  # keepalive间隔(秒)
+    SSH_POOL_IDLE_TIMEOUT: int = 300  # 空闲连接回收时间(秒)
+    SSH_POOL_HEALTH_CHECK_INTERVAL: int = 30  # 连接健康检查间隔(秒)
+    SSH_POOL_MAX_CHANNELS: int = 8  # 每条连接最大并发通道数(受sshd MaxSessions限制)
+    SSH_EXECUTOR_WORKERS: int = 32  # SSH操作线程池大小
+    SSH_COMMAND_TIMEOUT: int = 30  # 远程命令默认超时(秒)
+    BULK_TEST_CONNECTION_CONCURRENCY: int = 16  # 批量连接测试默认并发数
+    BULK_TEST_CONNECTION_TIMEOUT: int = 60  # 批量连接测试单台压测机超时(秒)
+    
+    # 心跳检测配置
+    HEARTBEAT_CONCURRENCY: int = 32  # 同时检查的压测机数量
+    HEARTBEAT_HOST_TIMEOUT: int = 20  # 单台压测机心跳检测超时(秒)
+    HEARTBEAT_TOTAL_DEADLINE: int = 90  # 一轮心跳检测总时限(秒)，需小于beat间隔
+    HEARTBEAT_STALE_MINUTES: int = 10  # 超过该时长无心跳的在线压测机标记为离线（兜底）
+    FLEET_STATUS_CACHE_TTL: int = 30  # 集群状态汇总缓存时长(秒)
+    
+    # 故障检测（phi-accrual）配置
+    FAILURE_DETECTOR_TICK_SECONDS: int = 5  # 探测调度间隔(秒)
+    FAILURE_DETECTOR_BUSY_INTERVAL: int = 5  # 执行中压测机的探测间隔(秒)
+    FAILURE_DETECTOR_IDLE_INTERVAL: int = 60  # 空闲压测机的探测间隔(秒)
+    FAILURE_DETECTOR_PROBE_TIMEOUT: float = 3  # 单次探测超时(秒)
+    FAILURE_DETECTOR_PHI_THRESHOLD: float = 8.0  # 怀疑度超过该值标记为离线
+    FAILURE_DETECTOR_WINDOW_SIZE: int = 100  # 保留的到达间隔样本数
+    
+    # 事件推送（SSE）配置
+    EVENT_STREAM_KEEPALIVE_SECONDS: int = 15  # 无事件时发送保活注释的间隔(秒)
+    EVENT_STREAM_RETRY_MS: int = 3000  # 客户端断线重连间隔(毫秒)
+    
+    # 资源使用历史配置
+    RESOURCE_HISTORY_RAW_RETENTION_HOURS: int = 24  # 原始样本保留时长(小时)
+    RESOURCE_HISTORY_5M_RETENTION_DAYS: int = 7  # 5分钟汇总保留时长(天)
+    RESOURCE_HISTORY_1H_RETENTION_DAYS: int = 90  # 1小时汇总保留时长(天)
+    
+    # 压测机Agent配置
+    AGENT_TOKEN: Optional[str] = None  # Agent连接令牌，为空时不校验
+    AGENT_SAMPLE_STALE_SECONDS: int = 30  # Agent样本有效期(秒)
+    AGENT_SAMPLE_PERSIST_INTERVAL: int = 30  # Agent样本写入数据库的间隔(秒)
+    AGENT_COMMAND_TIMEOUT: int = 30  # Agent命令超时(秒)
+    
+    # 执行期间压测机资源采样配置
+    EXECUTION_SAMPLE_INTERVAL: int = 10  # 采样间隔(秒)
+    GENERATOR_SATURATION_CPU_THRESHOLD: float = 90.0  # 单核CPU饱和阈值(%)
+    GENERATOR_SATURATION_MIN_SAMPLES: int = 2  # 判定为压测机瓶颈所需的饱和样本数
+    LIVE_USAGE_MAX_AGE_SECONDS: int = 300  # 配置验证时实测使用率的有效期(秒)
+    
+    # 容量模型配置
+    CAPACITY_MODEL_HISTORY_LIMIT: int = 1000  # 参与建模的最近执行数量
+    CAPACITY_MODEL_MIN_SAMPLES: int = 3  # 单个分组参与预测所需的最少样本数
+    CAPACITY_MODEL_MIN_PEAK_CPU: float = 30.0  # 未饱和执行参与外推所需的最低CPU峰值(%)
+    CAPACITY_SAFETY_FACTOR: float = 0.8  # 规划时对预测单核RPS打的折扣
     
     # 文件上传配置
     UPLOAD_DIR: str = "uploads"
-    MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     
     class Config:
         env_file = ".env"
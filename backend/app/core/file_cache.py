@@ -0,0 +1,205 @@
+"""
+MinIO对象本地磁盘缓存
+
+缓存文件以内容哈希命名（SHA-256，历史文件为MD5），内容变化即换名，无需失效处理；
+写入时边写边校验哈希，通过后原子重命名，读者不会看到半写的文件。
+总大小超过FILE_CACHE_MAX_SIZE时按最近访问时间淘汰。
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import BinaryIO, Optional
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+TEMP_PREFIX = ".tmp-"
+# 超过该时间的临时文件视为写入进程已退出的残留
+TEMP_MAX_AGE_SECONDS = 3600
+
+
+HEX_DIGITS = set("0123456789abcdef")
+
+
+def _hasher_for(key: Optional[str]):
+    """按哈希长度选择算法，无法识别的键不缓存"""
+    if not key or not set(key) <= HEX_DIGITS:
+        return None
+    if len(key) == 64:
+        return hashlib.sha256()
+    if len(key) == 32:
+        return hashlib.md5()
+    return None
+
+
+class _CacheWriter:
+    """写入一个缓存条目：先写临时文件并计算哈希，校验通过后原子替换"""
+    
+    def __init__(self, cache: "LocalFileCache", key: str, hasher):
+        self.cache = cache
+        self.key = key
+        self.hasher = hasher
+        self.size = 0
+        fd, self.temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=cache.cache_dir)
+        self.file = os.fdopen(fd, "wb")
+        self.failed = False
+    
+    def write(self, chunk: bytes):
+        # 缓存写入失败（如磁盘已满）不影响调用方读取
+        if self.failed:
+            return
+        try:
+            self.file.write(chunk)
+            self.hasher.update(chunk)
+            self.size += len(chunk)
+            if self.size > self.cache.max_entry_size:
+                self.abort()
+        except OSError as e:
+            logger.warning(f"Failed to write file cache entry {self.key}: {e}")
+            self.abort()
+    
+    def commit(self) -> bool:
+        """完成写入，内容哈希与键一致时加入缓存"""
+        if self.failed:
+            return False
+        self.file.close()
+        if self.hasher.hexdigest() != self.key:
+            logger.warning(f"File cache entry {self.key} does not match its content hash, discarded")
+            self.abort()
+            return False
+        os.replace(self.temp_path, self.cache.path(self.key))
+        self.cache._add(self.key, self.size)
+        return True
+    
+    def abort(self):
+        """放弃写入"""
+        self.failed = True
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+
+class LocalFileCache:
+    """本地磁盘LRU缓存单例"""
+    _instance = None
+    _lock = threading.Lock()
+    
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._entries = None
+        return cls._instance
+    
+    @property
+    def cache_dir(self) -> str:
+        return settings.FILE_CACHE_DIR
+    
+    @property
+    def max_entry_size(self) -> int:
+        return settings.FILE_CACHE_MAX_ENTRY_SIZE
+    
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+    
+    def is_cacheable(self, key: Optional[str], size: Optional[int]) -> bool:
+        """是否可缓存：有可识别的内容哈希且不超过单个条目上限"""
+        return (
+            settings.FILE_CACHE_MAX_SIZE > 0
+            and _hasher_for(key) is not None
+            and size is not None
+            and size <= self.max_entry_size
+        )
+    
+    def open(self, key: Optional[str]) -> Optional[BinaryIO]:
+        """打开缓存条目，未命中时返回None"""
+        if _hasher_for(key) is None:
+            return None
+        self._load()
+        try:
+            f = open(self.path(key), "rb")
+        except OSError:
+            # 可能已被其他进程淘汰
+            with self._lock:
+                self._total_size -= self._entries.pop(key, 0)
+            return None
+        
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                # 其他进程写入的条目
+                self._entries[key] = os.fstat(f.fileno()).st_size
+                self._total_size += self._entries[key]
+        try:
+            # 更新访问时间，重启后重建索引仍保持LRU顺序
+            os.utime(self.path(key))
+        except OSError:
+            pass
+        return f
+    
+    def writer(self, key: Optional[str]) -> Optional[_CacheWriter]:
+        """创建缓存条目写入器，不可缓存或目录不可写时返回None"""
+        hasher = _hasher_for(key)
+        if hasher is None or settings.FILE_CACHE_MAX_SIZE <= 0:
+            return None
+        self._load()
+        try:
+            return _CacheWriter(self, key, hasher)
+        except OSError as e:
+            logger.warning(f"Failed to create file cache entry {key}: {e}")
+            return None
+    
+    def _add(self, key: str, size: int):
+        with self._lock:
+            self._total_size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+    
+    def _evict(self):
+        """淘汰最久未访问的条目直到总大小不超过上限（已打开的文件不受影响）"""
+        while self._total_size > settings.FILE_CACHE_MAX_SIZE and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_size -= size
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+            logger.debug(f"Evicted file cache entry {key}")
+    
+    def _load(self):
+        """首次使用时扫描缓存目录重建索引"""
+        if self._entries is not None:
+            return
+        with self._lock:
+            if self._entries is not None:
+                return
+            entries = []
+            now = time.time()
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                for entry in os.scandir(self.cache_dir):
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    if entry.name.startswith(TEMP_PREFIX):
+                        if now - stat.st_mtime > TEMP_MAX_AGE_SECONDS:
+                            os.remove(entry.path)
+                        continue
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+            except OSError as e:
+                # 缓存目录不可用时直接读取MinIO
+                logger.warning(f"File cache directory {self.cache_dir} unavailable: {e}")
+            entries.sort()
+            self._entries = OrderedDict((name, size) for _, name, size in entries)
+            self._total_size = sum(self._entries.values())
+            self._evict()
+
+
+# 创建全局本地文件缓存实例
+file_cache = LocalFileCache()
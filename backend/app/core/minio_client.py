@@ -0,0 +1,109 @@
+"""
+MinIO客户端管理
+
+进程内共享一个Minio客户端（urllib3连接池可并发复用），bucket只在首次使用时检查一次。
+"""
+import logging
+import os
+import threading
+import certifi
+import urllib3
+from minio import Minio
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MinioClient:
+    """MinIO客户端单例"""
+    _instance = None
+    _client = None
+    _presign_client = None
+    _bucket_ready = False
+    _lock = threading.Lock()
+    
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+    
+    def get_client(self) -> Minio:
+        """获取共享的Minio客户端"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    http_client = urllib3.PoolManager(
+                        timeout=urllib3.util.Timeout(
+                            connect=settings.MINIO_CONNECT_TIMEOUT,
+                            read=settings.MINIO_READ_TIMEOUT
+                        ),
+                        maxsize=settings.MINIO_POOL_MAXSIZE,
+                        # 连接池满时等待而不是新建一次性连接
+                        block=True,
+                        cert_reqs="CERT_REQUIRED",
+                        ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+                        retries=urllib3.Retry(
+                            total=3,
+                            backoff_factor=0.2,
+                            status_forcelist=[500, 502, 503, 504]
+                        )
+                    )
+                    self._client = Minio(
+                        settings.MINIO_ENDPOINT,
+                        access_key=settings.MINIO_ACCESS_KEY,
+                        secret_key=settings.MINIO_SECRET_KEY,
+                        secure=settings.MINIO_SECURE,
+                        http_client=http_client
+                    )
+        return self._client
+    
+    def get_presign_client(self) -> Minio:
+        """
+        获取生成预签名URL的客户端
+        
+        签名包含主机名，浏览器等外部客户端访问的地址可能与服务端不同，由MINIO_PUBLIC_ENDPOINT指定；
+        指定区域后生成签名不需要访问MinIO。
+        """
+        if self._presign_client is None:
+            with self._lock:
+                if self._presign_client is None:
+                    self._presign_client = Minio(
+                        settings.MINIO_PUBLIC_ENDPOINT or settings.MINIO_ENDPOINT,
+                        access_key=settings.MINIO_ACCESS_KEY,
+                        secret_key=settings.MINIO_SECRET_KEY,
+                        secure=settings.MINIO_SECURE,
+                        region=settings.MINIO_REGION
+                    )
+        return self._presign_client
+    
+    def ensure_bucket(self):
+        """确保bucket存在（每个进程只检查一次）"""
+        if self._bucket_ready:
+            return
+        # 在加锁前创建客户端，get_client内部也会获取同一把(不可重入的)锁
+        client = self.get_client()
+        with self._lock:
+            if self._bucket_ready:
+                return
+            if client.bucket_exists(settings.MINIO_BUCKET_NAME):
+                logger.info(f"MinIO bucket '{settings.MINIO_BUCKET_NAME}' already exists")
+            else:
+                client.make_bucket(settings.MINIO_BUCKET_NAME)
+                logger.info(f"Created MinIO bucket: {settings.MINIO_BUCKET_NAME}")
+            self._bucket_ready = True
+    
+    def get_ready_client(self) -> Minio:
+        """获取bucket已就绪的客户端"""
+        self.ensure_bucket()
+        return self.get_client()
+    
+    def close(self):
+        """关闭连接池"""
+        if self._client is not None:
+            self._client._http.clear()
+            self._client = None
+            self._bucket_ready = False
+
+
+# 创建全局MinIO客户端实例
+minio_client = MinioClient()
@@ -1,6 +1,7 @@
 """
 Redis连接管理
 """
+import asyncio
 import redis.asyncio as redis
 from .config import settings
 
@@ -9,6 +10,7 @@ class RedisClient:
     """Redis客户端单例"""
     _instance = None
     _redis = None
+    _loop = None
     
     def __new__(cls):
         if cls._instance is None:
@@ -16,20 +18,29 @@ class RedisClient:
         return cls._instance
     
     async def get_redis(self):
-        """获取Redis连接"""
-        if self._redis is None:
+        """
+        获取Redis连接
+        
+        连接绑定在创建时的事件循环上；Celery任务每次新建事件循环，
+        循环变化时重新创建连接，任务结束前应调用close()。
+        """
+        loop = asyncio.get_running_loop()
+        if self._redis is None or self._loop is not loop:
             self._redis = redis.from_url(
                 settings.REDIS_URL,
                 encoding="utf-8",
                 decode_responses=True
             )
+            self._loop = loop
         return self._redis
     
     async def close(self):
         """关闭Redis连接"""
         if self._redis:
-            await self._redis.close()
+            if self._loop is asyncio.get_running_loop():
+                await self._redis.close()
             self._redis = None
+            self._loop = None
 
 
 # 创建全局Redis客户端实例
@@ -0,0 +1,235 @@
+"""
+异步远程执行器
+"""
+import asyncio
+import errno
+import logging
+import select
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+import paramiko
+from .config import settings
+from .ssh_pool import ssh_pool, SSHTarget
+
+logger = logging.getLogger(__name__)
+
+# 协程侧超时在线程侧超时基础上的余量：正常情况下由线程内的paramiko超时先触发，
+# 协程侧超时只作为兜底
+THREAD_TIMEOUT_GRACE = 5
+# 分块读写大小，每块之前按剩余时间重设通道超时
+CHUNK_SIZE = 32768
+
+
+def _remaining(deadline: float) -> float:
+    """距截止时间的剩余秒数，已超时则抛出socket.timeout"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise socket.timeout("SSH operation timed out")
+    return remaining
+
+
+def _read_output(channel: paramiko.Channel, deadline: float) -> Tuple[bytes, bytes]:
+    """
+    同时读取stdout和stderr直到EOF
+    
+    两个流交替读取，避免一个流写满通道窗口时远端阻塞；每次等待都不超过截止时间。
+    """
+    out, err = bytearray(), bytearray()
+    while True:
+        # 先取EOF标志再检查缓冲区：EOF之前到达的数据此时一定已在缓冲区中
+        eof = channel.eof_received
+        if channel.recv_ready():
+            out.extend(channel.recv(CHUNK_SIZE))
+        elif channel.recv_stderr_ready():
+            err.extend(channel.recv_stderr(CHUNK_SIZE))
+        elif eof:
+            return bytes(out), bytes(err)
+        elif not select.select([channel], [], [], _remaining(deadline))[0]:
+            raise socket.timeout("SSH operation timed out")
+
+
+def _open_sftp(ssh: paramiko.SSHClient, deadline: float) -> paramiko.SFTPClient:
+    """打开受截止时间限制的SFTP会话（SSHClient.open_sftp打开通道时没有超时）"""
+    channel = ssh.get_transport().open_session(timeout=_remaining(deadline))
+    try:
+        channel.settimeout(_remaining(deadline))
+        channel.invoke_subsystem("sftp")
+        return paramiko.SFTPClient(channel)
+    except BaseException:
+        channel.close()
+        raise
+
+
+class RemoteExecutor:
+    """
+    远程执行器
+    
+    paramiko是阻塞库，所有SSH操作都放到有界线程池中执行，避免单台响应缓慢的压测机阻塞事件循环。
+    连接复用ssh_pool中的池化连接。
+    
+    超时由工作线程内的paramiko通道超时负责：协程侧的wait_for只能取消协程，无法中断线程里的阻塞调用，
+    线程会一直占用通道和线程池名额。线程内超时时只关闭超时的通道并抛出socket.timeout，
+同一连接上的其他通道不受影响。
+    """
+    
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """SSH工作线程池（按需创建）"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.SSH_EXECUTOR_WORKERS,
+                thread_name_prefix="ssh-worker"
+            )
+        return self._executor
+    
+    async def call(
+        self,
+        load_generator,
+        func: Callable[..., Any],
+        *args,
+        timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None
+    ) -> Any:
+        """
+        在工作线程中使用池化连接执行func(ssh, *args)
+        
+        func应自行用paramiko通道超时限制阻塞时间（见run/put_file/get_file），
+        超时时关闭自己打开的通道并抛出socket.timeout。
+        
+        Args:
+            load_generator: 压测机（或SSHTarget）
+            func: 接收paramiko.SSHClient作为第一个参数的阻塞函数
+            timeout: 整体超时时间(秒)
+            connect_timeout: 建立连接的超时时间(秒)
+        """
+        target = SSHTarget.from_load_generator(load_generator)
+        timeout = timeout or settings.SSH_COMMAND_TIMEOUT
+        connect_timeout = connect_timeout or settings.SSH_CONNECT_TIMEOUT
+        
+        def run():
+            with ssh_pool.connection(target, timeout=connect_timeout) as ssh:
+                return func(ssh, *args)
+        
+        loop = asyncio.get_running_loop()
+        # 获取连接（握手、等待通道名额）各自受connect_timeout限制，线程侧超时应先于此触发
+        return await asyncio.wait_for(
+            loop.run_in_executor(self.executor, run),
+            timeout=timeout + 2 * connect_timeout + THREAD_TIMEOUT_GRACE
+        )
+    
+    async def run(
+        self,
+        load_generator,
+        command: str,
+        timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        执行远程命令
+        
+        Returns:
+            Dict: exit_code、stdout、stderr
+        """
+        timeout = timeout or settings.SSH_COMMAND_TIMEOUT
+        
+        def execute(ssh: paramiko.SSHClient) -> Dict[str, Any]:
+            deadline = time.monotonic() + timeout
+            stdin, stdout, stderr = ssh.exec_command(command, timeout=timeout)
+            channel = stdout.channel
+            try:
+                out, err = _read_output(channel, deadline)
+                if not channel.status_event.wait(_remaining(deadline)):
+                    raise socket.timeout(f"Remote command timed out after {timeout}s")
+                return {
+                    "exit_code": channel.recv_exit_status(),
+                    "stdout": out.decode(errors="replace"),
+                    "stderr": err.decode(errors="replace")
+                }
+            finally:
+                # 超时时只关闭本次命令的通道，池化连接继续复用
+                channel.close()
+        
+        return await self.call(load_generator, execute, timeout=timeout, connect_timeout=connect_timeout)
+    
+    async def put_file(
+        self,
+        load_generator,
+        remote_path: str,
+        content: Union[str, bytes],
+        timeout: Optional[float] = None
+    ):
+        """通过SFTP写入远程文件"""
+        timeout = timeout or settings.SSH_COMMAND_TIMEOUT
+        data = content.encode() if isinstance(content, str) else content
+        
+        def upload(ssh: paramiko.SSHClient):
+            deadline = time.monotonic() + timeout
+            sftp = _open_sftp(ssh, deadline)
+            try:
+                with sftp.open(remote_path, "w") as f:
+                    for offset in range(0, len(data), CHUNK_SIZE):
+                        sftp.get_channel().settimeout(_remaining(deadline))
+                        f.write(data[offset:offset + CHUNK_SIZE])
+            finally:
+                sftp.close()
+        
+        await self.call(load_generator, upload, timeout=timeout)
+    
+    async def get_file(
+        self,
+        load_generator,
+        remote_path: str,
+        local_path: str,
+        timeout: Optional[float] = None
+    ):
+        """通过SFTP下载远程文件"""
+        timeout = timeout or settings.SSH_COMMAND_TIMEOUT
+        
+        def download(ssh: paramiko.SSHClient):
+            deadline = time.monotonic() + timeout
+            sftp = _open_sftp(ssh, deadline)
+            
+            def on_progress(transferred: int, total: int):
+                sftp.get_channel().settimeout(_remaining(deadline))
+            
+            try:
+                sftp.get(remote_path, local_path, callback=on_progress)
+            finally:
+                sftp.close()
+        
+        await self.call(load_generator, download, timeout=timeout)
+    
+    async def check_port(self, host: str, port: int, timeout: float = 3) -> int:
+        """
+        非阻塞TCP连通性检查
+        
+        Returns:
+            int: 0表示连通，否则为错误码（与socket.connect_ex一致）
+        """
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+            return 0
+        except asyncio.TimeoutError:
+            return errno.ETIMEDOUT
+        except OSError as e:
+            return e.errno or errno.ECONNREFUSED
+    
+    def shutdown(self):
+        """关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 创建全局远程执行器实例
+remote_executor = RemoteExecutor()
@@ -0,0 +1,246 @@
+"""
+SSH连接池管理
+"""
+import socket
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple, Iterator
+import paramiko
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# 这些异常说明底层传输已不可用，连接需要从池中移除。
+# 通道超时(socket.timeout)只影响单个通道，由使用方关闭该通道，不移除同一传输上的其他通道
+CONNECTION_ERRORS = (paramiko.SSHException, EOFError, ConnectionError)
+
+
+class SSHTarget:
+    """压测机连接参数快照，可在线程之间安全传递（不会触发ORM懒加载）"""
+    
+    __slots__ = ("id", "name", "host", "port", "username", "ssh_key_path", "password")
+    
+    def __init__(self, id, name, host, port, username, ssh_key_path=None, password=None):
+        self.id = id
+        self.name = name
+        self.host = host
+        self.port = port
+        self.username = username
+        self.ssh_key_path = ssh_key_path
+        self.password = password
+    
+    @classmethod
+    def from_load_generator(cls, load_generator) -> "SSHTarget":
+        """从压测机记录创建连接参数快照"""
+        if isinstance(load_generator, cls):
+            return load_generator
+        return cls(
+            id=load_generator.id,
+            name=load_generator.name,
+            host=load_generator.host,
+            port=load_generator.port,
+            username=load_generator.username,
+            ssh_key_path=load_generator.ssh_key_path,
+            password=load_generator.password
+        )
+
+
+class PooledSSHConnection:
+    """池化的SSH连接（一个压测机一条传输，exec/SFTP通道复用该传输）"""
+    
+    def __init__(self, key: Tuple, client: paramiko.SSHClient):
+        self.key = key
+        self.client = client
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.last_checked = self.created_at
+        self.in_use = 0
+        self.channels = threading.BoundedSemaphore(settings.SSH_POOL_MAX_CHANNELS)
+    
+    def is_alive(self) -> bool:
+        """检查底层传输是否仍然可用"""
+        transport = self.client.get_transport()
+        if transport is None or not transport.is_active() or not transport.is_authenticated():
+            return False
+        try:
+            # 发送IGNORE报文，能够及时发现已断开的TCP连接
+            transport.send_ignore()
+            return True
+        except (*CONNECTION_ERRORS, socket.timeout):
+            return False
+    
+    def close(self):
+        """关闭连接"""
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+class SSHConnectionPool:
+    """按压测机维护的持久SSH连接池"""
+    
+    def __init__(self):
+        self._connections: Dict[Tuple, PooledSSHConnection] = {}
+        self._connect_locks: Dict[Tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(load_generator) -> Tuple:
+        """连接池键：压测机ID及连接参数，参数变化时自动使用新连接"""
+        return (
+            load_generator.id,
+            load_generator.host,
+            load_generator.port,
+            load_generator.username,
+            load_generator.ssh_key_path,
+            load_generator.password
+        )
+    
+    @contextmanager
+    def connection(self, load_generator, timeout: Optional[float] = None) -> Iterator[paramiko.SSHClient]:
+        """
+        获取压测机的池化SSH连接
+        
+        连接在使用结束后归还到池中，不要调用close()。底层传输出错时连接会被移除，
+        下一次获取时重新建立。
+        
+        Args:
+            load_generator: 压测机
+            timeout: 建立连接的超时时间(秒)
+        """
+        conn = self.acquire(load_generator, timeout)
+        try:
+            yield conn.client
+        except CONNECTION_ERRORS:
+            self.discard(conn)
+            raise
+        finally:
+            self.release(conn)
+    
+    def acquire(self, load_generator, timeout: Optional[float] = None) -> PooledSSHConnection:
+        """从池中获取连接，不存在或不健康时新建"""
+        self.evict_idle()
+        key = self.make_key(load_generator)
+        timeout = timeout or settings.SSH_CONNECT_TIMEOUT
+        
+        with self._lock:
+            connect_lock = self._connect_locks.setdefault(key, threading.Lock())
+        
+        # 同一压测机的并发请求只做一次握手
+        with connect_lock:
+            with self._lock:
+                conn = self._connections.get(key)
+            
+            if conn and not self._is_healthy(conn):
+                logger.info(f"SSH connection to {load_generator.host} is no longer alive, reconnecting")
+                self.discard(conn)
+                conn = None
+            
+            if conn is None:
+                conn = PooledSSHConnection(key, self._connect(load_generator, timeout))
+                with self._lock:
+                    self._connections[key] = conn
+        
+        if not conn.channels.acquire(timeout=timeout):
+            raise paramiko.SSHException(
+                f"Too many concurrent channels to {load_generator.host} (limit {settings.SSH_POOL_MAX_CHANNELS})"
+            )
+        with self._lock:
+            conn.in_use += 1
+            conn.last_used = time.monotonic()
+        return conn
+    
+    def release(self, conn: PooledSSHConnection):
+        """归还连接"""
+        with self._lock:
+            conn.in_use = max(conn.in_use - 1, 0)
+            conn.last_used = time.monotonic()
+        conn.channels.release()
+    
+    def discard(self, conn: PooledSSHConnection):
+        """从池中移除并关闭连接"""
+        with self._lock:
+            if self._connections.get(conn.key) is conn:
+                del self._connections[conn.key]
+        conn.close()
+    
+    def evict(self, load_generator_id: int):
+        """移除指定压测机的所有连接（压测机信息变更或删除时调用）"""
+        with self._lock:
+            stale = [conn for key, conn in self._connections.items() if key[0] == load_generator_id]
+            for conn in stale:
+                del self._connections[conn.key]
+        for conn in stale:
+            conn.close()
+    
+    def evict_idle(self) -> int:
+        """关闭空闲超时的连接"""
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                conn for conn in self._connections.values()
+                if conn.in_use == 0 and now - conn.last_used > settings.SSH_POOL_IDLE_TIMEOUT
+            ]
+            for conn in idle:
+                del self._connections[conn.key]
+        for conn in idle:
+            conn.close()
+        return len(idle)
+    
+    def close_all(self):
+        """关闭所有连接"""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for conn in connections:
+            conn.close()
+    
+    def stats(self) -> Dict[str, int]:
+        """连接池统计信息"""
+        with self._lock:
+            return {
+                "connections": len(self._connections),
+                "in_use": sum(1 for conn in self._connections.values() if conn.in_use > 0)
+            }
+    
+    def _is_healthy(self, conn: PooledSSHConnection) -> bool:
+        """健康检查，最近检查过的连接只检查传输状态"""
+        now = time.monotonic()
+        if now - conn.last_checked < settings.SSH_POOL_HEALTH_CHECK_INTERVAL:
+            transport = conn.client.get_transport()
+            return transport is not None and transport.is_active()
+        conn.last_checked = now
+        return conn.is_alive()
+    
+    def _connect(self, load_generator, timeout: float) -> paramiko.SSHClient:
+        """建立新的SSH连接"""
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        
+        connect_kwargs = {
+            "hostname": load_generator.host,
+            "port": load_generator.port,
+            "username": load_generator.username,
+            "timeout": timeout,
+            "banner_timeout": timeout,
+            "auth_timeout": timeout
+        }
+        
+        if load_generator.ssh_key_path:
+            connect_kwargs["key_filename"] = load_generator.ssh_key_path
+        elif load_generator.password:
+            connect_kwargs["password"] = load_generator.password
+        else:
+            raise ValueError("No authentication method configured (password or SSH key required)")
+        
+        ssh.connect(**connect_kwargs)
+        ssh.get_transport().set_keepalive(settings.SSH_KEEPALIVE_INTERVAL)
+        logger.info(f"Opened pooled SSH connection to {load_generator.host}:{load_generator.port}")
+        return ssh
+
+
+# 创建全局SSH连接池实例
+ssh_pool = SSHConnectionPool()
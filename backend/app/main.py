@@ -9,6 +9,10 @@ from contextlib import asynccontextmanager
 import uvicorn
 from .core.config import settings
 from .core.database import engine, Base
+from .core.ssh_pool import ssh_pool
+from .core.remote_executor import remote_executor
+from .core.redis import redis_client
+from .core.minio_client import minio_client
 from .api.v1.endpoints.load_generators import router as load_generators_router
 from .api.v1.endpoints.test_tasks import router as test_tasks_router
 from .api.v1.endpoints.test_scripts import router as test_scripts_router
@@ -17,6 +21,10 @@ from .api.v1.endpoints.test_scenarios import router as test_scenarios_router
 from .api.v1.endpoints.test_executions import router as test_executions_router
 from .api.v1.endpoints.scenario_files import router as scenario_files_router
 from .api.v1.endpoints.heartbeat import router as heartbeat_router
+from .api.v1.endpoints.agents import router as agents_router
+from .api.v1.endpoints.provisioning import router as provisioning_router
+from .api.v1.endpoints.planning import router as planning_router
+from .api.v1.endpoints.events import router as events_router
 from .services.minio_init import init_minio
 
 
@@ -40,6 +48,10 @@ async def lifespan(app: FastAPI):
     
     # 关闭时执行
     print("🛑 关闭性能测试平台...")
+    remote_executor.shutdown()
+    ssh_pool.close_all()
+    await redis_client.close()
+    minio_client.close()
 
 
 # 创建FastAPI应用
@@ -156,6 +168,30 @@ app.include_router(
     tags=["心跳检测"]
 )
 
+app.include_router(
+    agents_router,
+    prefix=f"{settings.API_V1_STR}/agents",
+    tags=["压测机Agent"]
+)
+
+app.include_router(
+    provisioning_router,
+    prefix=f"{settings.API_V1_STR}/provisioning",
+    tags=["压测机环境预置"]
+)
+
+app.include_router(
+    planning_router,
+    prefix=f"{settings.API_V1_STR}/planning",
+    tags=["容量规划"]
+)
+
+app.include_router(
+    events_router,
+    prefix=f"{settings.API_V1_STR}/events",
+    tags=["事件推送"]
+)
+
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -1,7 +1,7 @@
 """
 压测机数据模型
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float, JSON, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from ..core.database import Base
@@ -25,6 +25,14 @@ class LoadGenerator(Base):
     network_bandwidth = Column(String(50), comment="网络带宽")
     disk_space = Column(String(50), comment="磁盘空间")
     
+    # 硬件拓扑与系统限制（连接测试时自动采集）
+    physical_cores = Column(Integer, comment="物理核心数")
+    cpu_sockets = Column(Integer, comment="CPU插槽数")
+    numa_nodes = Column(Integer, comment="NUMA节点数")
+    nic_speed_mbps = Column(Integer, comment="主网卡线速(Mbps)")
+    max_open_files = Column(Integer, comment="单进程最大文件句柄数")
+    ephemeral_ports = Column(Integer, comment="可用本地临时端口数")
+    
     # 状态信息
     status = Column(String(20), default="offline", comment="状态: online/offline/maintenance")
     last_heartbeat = Column(DateTime, comment="最后心跳时间")
@@ -92,3 +100,56 @@ class LoadGeneratorConfig(Base):
     
     # 关联关系
     load_generator = relationship("LoadGenerator", back_populates="configs")
+
+
+class LoadGeneratorResourceSample(Base):
+    """压测机资源使用原始样本（滚动保留）"""
+    __tablename__ = "load_generator_resource_samples"
+    __table_args__ = (
+        Index("idx_resource_samples_generator_time", "load_generator_id", "sampled_at"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    load_generator_id = Column(Integer, ForeignKey("load_generators.id", ondelete="CASCADE"), nullable=False, comment="压测机ID")
+    cpu_usage = Column(Float, default=0.0, comment="CPU使用率")
+    memory_usage = Column(Float, default=0.0, comment="内存使用率")
+    network_usage = Column(Float, default=0.0, comment="网络使用率")
+    network_mbps = Column(Float, default=0.0, comment="网络收发速率(Mbps)")
+    sampled_at = Column(DateTime, nullable=False, index=True, comment="采样时间")
+
+
+class LoadGeneratorResourceRollup(Base):
+    """压测机资源使用汇总（按固定时间桶）"""
+    __tablename__ = "load_generator_resource_rollups"
+    __table_args__ = (
+        UniqueConstraint("load_generator_id", "bucket_seconds", "bucket_start", name="uq_resource_rollup_bucket"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    load_generator_id = Column(Integer, ForeignKey("load_generators.id", ondelete="CASCADE"), nullable=False, comment="压测机ID")
+    bucket_seconds = Column(Integer, nullable=False, comment="时间桶长度(秒)")
+    bucket_start = Column(DateTime, nullable=False, comment="时间桶起始时间")
+    sample_count = Column(Integer, default=0, comment="样本数")
+    cpu_avg = Column(Float, default=0.0, comment="CPU平均使用率")
+    cpu_max = Column(Float, default=0.0, comment="CPU最高使用率")
+    memory_avg = Column(Float, default=0.0, comment="内存平均使用率")
+    memory_max = Column(Float, default=0.0, comment="内存最高使用率")
+    network_avg = Column(Float, default=0.0, comment="网络平均使用率")
+    network_max = Column(Float, default=0.0, comment="网络最高使用率")
+    network_mbps_avg = Column(Float, default=0.0, comment="网络平均收发速率(Mbps)")
+
+
+class LoadGeneratorStatusEvent(Base):
+    """压测机状态变更事件（仅在状态实际变化时记录）"""
+    __tablename__ = "load_generator_status_events"
+    __table_args__ = (
+        Index("idx_status_events_generator_time", "load_generator_id", "created_at"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    load_generator_id = Column(Integer, ForeignKey("load_generators.id", ondelete="CASCADE"), nullable=False, comment="压测机ID")
+    from_status = Column(String(20), comment="变更前状态")
+    to_status = Column(String(20), nullable=False, comment="变更后状态")
+    source = Column(String(30), nullable=False, comment="来源: heartbeat/failure_detector/stale/agent/connection_test")
+    reason = Column(String(500), comment="变更原因")
+    created_at = Column(DateTime, default=func.now(), index=True, comment="发生时间")
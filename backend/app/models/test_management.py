@@ -1,9 +1,9 @@
 """
 测试管理数据模型
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float, JSON, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, Text, Float, JSON, ForeignKey, event, inspect, update
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from ..core.database import Base
 
 
@@ -99,6 +99,11 @@ class TestExecution(Base):
     error_message = Column(Text, comment="错误信息")
     error_rate = Column(Float, default=0.0, comment="错误率")
     
+    # 压测机饱和检测
+    generator_bound = Column(Boolean, default=False, comment="是否受压测机资源瓶颈影响(结果无效)")
+    generator_peak_cpu = Column(Float, comment="执行期间压测机单核CPU峰值")
+    saturation_message = Column(Text, comment="饱和检测说明")
+    
     # 时间戳
     created_at = Column(DateTime, default=func.now(), comment="创建时间")
     started_at = Column(DateTime, comment="开始时间")
@@ -110,6 +115,29 @@ class TestExecution(Base):
     strategy = relationship("TestStrategy", back_populates="executions")
     load_generator = relationship("LoadGenerator", back_populates="test_executions")
     load_generator_config = relationship("LoadGeneratorConfig")
+    resource_samples = relationship("ExecutionResourceSample", back_populates="execution", cascade="all, delete-orphan")
+
+
+class ExecutionResourceSample(Base):
+    """执行期间压测机资源采样模型"""
+    __tablename__ = "execution_resource_samples"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    execution_id = Column(Integer, ForeignKey("test_executions.id"), nullable=False, index=True, comment="执行ID")
+    load_generator_id = Column(Integer, ForeignKey("load_generators.id"), nullable=False, comment="压测机ID")
+    
+    # 资源使用情况
+    cpu_usage = Column(Float, default=0.0, comment="CPU使用率")
+    cpu_per_core = Column(JSON, comment="各核心CPU使用率")
+    memory_usage = Column(Float, default=0.0, comment="内存使用率")
+    network_usage = Column(Float, default=0.0, comment="网络使用率")
+    is_saturated = Column(Boolean, default=False, comment="是否达到饱和阈值")
+    
+    # 时间戳
+    sampled_at = Column(DateTime, default=func.now(), comment="采样时间")
+    
+    # 关联关系
+    execution = relationship("TestExecution", back_populates="resource_samples")
 
 
 class TestStrategy(Base):
@@ -169,6 +197,19 @@ class TestScenario(Base):
     files = relationship("ScenarioFile", back_populates="scenario", cascade="all, delete-orphan")
 
 
+class FileBlob(Base):
+    """按内容寻址的文件对象（相同内容只存储一份，被多个场景文件引用）"""
+    __tablename__ = "file_blobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), nullable=False, unique=True, comment="内容SHA-256")
+    object_name = Column(String(500), nullable=False, comment="MinIO对象名称")
+    size = Column(BigInteger, nullable=False, comment="大小(字节)")
+    content_type = Column(String(100), comment="内容类型")
+    ref_count = Column(Integer, default=0, nullable=False, comment="引用该对象的场景文件数")
+    created_at = Column(DateTime, default=func.now(), comment="创建时间")
+
+
 class ScenarioFile(Base):
     """场景关联文件模型"""
     __tablename__ = "scenario_files"
@@ -179,12 +220,13 @@ class ScenarioFile(Base):
     # 文件信息
     file_name = Column(String(255), nullable=False, comment="文件名")
     file_path = Column(String(500), nullable=False, comment="文件存储路径")
-    file_size = Column(Integer, comment="文件大小(字节)")
+    file_size = Column(BigInteger, comment="文件大小(字节)")
     file_type = Column(String(50), comment="文件类型")
-    file_hash = Column(String(64), comment="文件MD5哈希值")
+    file_hash = Column(String(64), comment="文件SHA-256哈希值（历史文件为MD5）")
+    blob_id = Column(Integer, ForeignKey("file_blobs.id"), index=True, comment="内容对象ID（历史文件为空）")
     
-    # 文件内容（可选，小文件可以直接存储）
-    file_content = Column(Text, comment="文件内容")
+    # 历史记录内联的文件内容（内容统一存储在MinIO中，迁移后为空；延迟加载，列表查询不读取）
+    file_content = deferred(Column(Text, comment="文件内容（已迁移至对象存储）"))
     
     # 元数据
     description = Column(Text, comment="文件描述")
@@ -196,3 +238,31 @@ class ScenarioFile(Base):
     
     # 关联关系
     scenario = relationship("TestScenario", back_populates="files")
+
+
+def _adjust_blob_refs(connection, blob_id, delta: int):
+    if blob_id is not None:
+        connection.execute(
+            update(FileBlob).where(FileBlob.id == blob_id).values(ref_count=FileBlob.ref_count + delta)
+        )
+
+
+# 场景文件的增删改（包括随场景级联删除）同步维护FileBlob引用计数
+@event.listens_for(ScenarioFile, "after_insert")
+def _scenario_file_inserted(mapper, connection, target):
+    _adjust_blob_refs(connection, target.blob_id, 1)
+
+
+@event.listens_for(ScenarioFile, "after_delete")
+def _scenario_file_deleted(mapper, connection, target):
+    _adjust_blob_refs(connection, target.blob_id, -1)
+
+
+@event.listens_for(ScenarioFile, "after_update")
+def _scenario_file_updated(mapper, connection, target):
+    history = inspect(target).attrs.blob_id.history
+    if history.has_changes():
+        for blob_id in history.deleted:
+            _adjust_blob_refs(connection, blob_id, -1)
+        for blob_id in history.added:
+            _adjust_blob_refs(connection, blob_id, 1)
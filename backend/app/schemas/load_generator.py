@@ -2,8 +2,9 @@
 压测机Pydantic模式
 """
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
+from app.core.config import settings
 
 
 class LoadGeneratorBase(BaseModel):
@@ -56,6 +57,14 @@ class LoadGeneratorResponse(LoadGeneratorBase):
     status: str = Field(..., description="状态")
     last_heartbeat: Optional[datetime] = Field(None, description="最后心跳时间")
     
+    # 硬件拓扑与系统限制
+    physical_cores: Optional[int] = Field(None, description="物理核心数")
+    cpu_sockets: Optional[int] = Field(None, description="CPU插槽数")
+    numa_nodes: Optional[int] = Field(None, description="NUMA节点数")
+    nic_speed_mbps: Optional[int] = Field(None, description="主网卡线速(Mbps)")
+    max_open_files: Optional[int] = Field(None, description="单进程最大文件句柄数")
+    ephemeral_ports: Optional[int] = Field(None, description="可用本地临时端口数")
+    
     # 资源使用情况
     cpu_usage: float = Field(0.0, description="CPU使用率")
     memory_usage: float = Field(0.0, description="内存使用率")
@@ -168,3 +177,15 @@ class LoadGeneratorResourceUsage(BaseModel):
     memory_usage: float
     network_usage: float
     timestamp: datetime
+
+
+class ProvisionRequest(BaseModel):
+    """压测机运行环境预置请求模式"""
+    load_generator_ids: List[int] = Field(..., min_length=1, description="压测机ID列表")
+
+
+class BulkTestConnectionRequest(BaseModel):
+    """批量连接测试请求模式"""
+    load_generator_ids: List[int] = Field(..., min_length=1, description="压测机ID列表")
+    concurrency: int = Field(settings.BULK_TEST_CONNECTION_CONCURRENCY, ge=1, le=128, description="最大并发数")
+    timeout: float = Field(settings.BULK_TEST_CONNECTION_TIMEOUT, gt=0, le=600, description="单台压测机超时时间(秒)")
@@ -0,0 +1,14 @@
+"""
+容量规划Pydantic模式
+"""
+from pydantic import BaseModel, Field
+from typing import Optional, List
+
+
+class CapacityPredictionRequest(BaseModel):
+    """容量预测请求模式"""
+    target_rps: float = Field(..., gt=0, description="目标RPS")
+    scenario_type: str = Field("single", description="场景类型: single/multi")
+    script_type: Optional[str] = Field(None, description="脚本类型: locust/custom/generated，为空时不区分")
+    load_generator_ids: Optional[List[int]] = Field(None, description="候选压测机ID列表，为空时使用全部在线压测机")
+    use_live_capacity: bool = Field(True, description="是否按压测机当前剩余资源计算可用Worker数")
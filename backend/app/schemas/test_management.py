@@ -167,10 +167,29 @@ class TestExecutionResponse(TestExecutionBase):
     requests_per_second: float
     error_message: Optional[str] = None
     error_rate: float
+    generator_bound: bool = False
+    generator_peak_cpu: Optional[float] = None
+    saturation_message: Optional[str] = None
     created_at: datetime
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     duration: Optional[int] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class ExecutionResourceSampleResponse(BaseModel):
+    """执行期间压测机资源采样响应模式"""
+    id: int
+    execution_id: int
+    load_generator_id: int
+    cpu_usage: float = Field(0.0, description="CPU使用率")
+    cpu_per_core: Optional[List[float]] = Field(None, description="各核心CPU使用率")
+    memory_usage: float = Field(0.0, description="内存使用率")
+    network_usage: float = Field(0.0, description="网络使用率")
+    is_saturated: bool = Field(False, description="是否达到饱和阈值")
+    sampled_at: datetime
 
     class Config:
         from_attributes = True
@@ -238,6 +257,23 @@ class ScenarioFileCreate(ScenarioFileBase):
     scenario_id: int = Field(..., description="场景ID")
 
 
+class ScenarioFileByHashCreate(BaseModel):
+    """按内容哈希秒传场景文件模式"""
+    file_name: str = Field(..., description="文件名")
+    sha256: str = Field(..., min_length=64, max_length=64, description="文件内容SHA-256")
+    description: Optional[str] = Field(None, description="文件描述")
+
+
+class ScenarioFilePresignedUploadCreate(ScenarioFileByHashCreate):
+    """申请预签名直传模式"""
+    size: int = Field(..., ge=0, description="文件大小(字节)")
+
+
+class ScenarioFilePresignedUploadComplete(ScenarioFileByHashCreate):
+    """完成预签名直传模式"""
+    upload_id: str = Field(..., pattern=r"^[0-9a-f]{32}$", description="申请直传时返回的上传ID")
+
+
 class ScenarioFileUpdate(BaseModel):
     """更新场景文件模式"""
     file_name: Optional[str] = Field(None, description="文件名")
@@ -249,8 +285,7 @@ class ScenarioFileResponse(ScenarioFileBase):
     id: int = Field(..., description="文件ID")
     scenario_id: int = Field(..., description="场景ID")
     file_path: str = Field(..., description="文件存储路径")
-    file_hash: Optional[str] = Field(None, description="文件MD5哈希值")
-    file_content: Optional[str] = Field(None, description="文件内容")
+    file_hash: Optional[str] = Field(None, description="文件SHA-256哈希值（历史文件为MD5）")
     created_at: datetime = Field(..., description="创建时间")
     updated_at: datetime = Field(..., description="更新时间")
 
@@ -258,6 +293,20 @@ class ScenarioFileResponse(ScenarioFileBase):
         from_attributes = True
 
 
+class ScenarioFileArchiveResponse(BaseModel):
+    """压缩包批量上传响应模式"""
+    files: List[ScenarioFileResponse] = Field(..., description="创建的文件记录")
+    skipped: List[str] = Field([], description="跳过的压缩包成员（类型不允许或路径不合法）")
+
+
+class ScenarioFilePresignedUploadResponse(BaseModel):
+    """预签名直传响应模式：内容已存在时直接返回文件记录，否则返回上传地址"""
+    file: Optional[ScenarioFileResponse] = Field(None, description="已创建的文件记录")
+    upload_id: Optional[str] = Field(None, description="上传ID")
+    upload_url: Optional[str] = Field(None, description="预签名PUT地址")
+    expires_in: Optional[int] = Field(None, description="上传地址有效期(秒)")
+
+
 class TestTaskWithScenariosResponse(TestTaskResponse):
     """包含场景详情的测试任务响应"""
     scenarios: List[TestScenarioResponse] = []
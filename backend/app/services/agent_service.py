@@ -0,0 +1,443 @@
+"""
+压测机Agent服务
+
+可选的推送式Agent在压测机上运行，与后端保持一条WebSocket长连接：
+定期推送资源样本、推送Locust实时统计，并接收启动/停止命令。
+未部署Agent的压测机继续通过SSH轮询。
+
+WebSocket连接只存在于接受它的API进程中；Agent存活状态、最新样本和Locust统计同时写入Redis，
+心跳任务、故障检测器和其他API进程据此判断Agent是否在线。其他进程下发的命令通过Redis发布/订阅
+转发给持有连接的进程。
+"""
+import asyncio
+import itertools
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+from fastapi import WebSocket
+from fastapi.concurrency import run_in_threadpool
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..core.redis import redis_client
+from ..models.load_generator import LoadGenerator
+from .resource_history_service import ResourceHistoryService
+from .status_event_service import StatusEventService
+from .event_bus import publish_status_changes
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "pfp:agent"
+
+# 仅当记录仍属于该连接时删除（Agent可能已经重连到其他进程）
+RELEASE_SCRIPT = """
+if redis.call('hget', KEYS[1], 'session') == ARGV[1] then
+    return redis.call('del', KEYS[1], KEYS[2])
+end
+return 0
+"""
+
+
+def _state_key(load_generator_id: int) -> str:
+    """Agent状态（存活期限为AGENT_SAMPLE_STALE_SECONDS，每次推送样本时续期）"""
+    return f"{KEY_PREFIX}:{load_generator_id}"
+
+
+def _stats_key(load_generator_id: int) -> str:
+    """Agent推送的Locust实时统计，按执行ID存放"""
+    return f"{KEY_PREFIX}:{load_generator_id}:stats"
+
+
+def _command_channel(load_generator_id: int) -> str:
+    """转发给持有连接的进程的命令通道"""
+    return f"{KEY_PREFIX}:{load_generator_id}:commands"
+
+
+class AgentSession:
+    """单个Agent连接"""
+    
+    def __init__(self, load_generator_id: int, websocket: WebSocket, agent_info: Optional[Dict[str, Any]] = None):
+        self.load_generator_id = load_generator_id
+        self.websocket = websocket
+        self.agent_info = agent_info or {}
+        self.session_id = uuid.uuid4().hex
+        self.connected_at = datetime.utcnow()
+        self.last_seen = time.monotonic()
+        self.last_persisted = 0.0
+        self.latest_sample: Optional[Dict[str, Any]] = None
+        self.latest_sample_at: Optional[float] = None
+        self.locust_stats: Dict[int, Dict[str, Any]] = {}
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.relay_task: Optional[asyncio.Task] = None
+    
+    def is_sample_fresh(self) -> bool:
+        """最近的资源样本是否仍然有效"""
+        return (
+            self.latest_sample is not None
+            and time.monotonic() - self.latest_sample_at < settings.AGENT_SAMPLE_STALE_SECONDS
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "load_generator_id": self.load_generator_id,
+            "agent_info": self.agent_info,
+            "connected_at": self.connected_at.isoformat(),
+            "seconds_since_last_message": round(time.monotonic() - self.last_seen, 1),
+            "latest_sample": self.latest_sample,
+            "running_executions": list(self.locust_stats.keys())
+        }
+
+
+class AgentRegistry:
+    """Agent连接注册表（本进程的连接 + Redis中的共享状态）"""
+    
+    def __init__(self):
+        self._sessions: Dict[int, AgentSession] = {}
+        self._command_ids = itertools.count(1)
+    
+    async def register(self, session: AgentSession):
+        """注册Agent连接，同一压测机的旧连接会被替换"""
+        previous = self._sessions.get(session.load_generator_id)
+        if previous is not None:
+            self._stop_relay(previous)
+            self._fail_pending(previous, "Agent reconnected")
+        self._sessions[session.load_generator_id] = session
+        await self._save_state(session, {
+            "session": session.session_id,
+            "agent_info": json.dumps(session.agent_info),
+            "connected_at": session.connected_at.isoformat(),
+            "last_seen": time.time()
+        }, reset=True)
+        session.relay_task = asyncio.ensure_future(self._relay_commands(session))
+        logger.info(f"Agent connected for load generator {session.load_generator_id}")
+    
+    async def unregister(self, session: AgentSession):
+        """注销Agent连接"""
+        if self._sessions.get(session.load_generator_id) is session:
+            del self._sessions[session.load_generator_id]
+        self._stop_relay(session)
+        self._fail_pending(session, "Agent disconnected")
+        try:
+            redis = await redis_client.get_redis()
+            await redis.eval(
+                RELEASE_SCRIPT, 2,
+                _state_key(session.load_generator_id), _stats_key(session.load_generator_id),
+                session.session_id
+            )
+        except Exception as e:
+            logger.warning(f"Failed to clear agent state for load generator {session.load_generator_id}: {str(e)}")
+        logger.info(f"Agent disconnected for load generator {session.load_generator_id}")
+    
+    def get(self, load_generator_id: int) -> Optional[AgentSession]:
+        """本进程持有的Agent连接"""
+        return self._sessions.get(load_generator_id)
+    
+    async def is_live(self, load_generator_id: int) -> bool:
+        """压测机是否有在线的Agent（连接可能在其他API进程中）"""
+        if load_generator_id in self._sessions:
+            return True
+        return bool(await self.live_agent_ids([load_generator_id]))
+    
+    async def live_agent_ids(self, load_generator_ids: Iterable[int]) -> Set[int]:
+        """批量查询有在线Agent的压测机，Redis不可用时只返回本进程的连接"""
+        load_generator_ids = list(load_generator_ids)
+        live = {load_generator_id for load_generator_id in load_generator_ids if load_generator_id in self._sessions}
+        remote_ids = [load_generator_id for load_generator_id in load_generator_ids if load_generator_id not in live]
+        if not remote_ids:
+            return live
+        try:
+            redis = await redis_client.get_redis()
+            pipe = redis.pipeline()
+            for load_generator_id in remote_ids:
+                pipe.exists(_state_key(load_generator_id))
+            exists = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to read agent state: {str(e)}")
+            return live
+        return live | {load_generator_id for load_generator_id, found in zip(remote_ids, exists) if found}
+    
+    async def latest_sample(self, load_generator_id: int) -> Optional[Dict[str, Any]]:
+        """获取Agent推送的最新资源样本（过期返回None）"""
+        session = self._sessions.get(load_generator_id)
+        if session is not None:
+            return session.latest_sample if session.is_sample_fresh() else None
+        state = await self._load_state(load_generator_id)
+        if not state.get("sample"):
+            return None
+        if time.time() - float(state.get("sample_at") or 0) >= settings.AGENT_SAMPLE_STALE_SECONDS:
+            return None
+        return json.loads(state["sample"])
+    
+    async def locust_stats(self, load_generator_id: int, execution_id: int) -> Optional[Dict[str, Any]]:
+        """获取Agent推送的Locust实时统计"""
+        session = self._sessions.get(load_generator_id)
+        if session is not None:
+            return session.locust_stats.get(execution_id)
+        try:
+            redis = await redis_client.get_redis()
+            data = await redis.hget(_stats_key(load_generator_id), str(execution_id))
+        except Exception as e:
+            logger.warning(f"Failed to read agent stats for load generator {load_generator_id}: {str(e)}")
+            return None
+        return json.loads(data) if data else None
+    
+    async def get_info(self, load_generator_id: int) -> Optional[Dict[str, Any]]:
+        """获取Agent状态，未连接时返回None"""
+        session = self._sessions.get(load_generator_id)
+        if session is not None:
+            return session.to_dict()
+        state = await self._load_state(load_generator_id)
+        if not state.get("session"):
+            return None
+        try:
+            redis = await redis_client.get_redis()
+            running = await redis.hkeys(_stats_key(load_generator_id))
+        except Exception:
+            running = []
+        return {
+            "load_generator_id": load_generator_id,
+            "agent_info": json.loads(state.get("agent_info") or "{}"),
+            "connected_at": state.get("connected_at"),
+            "seconds_since_last_message": round(time.time() - float(state.get("last_seen") or 0), 1),
+            "latest_sample": json.loads(state["sample"]) if state.get("sample") else None,
+            "running_executions": [int(execution_id) for execution_id in running]
+        }
+    
+    async def list_sessions(self) -> List[Dict[str, Any]]:
+        """所有在线Agent（包括其他API进程持有的连接）"""
+        load_generator_ids = set(self._sessions)
+        try:
+            redis = await redis_client.get_redis()
+            async for key in redis.scan_iter(match=f"{KEY_PREFIX}:*"):
+                suffix = key[len(KEY_PREFIX) + 1:]
+                if suffix.isdigit():
+                    load_generator_ids.add(int(suffix))
+        except Exception as e:
+            logger.warning(f"Failed to list agent state: {str(e)}")
+        
+        sessions = []
+        for load_generator_id in sorted(load_generator_ids):
+            info = await self.get_info(load_generator_id)
+            if info is not None:
+                sessions.append(info)
+        return sessions
+    
+    async def send_command(
+        self,
+        load_generator_id: int,
+        command: str,
+        payload: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        向Agent发送命令并等待结果（连接在其他API进程时通过Redis转发）
+        
+        Returns:
+            Dict: Agent返回的命令结果（包含success、message等字段）
+        """
+        timeout = timeout or settings.AGENT_COMMAND_TIMEOUT
+        session = self._sessions.get(load_generator_id)
+        if session is not None:
+            return await self._send_local(session, command, payload, timeout)
+        
+        redis = await redis_client.get_redis()
+        reply_channel = f"{KEY_PREFIX}:replies:{uuid.uuid4().hex}"
+        pubsub = redis.pubsub()
+        await pubsub.subscribe(reply_channel)
+        try:
+            receivers = await redis.publish(_command_channel(load_generator_id), json.dumps({
+                "reply_to": reply_channel,
+                "command": command,
+                "payload": payload or {},
+                "timeout": timeout
+            }))
+            if not receivers:
+                raise ConnectionError(f"No agent connected for load generator {load_generator_id}")
+            
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError(f"Agent command {command} timed out after {timeout}s")
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+                if message is not None:
+                    return json.loads(message["data"])
+        finally:
+            await pubsub.unsubscribe(reply_channel)
+            await pubsub.close()
+    
+    async def handle_message(self, session: AgentSession, message: Dict[str, Any]):
+        """处理Agent推送的消息"""
+        session.last_seen = time.monotonic()
+        message_type = message.get("type")
+        
+        if message_type == "sample":
+            session.latest_sample = message.get("data") or {}
+            session.latest_sample_at = session.last_seen
+            await self._save_state(session, {
+                "sample": json.dumps(session.latest_sample),
+                "sample_at": time.time(),
+                "last_seen": time.time()
+            })
+            if session.last_seen - session.last_persisted >= settings.AGENT_SAMPLE_PERSIST_INTERVAL:
+                session.last_persisted = session.last_seen
+                # 数据库写入是同步操作，放到线程池中执行，避免阻塞其他Agent连接
+                changes = await run_in_threadpool(self._persist_sample, session.load_generator_id, session.latest_sample)
+                await publish_status_changes(changes)
+        elif message_type == "locust_stats":
+            data = message.get("data") or {}
+            execution_id = data.get("execution_id")
+            if execution_id is not None:
+                if data.get("finished"):
+                    session.locust_stats.pop(execution_id, None)
+                else:
+                    session.locust_stats[execution_id] = data
+                await self._save_stats(session, execution_id, None if data.get("finished") else data)
+        elif message_type == "command_result":
+            future = session.pending.get(message.get("id"))
+            if future is not None and not future.done():
+                future.set_result(message.get("result") or {})
+        elif message_type != "ping":
+            logger.warning(f"Unknown agent message type from load generator {session.load_generator_id}: {message_type}")
+    
+    async def _send_local(
+        self,
+        session: AgentSession,
+        command: str,
+        payload: Optional[Dict[str, Any]],
+        timeout: float
+    ) -> Dict[str, Any]:
+        """通过本进程持有的连接发送命令"""
+        command_id = next(self._command_ids)
+        future = asyncio.get_running_loop().create_future()
+        session.pending[command_id] = future
+        try:
+            await session.websocket.send_json({
+                "type": "command",
+                "id": command_id,
+                "command": command,
+                "payload": payload or {}
+            })
+            return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            session.pending.pop(command_id, None)
+    
+    async def _relay_commands(self, session: AgentSession):
+        """接收其他进程转发的命令，通过本进程的连接下发并回传结果"""
+        channel = _command_channel(session.load_generator_id)
+        try:
+            redis = await redis_client.get_redis()
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(channel)
+        except Exception as e:
+            logger.warning(f"Agent command relay unavailable for load generator {session.load_generator_id}: {str(e)}")
+            return
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    asyncio.ensure_future(self._handle_relayed(session, redis, json.loads(message["data"])))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Agent command relay for load generator {session.load_generator_id} stopped: {str(e)}")
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.close()
+    
+    async def _handle_relayed(self, session: AgentSession, redis, request: Dict[str, Any]):
+        """执行一条转发的命令"""
+        try:
+            # Agent已重连到其他进程时由新连接所在进程处理，避免命令被执行两次
+            if await redis.hget(_state_key(session.load_generator_id), "session") != session.session_id:
+                return
+            result = await self._send_local(session, request["command"], request.get("payload"), request["timeout"])
+        except Exception as e:
+            result = {"success": False, "message": str(e) or type(e).__name__}
+        try:
+            await redis.publish(request["reply_to"], json.dumps(result))
+        except Exception as e:
+            logger.warning(f"Failed to return relayed agent command result: {str(e)}")
+    
+    async def _save_state(self, session: AgentSession, mapping: Dict[str, Any], reset: bool = False):
+        """写入共享状态并续期（Redis不可用时只影响其他进程的可见性）"""
+        key = _state_key(session.load_generator_id)
+        try:
+            redis = await redis_client.get_redis()
+            pipe = redis.pipeline()
+            if reset:
+                pipe.delete(key, _stats_key(session.load_generator_id))
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, settings.AGENT_SAMPLE_STALE_SECONDS)
+            pipe.expire(_stats_key(session.load_generator_id), settings.AGENT_SAMPLE_STALE_SECONDS)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to save agent state for load generator {session.load_generator_id}: {str(e)}")
+    
+    async def _save_stats(self, session: AgentSession, execution_id: int, data: Optional[Dict[str, Any]]):
+        """写入或删除一次执行的Locust实时统计"""
+        key = _stats_key(session.load_generator_id)
+        try:
+            redis = await redis_client.get_redis()
+            if data is None:
+                await redis.hdel(key, str(execution_id))
+            else:
+                pipe = redis.pipeline()
+                pipe.hset(key, str(execution_id), json.dumps(data))
+                pipe.expire(key, settings.AGENT_SAMPLE_STALE_SECONDS)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to save agent stats for load generator {session.load_generator_id}: {str(e)}")
+    
+    async def _load_state(self, load_generator_id: int) -> Dict[str, str]:
+        try:
+            redis = await redis_client.get_redis()
+            return await redis.hgetall(_state_key(load_generator_id))
+        except Exception as e:
+            logger.warning(f"Failed to read agent state for load generator {load_generator_id}: {str(e)}")
+            return {}
+    
+    def _persist_sample(self, load_generator_id: int, sample: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """将Agent样本写入压测机状态（按AGENT_SAMPLE_PERSIST_INTERVAL节流），返回状态变化"""
+        db = SessionLocal()
+        try:
+            previous_status = db.query(LoadGenerator.status).filter(LoadGenerator.id == load_generator_id).scalar()
+            changes = StatusEventService(db).apply_updates(
+                [{
+                    "id": load_generator_id,
+                    "status": "online",
+                    "last_heartbeat": datetime.utcnow(),
+                    "cpu_usage": sample.get("cpu_usage", 0.0),
+                    "memory_usage": sample.get("memory_usage", 0.0),
+                    "network_usage": sample.get("network_usage", 0.0)
+                }],
+                {load_generator_id: previous_status},
+                "agent",
+                {load_generator_id: "Agent sample received"}
+            )
+            ResourceHistoryService(db).record_samples([(load_generator_id, sample)])
+            db.commit()
+            return changes
+        except Exception as e:
+            logger.error(f"Failed to persist agent sample for load generator {load_generator_id}: {str(e)}")
+            db.rollback()
+            return []
+        finally:
+            db.close()
+    
+    def _stop_relay(self, session: AgentSession):
+        if session.relay_task is not None:
+            session.relay_task.cancel()
+            session.relay_task = None
+    
+    def _fail_pending(self, session: AgentSession, reason: str):
+        for future in session.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(reason))
+        session.pending.clear()
+
+
+# 创建全局Agent注册表实例
+agent_registry = AgentRegistry()
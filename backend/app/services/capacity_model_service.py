@@ -0,0 +1,232 @@
+"""
+压测机容量模型服务
+
+从已完成执行的历史结果中学习每个Worker核心可达到的RPS（按压测机、场景类型和脚本类型区分），
+并据此预测达到目标RPS所需的Worker数量和压测机数量。
+"""
+import logging
+import math
+from statistics import median
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..models.load_generator import LoadGenerator
+from ..models.test_management import TestExecution, TestTask, TestScript
+from ..services.load_generator_service import LoadGeneratorService
+
+logger = logging.getLogger(__name__)
+
+# 未使用自定义脚本的任务按平台生成的基础脚本归类
+GENERATED_SCRIPT_TYPE = "generated"
+
+
+class CapacityModelService:
+    """压测机容量模型服务"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.load_generator_service = LoadGeneratorService(db)
+    
+    def _load_observations(self) -> List[Dict[str, Any]]:
+        """
+        读取历史执行，换算为每Worker核心的RPS
+        
+        按实际运行的Locust进程数归一化（每个进程最多使用一个核心，与配置的worker_count无关）。
+        受压测机瓶颈影响的执行直接反映单核上限；未饱和的执行按CPU峰值线性外推到饱和阈值。
+        """
+        rows = self.db.query(
+            TestExecution.load_generator_id,
+            TestExecution.requests_per_second,
+            TestExecution.generator_bound,
+            TestExecution.generator_peak_cpu,
+            TestTask.scenario_type,
+            TestScript.script_type
+        ).join(
+            TestTask, TestExecution.task_id == TestTask.id
+        ).outerjoin(
+            TestScript, TestTask.script_id == TestScript.id
+        ).filter(
+            and_(
+                TestExecution.status == "completed",
+                TestExecution.requests_per_second > 0
+            )
+        ).order_by(TestExecution.completed_at.desc()).limit(settings.CAPACITY_MODEL_HISTORY_LIMIT).all()
+        
+        threshold = settings.GENERATOR_SATURATION_CPU_THRESHOLD
+        observations = []
+        for row in rows:
+            rps_per_core = row.requests_per_second / settings.LOCUST_PROCESSES_PER_EXECUTION
+            
+            if row.generator_bound:
+                saturated = True
+            elif row.generator_peak_cpu and row.generator_peak_cpu >= settings.CAPACITY_MODEL_MIN_PEAK_CPU:
+                rps_per_core *= threshold / min(row.generator_peak_cpu, threshold)
+                saturated = False
+            else:
+                # CPU峰值过低（受目标服务或用户数限制），无法外推
+                continue
+            
+            observations.append({
+                "load_generator_id": row.load_generator_id,
+                "scenario_type": row.scenario_type or "single",
+                "script_type": row.script_type or GENERATED_SCRIPT_TYPE,
+                "rps_per_core": rps_per_core,
+                "saturated": saturated
+            })
+        return observations
+    
+    def _summarize(self, observations: List[Dict[str, Any]]) -> Dict[str, Any]:
+        values = [item["rps_per_core"] for item in observations]
+        return {
+            "rps_per_core": round(median(values), 2),
+            "min_rps_per_core": round(min(values), 2),
+            "max_rps_per_core": round(max(values), 2),
+            "samples": len(values),
+            "saturated_samples": sum(1 for item in observations if item["saturated"])
+        }
+    
+    def get_model(self) -> List[Dict[str, Any]]:
+        """按压测机、场景类型和脚本类型汇总的单核RPS"""
+        groups: Dict[Tuple[int, str, str], List[Dict[str, Any]]] = {}
+        for item in self._load_observations():
+            key = (item["load_generator_id"], item["scenario_type"], item["script_type"])
+            groups.setdefault(key, []).append(item)
+        
+        return [
+            {
+                "load_generator_id": load_generator_id,
+                "scenario_type": scenario_type,
+                "script_type": script_type,
+                **self._summarize(items)
+            }
+            for (load_generator_id, scenario_type, script_type), items in sorted(groups.items())
+        ]
+    
+    def _estimate_rate(
+        self,
+        observations: List[Dict[str, Any]],
+        load_generator_id: int,
+        scenario_type: str,
+        script_type: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        估算单核RPS，样本不足时逐级放宽：
+        同压测机同类型 -> 全部压测机同类型 -> 同场景类型 -> 全部历史
+        """
+        levels = [
+            ("generator", lambda item: item["load_generator_id"] == load_generator_id
+                and item["scenario_type"] == scenario_type
+                and (script_type is None or item["script_type"] == script_type)),
+            ("fleet", lambda item: item["scenario_type"] == scenario_type
+                and (script_type is None or item["script_type"] == script_type)),
+            ("scenario_type", lambda item: item["scenario_type"] == scenario_type),
+            ("all", lambda item: True)
+        ]
+        for level, matches in levels:
+            matched = [item for item in observations if matches(item)]
+            if len(matched) >= settings.CAPACITY_MODEL_MIN_SAMPLES:
+                return {"basis": level, **self._summarize(matched)}
+        return None
+    
+    async def predict(
+        self,
+        target_rps: float,
+        scenario_type: str = "single",
+        script_type: Optional[str] = None,
+        load_generator_ids: Optional[List[int]] = None,
+        use_live_capacity: bool = True
+    ) -> Dict[str, Any]:
+        """
+        预测达到目标RPS所需的Worker与压测机
+        
+        按单台压测机可提供的RPS从高到低依次分配。每台压测机的Worker数（Locust进程数）不超过
+        一次执行实际启动的进程数LOCUST_PROCESSES_PER_EXECUTION，也不超过当前剩余资源可运行的数量
+        （use_live_capacity=False时按物理核心计算）。
+        
+        Returns:
+            Dict: 是否可行、总Worker数、逐台分配方案及所用模型依据
+        """
+        observations = self._load_observations()
+        
+        query = self.db.query(LoadGenerator).filter(LoadGenerator.is_active == True)
+        if load_generator_ids:
+            query = query.filter(LoadGenerator.id.in_(load_generator_ids))
+        else:
+            query = query.filter(LoadGenerator.status == "online")
+        
+        rates = {}
+        for load_generator in query.all():
+            rate = self._estimate_rate(observations, load_generator.id, scenario_type, script_type)
+            if rate is not None:
+                rates[load_generator.id] = (load_generator, rate)
+        
+        # 多进程启动时由父进程协调各Worker进程，按需要Master计算
+        processes = settings.LOCUST_PROCESSES_PER_EXECUTION
+        master_enabled = processes > 1
+        fits = {}
+        if use_live_capacity and rates:
+            fits = await self.load_generator_service.get_fits_now(
+                [load_generator for load_generator, _ in rates.values()], master_enabled=master_enabled
+            )
+        
+        candidates = []
+        for load_generator, rate in rates.values():
+            if use_live_capacity:
+                max_workers = fits[load_generator.id]["max_worker_count"]
+            else:
+                # 预留1核给系统（多进程时再预留1核给Master）
+                reserved_cores = 2 if master_enabled else 1
+                max_workers = max((load_generator.physical_cores or load_generator.cpu_cores or 1) - reserved_cores, 1)
+            max_workers = min(max_workers, processes)
+            if max_workers < 1:
+                continue
+            
+            planned_rps_per_core = rate["rps_per_core"] * settings.CAPACITY_SAFETY_FACTOR
+            candidates.append({
+                "load_generator_id": load_generator.id,
+                "name": load_generator.name,
+                "max_workers": max_workers,
+                "rps_per_core": planned_rps_per_core,
+                "model": rate
+            })
+        
+        if not candidates:
+            return {
+                "feasible": False,
+                "message": "没有足够的历史执行数据或可用压测机，无法预测",
+                "target_rps": target_rps,
+                "plan": []
+            }
+        
+        candidates.sort(key=lambda item: item["rps_per_core"] * item["max_workers"], reverse=True)
+        
+        plan = []
+        remaining = target_rps
+        for candidate in candidates:
+            if remaining <= 0:
+                break
+            workers = min(math.ceil(remaining / candidate["rps_per_core"]), candidate["max_workers"])
+            predicted_rps = workers * candidate["rps_per_core"]
+            remaining -= predicted_rps
+            plan.append({
+                "load_generator_id": candidate["load_generator_id"],
+                "name": candidate["name"],
+                "worker_count": workers,
+                "predicted_rps": round(predicted_rps, 2),
+                "rps_per_core": round(candidate["rps_per_core"], 2),
+                "model": candidate["model"]
+            })
+        
+        feasible = remaining <= 0
+        total_workers = sum(item["worker_count"] for item in plan)
+        return {
+            "feasible": feasible,
+            "message": "预测完成" if feasible else f"当前可用压测机最多支撑约{round(target_rps - remaining, 2)} RPS",
+            "target_rps": target_rps,
+            "predicted_rps": round(target_rps - remaining, 2),
+            "total_workers": total_workers,
+            "load_generator_count": len(plan),
+            "safety_factor": settings.CAPACITY_SAFETY_FACTOR,
+            "plan": plan
+        }
@@ -0,0 +1,199 @@
+"""
+压测机配置推荐
+
+根据连接测试采集的硬件拓扑（物理核心、NUMA节点、网卡线速、句柄与端口限制）
+推荐LoadGeneratorConfig的Worker数量、每Worker资源和Master放置方式。
+
+Locust的Master和Worker都是单进程，只能用满一个核心，因此按物理核心
+（而非超线程逻辑核心）一核一Worker分配。
+"""
+import math
+from typing import Any, Dict, List, Optional
+from ..models.load_generator import LoadGenerator
+
+# 每个Worker建议的内存范围(GB)
+WORKER_MEMORY_MIN_GB = 1.0
+WORKER_MEMORY_MAX_GB = 4.0
+# Master内存(GB)
+MASTER_MEMORY_GB = 1.0
+# 网卡可分配给压测流量的比例
+NIC_USABLE_RATIO = 0.9
+# 单Worker建议的最小文件句柄数
+MIN_OPEN_FILES_PER_WORKER = 10000
+
+
+def extract_topology(facts: Dict[str, Any]) -> Dict[str, Optional[int]]:
+    """从SYSTEM_PROBE采集结果中提取拓扑字段"""
+    cpu = facts.get("cpu") or {}
+    limits = facts.get("limits") or {}
+    
+    # 主网卡：已启用的物理网卡中线速最高者
+    speeds = [
+        nic["speed_mbps"] for nic in facts.get("nics") or []
+        if nic.get("speed_mbps") and not nic.get("virtual") and nic.get("operstate") in ("up", "unknown")
+    ]
+    port_range = limits.get("ephemeral_port_range")
+    
+    return {
+        "physical_cores": cpu.get("physical_cores"),
+        "cpu_sockets": cpu.get("sockets"),
+        "numa_nodes": len(facts.get("numa") or []) or None,
+        "nic_speed_mbps": max(speeds) if speeds else None,
+        "max_open_files": limits.get("nofile_soft"),
+        "ephemeral_ports": port_range[1] - port_range[0] + 1 if port_range else None
+    }
+
+
+def _split_evenly(total: int, parts: int) -> List[int]:
+    """将total尽量均匀地分到parts份"""
+    return [total // parts + (1 if index < total % parts else 0) for index in range(parts)]
+
+
+def recommend_config(load_generator: LoadGenerator) -> Dict[str, Any]:
+    """
+    推荐压测机配置
+    
+    推荐结果满足_validate_config的约束（系统预留 + Master + Worker不超过压测机核心数与内存，
+    每个Worker至少1核1GB）；连最小配置（1个Worker、不启用Master）都放不下时feasible为False、config为None。
+    
+    Returns:
+        Dict: feasible、config（可直接用于创建配置的字段）、numa_layout、reasons、warnings、topology
+    """
+    reasons = []
+    warnings = []
+    topology = {
+        "logical_cores": load_generator.cpu_cores,
+        "physical_cores": load_generator.physical_cores,
+        "cpu_sockets": load_generator.cpu_sockets,
+        "numa_nodes": load_generator.numa_nodes,
+        "memory_gb": load_generator.memory_gb,
+        "nic_speed_mbps": load_generator.nic_speed_mbps,
+        "max_open_files": load_generator.max_open_files,
+        "ephemeral_ports": load_generator.ephemeral_ports
+    }
+    
+    physical_cores = load_generator.physical_cores or load_generator.cpu_cores or 1
+    # 配置校验按逻辑核心数计算
+    logical_cores = load_generator.cpu_cores or physical_cores
+    numa_nodes = load_generator.numa_nodes or 1
+    memory_gb = load_generator.memory_gb or 0.0
+    if not load_generator.physical_cores:
+        warnings.append("未采集到硬件拓扑，按逻辑核心数估算，请先执行连接测试")
+    elif load_generator.cpu_cores and load_generator.cpu_cores > physical_cores:
+        reasons.append(
+            f"按{physical_cores}个物理核心分配（{load_generator.cpu_cores}个逻辑核心含超线程，"
+            f"同一物理核上的两个Locust进程会互相争抢）"
+        )
+    
+    # 系统预留：16核以上的机器预留2核
+    system_cpu_cores = 2 if physical_cores >= 16 else 1
+    system_memory_gb = max(1.0, round(memory_gb * 0.05, 1))
+    
+    # 剩余核心全部给Worker；多于一个Worker时需要Master协调
+    available_cores = physical_cores - system_cpu_cores
+    if available_cores < 1:
+        if logical_cores - system_cpu_cores < 1:
+            return _infeasible(
+                f"CPU核心不足：系统预留{system_cpu_cores}核后没有可分配给Worker的核心"
+                f"（共{logical_cores}个逻辑核心）",
+                warnings, topology
+            )
+        # 物理核心不够时Worker使用超线程核心
+        available_cores = 1
+        warnings.append("物理核心不足，Worker与系统共用物理核心（超线程），压测能力有限")
+    master_enabled = available_cores > 1
+    worker_count = available_cores - 1 if master_enabled else 1
+    
+    # 内存：平均分给Worker，限制在合理范围内，不够时减少Worker
+    usable_memory = memory_gb - system_memory_gb - (MASTER_MEMORY_GB if master_enabled else 0)
+    if usable_memory / worker_count < WORKER_MEMORY_MIN_GB:
+        worker_count = int(usable_memory // WORKER_MEMORY_MIN_GB)
+        if worker_count <= 1 and master_enabled:
+            # 只剩一个Worker时不需要Master，省下的内存留给Worker
+            master_enabled = False
+            usable_memory += MASTER_MEMORY_GB
+            worker_count = 1
+        if worker_count < 1 or usable_memory < WORKER_MEMORY_MIN_GB:
+            if not load_generator.memory_gb:
+                return _infeasible("未采集到内存信息，请先执行连接测试", warnings, topology)
+            return _infeasible(
+                f"内存不足：系统预留{system_memory_gb}GB后不足以运行一个Worker"
+                f"（至少需要{WORKER_MEMORY_MIN_GB}GB，共{memory_gb}GB）",
+                warnings, topology
+            )
+        warnings.append(f"内存不足以为每个物理核心配置一个Worker，Worker数量减少为{worker_count}")
+    # 按0.5GB取整
+    per_worker = math.floor(usable_memory / worker_count * 2) / 2
+    worker_memory_gb = min(max(per_worker, WORKER_MEMORY_MIN_GB), WORKER_MEMORY_MAX_GB)
+    
+    # 网络：按主网卡线速平均分配
+    system_network_mbps = 50
+    master_network_mbps = 100
+    worker_network_mbps = 100
+    if load_generator.nic_speed_mbps:
+        usable_mbps = (
+            load_generator.nic_speed_mbps * NIC_USABLE_RATIO
+            - system_network_mbps
+            - (master_network_mbps if master_enabled else 0)
+        )
+        worker_network_mbps = max(int(usable_mbps // worker_count), 1)
+        reasons.append(f"主网卡线速{load_generator.nic_speed_mbps}Mbps，每个Worker分配{worker_network_mbps}Mbps")
+    else:
+        warnings.append("未识别到物理网卡线速，网络带宽按默认值配置")
+    
+    # NUMA放置建议：系统预留与Master放在node 0，Worker均匀分布到各节点（启动时不做绑定）
+    worker_nodes = _split_evenly(worker_count, numa_nodes)
+    numa_layout = [
+        {"node": node, "workers": workers, "master": master_enabled and node == 0}
+        for node, workers in enumerate(worker_nodes)
+    ]
+    if numa_nodes > 1:
+        reasons.append(
+            f"{numa_nodes}个NUMA节点，建议Worker均匀分布到各节点、Master放在node 0"
+            f"（平台启动Locust时不做绑定，需要时可用numactl手动绑定）"
+        )
+    
+    # 句柄与端口限制
+    if load_generator.max_open_files and load_generator.max_open_files < MIN_OPEN_FILES_PER_WORKER:
+        warnings.append(
+            f"文件句柄软限制仅{load_generator.max_open_files}，每个Worker的并发连接数受限，建议调高ulimit -n"
+        )
+    if load_generator.ephemeral_ports:
+        reasons.append(f"本地临时端口{load_generator.ephemeral_ports}个，单目标地址并发连接数不超过该值")
+    
+    reasons.insert(0, f"{worker_count}个Worker各占1个物理核心，{'启用' if master_enabled else '不启用'}Master")
+    
+    return {
+        "feasible": True,
+        "config": {
+            "config_name": f"推荐配置-{worker_count}Worker",
+            "master_enabled": master_enabled,
+            "master_cpu_cores": 1,
+            "master_memory_gb": MASTER_MEMORY_GB,
+            "master_network_mbps": master_network_mbps,
+            "worker_count": worker_count,
+            "worker_cpu_cores": 1,
+            "worker_memory_gb": worker_memory_gb,
+            "worker_network_mbps": worker_network_mbps,
+            "system_cpu_cores": system_cpu_cores,
+            "system_memory_gb": system_memory_gb,
+            "system_network_mbps": system_network_mbps,
+            "description": "根据硬件拓扑自动推荐"
+        },
+        "numa_layout": numa_layout,
+        "reasons": reasons,
+        "warnings": warnings,
+        "topology": topology
+    }
+
+
+def _infeasible(reason: str, warnings: List[str], topology: Dict[str, Any]) -> Dict[str, Any]:
+    """压测机资源连最小配置都放不下时的推荐结果"""
+    return {
+        "feasible": False,
+        "config": None,
+        "numa_layout": [],
+        "reasons": [reason],
+        "warnings": warnings,
+        "topology": topology
+    }
@@ -0,0 +1,57 @@
+"""
+状态变更事件推送
+
+压测机状态变化和执行状态转换通过Redis发布/订阅广播，API进程的SSE端点订阅后推送给前端，
+前端无需轮询数据库。发布失败只记录日志，不影响业务流程。
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from ..core.redis import redis_client
+from .fleet_status_service import invalidate_fleet_status
+
+logger = logging.getLogger(__name__)
+
+EVENT_CHANNEL = "pfp:events"
+
+LOAD_GENERATOR_STATUS = "load_generator.status"
+EXECUTION_STATUS = "execution.status"
+
+
+async def publish_event(event_type: str, data: Dict[str, Any]):
+    """发布事件"""
+    try:
+        redis = await redis_client.get_redis()
+        await redis.publish(EVENT_CHANNEL, json.dumps({
+            "type": event_type,
+            "data": data,
+            "timestamp": datetime.utcnow().isoformat()
+        }, default=str))
+    except Exception as e:
+        logger.warning(f"Failed to publish {event_type} event: {str(e)}")
+
+
+async def publish_status_changes(changes: List[Dict[str, Any]]):
+    """发布压测机状态变化（StatusEventService.apply_updates的返回值）"""
+    if changes:
+        await invalidate_fleet_status()
+    for change in changes:
+        await publish_event(LOAD_GENERATOR_STATUS, change)
+
+
+async def publish_execution_status(execution, from_status: Optional[str]):
+    """发布执行状态转换"""
+    if execution.status == from_status:
+        return
+    await invalidate_fleet_status()
+    await publish_event(EXECUTION_STATUS, {
+        "execution_id": execution.id,
+        "task_id": execution.task_id,
+        "load_generator_id": execution.load_generator_id,
+        "from_status": from_status,
+        "to_status": execution.status,
+        "started_at": execution.started_at,
+        "completed_at": execution.completed_at,
+        "error_message": execution.error_message
+    })
@@ -0,0 +1,232 @@
+"""
+压测机故障检测服务（phi-accrual）
+
+按压测机调度轻量探测（TCP连接SSH端口）：执行中的压测机每FAILURE_DETECTOR_BUSY_INTERVAL秒探测一次，
+空闲压测机每FAILURE_DETECTOR_IDLE_INTERVAL秒探测一次。每次探测成功记为一次到达，
+根据历史到达间隔的分布计算怀疑度phi，超过阈值即标记离线，无需等待固定的心跳周期。
+有在线Agent的压测机不做TCP探测，Agent推送的样本即视为到达（只部署Agent的压测机可能不开放SSH）。
+
+状态保存在Redis中，API进程和Celery Worker共享。
+"""
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime
+from statistics import mean, pstdev
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..core.redis import redis_client
+from ..core.remote_executor import remote_executor
+from ..models.load_generator import LoadGenerator
+from ..models.test_management import TestExecution
+from .agent_service import agent_registry
+from .status_event_service import StatusEventService
+from .event_bus import publish_status_changes
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "pfp:failure_detector"
+# 长时间中断后的首个到达间隔超过期望间隔的该倍数时不计入历史
+MAX_INTERVAL_FACTOR = 3
+# 标准差下限（相对期望间隔），避免间隔过于规律时phi对微小抖动过度敏感
+MIN_STD_RATIO = 0.25
+
+
+def phi(elapsed: float, intervals: List[float], expected_interval: float) -> float:
+    """
+    计算怀疑度phi = -log10(P(下一次到达晚于elapsed))
+    
+    到达间隔按正态分布近似，允许额外停顿一个探测间隔（单次探测失败不触发怀疑）。
+    """
+    if intervals:
+        mean_interval = mean(intervals)
+        std = pstdev(intervals)
+    else:
+        mean_interval = expected_interval
+        std = 0.0
+    std = max(std, expected_interval * MIN_STD_RATIO)
+    
+    y = (elapsed - mean_interval - expected_interval) / std
+    e = math.exp(-y * (1.5976 + 0.070566 * y * y))
+    if elapsed > mean_interval + expected_interval:
+        return -math.log10(e / (1.0 + e))
+    return -math.log10(1.0 - 1.0 / (1.0 + e))
+
+
+class FailureDetector:
+    """压测机故障检测器"""
+    
+    def __init__(self, db: Session, redis):
+        self.db = db
+        self.redis = redis
+    
+    @staticmethod
+    def _state_key(load_generator_id: int) -> str:
+        return f"{KEY_PREFIX}:{load_generator_id}"
+    
+    @staticmethod
+    def _intervals_key(load_generator_id: int) -> str:
+        return f"{KEY_PREFIX}:{load_generator_id}:intervals"
+    
+    async def _load_states(self, load_generator_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """批量读取检测状态"""
+        pipe = self.redis.pipeline()
+        for load_generator_id in load_generator_ids:
+            pipe.hgetall(self._state_key(load_generator_id))
+            pipe.lrange(self._intervals_key(load_generator_id), 0, -1)
+        values = await pipe.execute()
+        
+        states = {}
+        for index, load_generator_id in enumerate(load_generator_ids):
+            state = values[index * 2]
+            states[load_generator_id] = {
+                "last_arrival": float(state["last_arrival"]) if state.get("last_arrival") else None,
+                "next_probe": float(state.get("next_probe") or 0),
+                "mode": state.get("mode"),
+                "intervals": [float(value) for value in values[index * 2 + 1]]
+            }
+        return states
+    
+    def _busy_ids(self, load_generator_ids: List[int]) -> set:
+        rows = self.db.query(TestExecution.load_generator_id).filter(
+            TestExecution.load_generator_id.in_(load_generator_ids),
+            TestExecution.status == "running"
+        ).distinct().all()
+        return {row.load_generator_id for row in rows}
+    
+    async def _probe(self, load_generator) -> bool:
+        try:
+            return await remote_executor.check_port(
+                load_generator.host, load_generator.port, timeout=settings.FAILURE_DETECTOR_PROBE_TIMEOUT
+            ) == 0
+        except Exception:
+            return False
+    
+    async def tick(self) -> Dict[str, Any]:
+        """
+        执行一轮检测：探测到期的压测机、更新到达历史、按phi标记离线
+        
+        Returns:
+            Dict: 探测数量、成功数量及本轮被标记离线的压测机
+        """
+        load_generators = self.db.query(
+            LoadGenerator.id, LoadGenerator.name, LoadGenerator.host, LoadGenerator.port, LoadGenerator.status
+        ).filter(LoadGenerator.is_active == True).all()
+        if not load_generators:
+            return {"probed": 0, "succeeded": 0, "marked_offline": []}
+        
+        ids = [load_generator.id for load_generator in load_generators]
+        states = await self._load_states(ids)
+        busy_ids = self._busy_ids(ids)
+        now = time.time()
+        
+        due = []
+        reset_ids = set()
+        pipe = self.redis.pipeline()
+        for load_generator in load_generators:
+            state = states[load_generator.id]
+            mode = "busy" if load_generator.id in busy_ids else "idle"
+            if state["mode"] != mode:
+                # 探测频率变化后旧的间隔分布不再适用，重新积累并立即探测
+                pipe.delete(self._intervals_key(load_generator.id))
+                pipe.hset(self._state_key(load_generator.id), mapping={"mode": mode, "last_arrival": now})
+                state.update({"mode": mode, "last_arrival": now, "intervals": [], "next_probe": 0})
+                reset_ids.add(load_generator.id)
+            if state["next_probe"] <= now:
+                due.append(load_generator)
+        
+        agent_ids = await agent_registry.live_agent_ids(load_generator.id for load_generator in due)
+        semaphore = asyncio.Semaphore(settings.HEARTBEAT_CONCURRENCY)
+        
+        async def probe(load_generator) -> bool:
+            if load_generator.id in agent_ids:
+                return True
+            async with semaphore:
+                return await self._probe(load_generator)
+        
+        outcomes = await asyncio.gather(*(probe(load_generator) for load_generator in due))
+        
+        arrived_at = time.time()
+        for load_generator, alive in zip(due, outcomes):
+            state = states[load_generator.id]
+            interval = self._interval(state["mode"])
+            pipe.hset(self._state_key(load_generator.id), "next_probe", now + interval)
+            if not alive:
+                continue
+            if state["last_arrival"] is not None and load_generator.id not in reset_ids:
+                elapsed = arrived_at - state["last_arrival"]
+                if elapsed <= interval * MAX_INTERVAL_FACTOR:
+                    pipe.rpush(self._intervals_key(load_generator.id), elapsed)
+                    pipe.ltrim(self._intervals_key(load_generator.id), -settings.FAILURE_DETECTOR_WINDOW_SIZE, -1)
+                    state["intervals"].append(elapsed)
+            pipe.hset(self._state_key(load_generator.id), "last_arrival", arrived_at)
+            state["last_arrival"] = arrived_at
+        await pipe.execute()
+        
+        marked_offline = []
+        for load_generator in load_generators:
+            if load_generator.status != "online":
+                continue
+            suspicion = self._phi(states[load_generator.id], arrived_at)
+            if suspicion is not None and suspicion > settings.FAILURE_DETECTOR_PHI_THRESHOLD:
+                marked_offline.append({"id": load_generator.id, "name": load_generator.name, "phi": round(suspicion, 2)})
+                logger.warning(f"Load generator {load_generator.name} suspected down (phi={suspicion:.2f}), marked offline")
+        if marked_offline:
+            changes = StatusEventService(self.db).apply_updates(
+                [{"id": item["id"], "status": "offline"} for item in marked_offline],
+                {item["id"]: "online" for item in marked_offline},
+                "failure_detector",
+                {item["id"]: f"phi={item['phi']}" for item in marked_offline}
+            )
+            self.db.commit()
+            await publish_status_changes(changes)
+        
+        return {"probed": len(due), "succeeded": sum(1 for alive in outcomes if alive), "marked_offline": marked_offline}
+    
+    @staticmethod
+    def _interval(mode: Optional[str]) -> int:
+        return settings.FAILURE_DETECTOR_BUSY_INTERVAL if mode == "busy" else settings.FAILURE_DETECTOR_IDLE_INTERVAL
+    
+    def _phi(self, state: Dict[str, Any], now: float) -> Optional[float]:
+        if state["last_arrival"] is None:
+            return None
+        return phi(now - state["last_arrival"], state["intervals"], self._interval(state["mode"]))
+    
+    async def get_suspicion(self) -> List[Dict[str, Any]]:
+        """获取各压测机当前的怀疑度"""
+        load_generators = self.db.query(LoadGenerator.id, LoadGenerator.name, LoadGenerator.status).filter(
+            LoadGenerator.is_active == True
+        ).all()
+        states = await self._load_states([load_generator.id for load_generator in load_generators])
+        now = time.time()
+        
+        result = []
+        for load_generator in load_generators:
+            state = states[load_generator.id]
+            suspicion = self._phi(state, now)
+            result.append({
+                "id": load_generator.id,
+                "name": load_generator.name,
+                "status": load_generator.status,
+                "mode": state["mode"],
+                "probe_interval": self._interval(state["mode"]),
+                "phi": round(suspicion, 2) if suspicion is not None else None,
+                "suspected": suspicion is not None and suspicion > settings.FAILURE_DETECTOR_PHI_THRESHOLD,
+                "last_arrival": datetime.utcfromtimestamp(state["last_arrival"]) if state["last_arrival"] else None,
+                "samples": len(state["intervals"])
+            })
+        return result
+
+
+# 全局故障检测函数，供Celery任务使用
+async def failure_detection_task():
+    """故障检测任务"""
+    db = SessionLocal()
+    try:
+        return await FailureDetector(db, await redis_client.get_redis()).tick()
+    finally:
+        await redis_client.close()
+        db.close()
@@ -1,112 +1,658 @@
 """
 MinIO对象存储服务
+
+场景文件按内容寻址存储：对象名称由内容SHA-256决定，相同内容只上传一次，
+多个场景文件通过blob_id引用同一个FileBlob，引用计数归零时删除对象。
 """
 import hashlib
 import io
-from typing import Optional
+import mimetypes
+import posixpath
+import tarfile
+import tempfile
+import uuid
+import zipfile
+import zlib
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
 from fastapi import UploadFile
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from minio import Minio
+from minio.commonconfig import CopySource
 from minio.error import S3Error
-from app.models.test_management import ScenarioFile
+from app.core.minio_client import minio_client as shared_minio_client
+from app.core.file_cache import file_cache
+from app.models.test_management import ScenarioFile, FileBlob
 from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 计算哈希时每次读取的大小
+HASH_CHUNK_SIZE = 1024 * 1024
+# 流式下载时每次读取的大小
+STREAM_CHUNK_SIZE = 1024 * 1024
+# 单个PUT请求的对象大小上限（S3/MinIO限制），更大的文件需通过API分片上传
+PRESIGNED_PUT_MAX_SIZE = 5 * 1024 * 1024 * 1024
+# 预签名直传的暂存对象前缀，校验通过后复制为内容对象
+UPLOAD_STAGING_PREFIX = "uploads/"
+# 支持批量上传的压缩包格式
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+class FileTooLargeError(ValueError):
+    """上传文件超过大小上限"""
+
+
+class ArchiveError(ValueError):
+    """压缩包格式不支持或内容不合法"""
+
+
+class _HashingReader:
+    """
+    边读边计算哈希与大小的文件包装
+    
+    按块读取，文件内容不会整体读入内存。
+    """
+    
+    def __init__(self, raw, max_size: int):
+        self.raw = raw
+        self.max_size = max_size
+        self.hasher = hashlib.sha256()
+        self.size = 0
+    
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.raw.read(size)
+        if chunk:
+            self.size += len(chunk)
+            if self.size > self.max_size:
+                raise FileTooLargeError(f"File size exceeds maximum allowed size of {self.max_size} bytes")
+            self.hasher.update(chunk)
+        return chunk
+
+
+def _archive_members(archive: IO[bytes], file_name: str) -> Iterator[Tuple[str, IO[bytes]]]:
+    """按顺序流式读取压缩包中的普通文件（目录、链接等跳过）"""
+    lower_name = file_name.lower()
+    if lower_name.endswith(".zip"):
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                with zf.open(info) as member:
+                    yield info.filename, member
+    elif lower_name.endswith(ARCHIVE_EXTENSIONS):
+        # 流式模式顺序读取，不需要先建立成员索引
+        with tarfile.open(fileobj=archive, mode="r|*") as tf:
+            for info in tf:
+                if not info.isfile():
+                    continue
+                yield info.name, tf.extractfile(info)
+    else:
+        raise ArchiveError(f"Unsupported archive type, expected one of: {', '.join(ARCHIVE_EXTENSIONS)}")
+
+
+def _member_file_name(name: str) -> Optional[str]:
+    """压缩包成员的文件名（保留相对目录）；越界路径、隐藏文件和macOS元数据返回None"""
+    name = posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+    if name in (".", "") or name.startswith("..") or len(name) > 255:
+        return None
+    if any(part.startswith(".") or part == "__MACOSX" for part in name.split("/")):
+        return None
+    return name
+
+
+def content_disposition(file_name: str) -> str:
+    """下载响应的Content-Disposition（文件名可能包含中文）"""
+    return f"attachment; filename*=UTF-8''{quote(file_name)}"
+
 
 class FileStorageService:
     """MinIO对象存储服务"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, minio_client: Optional[Minio] = None):
         self.db = db
-        self.minio_client = Minio(
-            settings.MINIO_ENDPOINT,
-            access_key=settings.MINIO_ACCESS_KEY,
-            secret_key=settings.MINIO_SECRET_KEY,
-            secure=settings.MINIO_SECURE
-        )
+        # 默认使用进程共享的客户端，bucket在首次使用时检查一次
+        self.minio_client = minio_client or shared_minio_client.get_ready_client()
         self.bucket_name = settings.MINIO_BUCKET_NAME
-        
-        # 确保bucket存在
-        self._ensure_bucket_exists()
     
     def save_file(self, scenario_id: int, file: UploadFile, description: str = None) -> ScenarioFile:
         """
         保存文件到MinIO对象存储
         
+        先在本地临时文件上按块计算SHA-256；内容已存在时直接引用，不再上传，
+        否则按MINIO_UPLOAD_PART_SIZE分片流式上传。对象按内容哈希寻址，上传前必须
+        得到哈希（用于确定对象名和去重），因此未命中时临时文件会被再读一遍；
+        若改为边上传边计算，则需先传到临时对象再服务端复制，代价更高。
+        脚本文件上限为MAX_FILE_SIZE，数据文件上限为MAX_DATA_FILE_SIZE。
+        
         Args:
             scenario_id: 场景ID
             file: 上传的文件
             description: 文件描述
-            
+        
         Returns:
             ScenarioFile: 保存的文件记录
+        
+        Raises:
+            FileTooLargeError: 文件超过大小上限
         """
         try:
-            # 生成对象名称
-            object_name = self._generate_object_name(scenario_id, file.filename)
-            
-            # 读取文件内容
-            file_content_bytes = file.file.read()
-            file_size = len(file_content_bytes)
+            content_type = file.content_type or "application/octet-stream"
             
-            # 计算文件哈希
-            file_hash = hashlib.md5(file_content_bytes).hexdigest()
+            # 计算内容哈希和大小（内容寻址需在上传前确定对象名，未命中时上传会再读一遍临时文件）
+            reader = _HashingReader(file.file, self.max_file_size(file.filename))
+            while reader.read(HASH_CHUNK_SIZE):
+                pass
+            sha256 = reader.hasher.hexdigest()
             
-            # 上传到MinIO
-            self.minio_client.put_object(
-                bucket_name=self.bucket_name,
-                object_name=object_name,
-                data=io.BytesIO(file_content_bytes),
-                length=file_size,
-                content_type=file.content_type or "application/octet-stream"
-            )
+            def open_stream():
+                file.file.seek(0)
+                return file.file
             
-            # 读取文件内容（小文件直接存储）
-            file_content = None
-            if file_size < 1024 * 1024:  # 小于1MB的文件
-                try:
-                    file_content = file_content_bytes.decode('utf-8')
-                except UnicodeDecodeError:
-                    # 如果不是文本文件，不存储内容
-                    pass
+            blob = self._acquire_blob(sha256, reader.size, content_type, open_stream)
+            scenario_file = self._create_record(scenario_id, file.filename, blob, content_type, description)
             
-            # 创建数据库记录
-            scenario_file = ScenarioFile(
-                scenario_id=scenario_id,
-                file_name=file.filename,
-                file_path=object_name,  # 存储MinIO对象名称
-                file_size=file_size,
-                file_type=file.content_type or "application/octet-stream",
-                file_hash=file_hash,
-                file_content=file_content,
-                description=description,
-                is_script=self._is_script_file(file.filename)
-            )
-            
-            self.db.add(scenario_file)
-            self.db.commit()
-            self.db.refresh(scenario_file)
-            
-            logger.info(f"File saved successfully to MinIO: {file.filename} -> {object_name}")
+            logger.info(f"File saved successfully to MinIO: {file.filename} -> {blob.object_name}")
             return scenario_file
-            
+        
         except Exception as e:
             logger.error(f"Failed to save file {file.filename} to MinIO: {e}")
             raise
     
+    def save_file_by_hash(
+        self,
+        scenario_id: int,
+        file_name: str,
+        sha256: str,
+        description: str = None
+    ) -> Optional[ScenarioFile]:
+        """
+        按内容哈希秒传：内容已存在时直接创建引用，无需上传
+        
+        Returns:
+            ScenarioFile: 保存的文件记录，内容不存在时返回None
+        """
+        blob = self._lock_blob(sha256.lower())
+        if not blob:
+            return None
+        return self._create_record(
+            scenario_id, file_name, blob, blob.content_type or "application/octet-stream", description
+        )
+    
+    def _create_record(
+        self,
+        scenario_id: int,
+        file_name: str,
+        blob: FileBlob,
+        content_type: str,
+        description: Optional[str]
+    ) -> ScenarioFile:
+        # 引用计数由ScenarioFile的插入事件维护；文件内容只存储在MinIO中
+        scenario_file = ScenarioFile(
+            scenario_id=scenario_id,
+            file_name=file_name,
+            file_path=blob.object_name,  # 存储MinIO对象名称
+            file_size=blob.size,
+            file_type=content_type,
+            file_hash=blob.sha256,
+            blob_id=blob.id,
+            description=description,
+            is_script=self._is_script_file(file_name)
+        )
+        
+        self.db.add(scenario_file)
+        self.db.commit()
+        self.db.refresh(scenario_file)
+        return scenario_file
+    
+    def _acquire_blob(
+        self,
+        sha256: str,
+        size: int,
+        content_type: str,
+        open_stream: Callable[[], io.IOBase]
+    ) -> FileBlob:
+        """获取内容对应的FileBlob（已加行锁），不存在时上传并创建"""
+        blob = self._lock_blob(sha256)
+        if blob:
+            return blob
+        
+        object_name = self._blob_object_name(sha256)
+        self.minio_client.put_object(
+            bucket_name=self.bucket_name,
+            object_name=object_name,
+            data=open_stream(),
+            length=size,
+            part_size=settings.MINIO_UPLOAD_PART_SIZE,
+            content_type=content_type
+        )
+        return self._register_blob(sha256, object_name, size, content_type)
+    
+    def _register_blob(self, sha256: str, object_name: str, size: int, content_type: str) -> FileBlob:
+        """为已写入MinIO的内容对象创建FileBlob记录"""
+        blob = FileBlob(sha256=sha256, object_name=object_name, size=size, content_type=content_type, ref_count=0)
+        try:
+            # 使用保存点，冲突时不回滚同一事务中已登记的其他对象
+            with self.db.begin_nested():
+                self.db.add(blob)
+        except IntegrityError:
+            # 相同内容被并发上传，使用已创建的记录（对象名称相同，内容一致）；
+            # 该记录可能在本事务快照之后提交，需要加锁读取当前数据
+            blob = self.db.query(FileBlob).filter(
+                FileBlob.sha256 == sha256
+            ).with_for_update().populate_existing().one()
+        return blob
+    
+    def _lock_blob(self, sha256: str) -> Optional[FileBlob]:
+        """
+        查找内容对象并加行锁
+        
+        与_release_blob的条件删除互斥：加锁后到提交（引用已计数）前不会被清理；
+        清理事务先提交时，加锁读取返回None，调用方按内容不存在处理（重新上传）。
+        """
+        blob_id = self.db.query(FileBlob.id).filter(FileBlob.sha256 == sha256).scalar()
+        if blob_id is None:
+            return None
+        # 按主键加锁并读取当前已提交的数据（不使用事务快照）
+        return self.db.query(FileBlob).filter(
+            FileBlob.id == blob_id
+        ).with_for_update().populate_existing().first()
+    
+    def save_archive(self, scenario_id: int, archive: UploadFile, description: str = None) -> Dict[str, Any]:
+        """
+        批量上传压缩包中的文件
+        
+        顺序流式解压（tar不建立索引，zip逐个成员读取），每个成员边解压边计算SHA-256
+        并写入本地临时文件，平台中不存在的内容交给线程池并发上传到MinIO
+        （并发数ARCHIVE_UPLOAD_CONCURRENCY，大文件按分片上传）。全部上传成功后
+        一次批量插入所有ScenarioFile记录。
+        
+        Args:
+            scenario_id: 场景ID
+            archive: 上传的压缩包（zip/tar/tar.gz/tgz/tar.bz2/tar.xz）
+            description: 文件描述（应用到所有文件）
+        
+        Returns:
+            dict: files为创建的文件记录，skipped为跳过的成员（类型不允许、路径不合法等）
+        
+        Raises:
+            ArchiveError: 压缩包格式不支持、损坏或不包含可上传的文件
+            FileTooLargeError: 成员或解压后总大小超过上限
+        """
+        members: List[Tuple[str, str, int, str]] = []
+        skipped: List[str] = []
+        uploads: Dict[str, Tuple[Any, IO[bytes], int, str]] = {}
+        total_size = 0
+        member_count = 0
+        concurrency = max(1, settings.ARCHIVE_UPLOAD_CONCURRENCY)
+        
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="archive-upload") as executor:
+            try:
+                for raw_name, member in _archive_members(archive.file, archive.filename or ""):
+                    member_count += 1
+                    if member_count > settings.ARCHIVE_MAX_MEMBERS:
+                        raise ArchiveError(f"Archive contains more than {settings.ARCHIVE_MAX_MEMBERS} files")
+                    
+                    file_name = _member_file_name(raw_name)
+                    extension = posixpath.splitext(file_name)[1].lower() if file_name else ""
+                    if not file_name or extension not in settings.ALLOWED_FILE_TYPES:
+                        skipped.append(raw_name)
+                        continue
+                    
+                    # 解压到临时文件，同时计算哈希；解压后总大小同样受限，防止压缩炸弹
+                    spool = tempfile.TemporaryFile()
+                    try:
+                        reader = _HashingReader(
+                            member, min(self.max_file_size(file_name), settings.MAX_DATA_FILE_SIZE - total_size)
+                        )
+                        while True:
+                            chunk = reader.read(HASH_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            spool.write(chunk)
+                    except BaseException:
+                        spool.close()
+                        raise
+                    
+                    total_size += reader.size
+                    sha256 = reader.hasher.hexdigest()
+                    content_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+                    members.append((file_name, sha256, reader.size, content_type))
+                    
+                    if sha256 in uploads or self.db.query(FileBlob.id).filter(FileBlob.sha256 == sha256).first():
+                        # 已有内容或包内重复，无需上传
+                        spool.close()
+                        continue
+                    
+                    # 限制排队中的临时文件数量，避免解压速度远超上传时占满磁盘
+                    in_flight = [future for future, *_ in uploads.values() if not future.done()]
+                    if len(in_flight) >= concurrency * 2:
+                        wait(in_flight, return_when=FIRST_COMPLETED)
+                    future = executor.submit(self._put_spooled, sha256, spool, reader.size, content_type)
+                    uploads[sha256] = (future, spool, reader.size, content_type)
+                
+                # 等待全部上传完成，任一失败则整体失败（已上传的对象没有记录引用，不影响后续上传）
+                for future, *_ in uploads.values():
+                    future.result()
+            except (tarfile.TarError, zipfile.BadZipFile, zlib.error, EOFError) as e:
+                self._cancel_uploads(uploads)
+                raise ArchiveError(f"Invalid archive: {e}")
+            except BaseException:
+                self._cancel_uploads(uploads)
+                raise
+        
+        if not members:
+            raise ArchiveError("Archive contains no allowed files")
+        
+        # 锁定已有内容对象并登记新上传的对象（加锁后到提交前不会被清理）
+        blobs = {}
+        for sha256 in {sha256 for _, sha256, _, _ in members}:
+            blob = self._lock_blob(sha256)
+            if blob is None and sha256 in uploads:
+                _, _, size, content_type = uploads[sha256]
+                blob = self._register_blob(sha256, self._blob_object_name(sha256), size, content_type)
+            if blob is None:
+                # 解压时已存在的内容在此期间被清理，临时文件已释放，需要重新上传
+                self.db.rollback()
+                raise RuntimeError("Stored content was purged during the upload, please retry")
+            blobs[sha256] = blob
+        
+        # 一次批量插入全部文件记录；批量插入不触发ORM事件，按内容对象汇总后更新引用计数
+        created_at = self.db.scalar(select(func.now()))
+        rows = [
+            {
+                "scenario_id": scenario_id,
+                "file_name": file_name,
+                "file_path": blobs[sha256].object_name,
+                "file_size": size,
+                "file_type": content_type,
+                "file_hash": sha256,
+                "blob_id": blobs[sha256].id,
+                "description": description,
+                "is_script": self._is_script_file(file_name),
+                "created_at": created_at,
+                "updated_at": created_at
+            }
+            for file_name, sha256, size, content_type in members
+        ]
+        self.db.execute(insert(ScenarioFile), rows)
+        for blob_id, count in Counter(row["blob_id"] for row in rows).items():
+            self.db.execute(
+                update(FileBlob).where(FileBlob.id == blob_id).values(ref_count=FileBlob.ref_count + count)
+            )
+        self.db.commit()
+        
+        files = self.db.query(ScenarioFile).filter(
+            ScenarioFile.scenario_id == scenario_id,
+            ScenarioFile.created_at == created_at,
+            ScenarioFile.file_name.in_([row["file_name"] for row in rows])
+        ).order_by(ScenarioFile.id).all()
+        logger.info(
+            f"Archive {archive.filename} saved: {len(rows)} files, {len(uploads)} uploaded, {len(skipped)} skipped"
+        )
+        return {"files": files, "skipped": skipped}
+    
+    def _put_spooled(self, sha256: str, spool: IO[bytes], size: int, content_type: str):
+        """上传解压后的临时文件（在线程池中执行，不访问数据库会话）"""
+        try:
+            spool.seek(0)
+            self.minio_client.put_object(
+                bucket_name=self.bucket_name,
+                object_name=self._blob_object_name(sha256),
+                data=spool,
+                length=size,
+                part_size=settings.MINIO_UPLOAD_PART_SIZE,
+                content_type=content_type
+            )
+        finally:
+            spool.close()
+    
+    def _cancel_uploads(self, uploads: Dict[str, Tuple[Any, IO[bytes], int, str]]):
+        """取消尚未开始的上传并关闭其临时文件"""
+        for future, spool, _, _ in uploads.values():
+            if future.cancel():
+                spool.close()
+    
+    def _release_blob(self, blob_id: Optional[int]):
+        """
+        引用计数归零时删除对象及记录
+        
+        先执行按引用计数的条件删除（基于当前已提交数据并持有行锁，不受事务快照影响），
+        确认删除后再删除对象并提交；并发创建引用的事务在_lock_blob处等待，
+        删除对象失败时回滚，记录保留等待下次清理。
+        """
+        if blob_id is None:
+            return
+        blob = self.db.query(FileBlob.sha256, FileBlob.object_name).filter(FileBlob.id == blob_id).first()
+        if not blob:
+            return
+        deleted = self.db.query(FileBlob).filter(
+            FileBlob.id == blob_id,
+            FileBlob.ref_count <= 0
+        ).delete(synchronize_session=False)
+        if deleted != 1:
+            # 已被重新引用或已被其他进程清理
+            self.db.commit()
+            return
+        try:
+            self.minio_client.remove_object(bucket_name=self.bucket_name, object_name=blob.object_name)
+        except S3Error as e:
+            self.db.rollback()
+            logger.warning(f"Failed to remove blob object {blob.object_name}: {e}")
+            return
+        self.db.commit()
+        logger.info(f"Removed unreferenced blob {blob.sha256}")
+    
+    def purge_unreferenced_blobs(self) -> int:
+        """清理没有任何场景文件引用的对象（如随场景级联删除的文件）"""
+        blob_ids = [row.id for row in self.db.query(FileBlob.id).filter(FileBlob.ref_count <= 0).all()]
+        for blob_id in blob_ids:
+            self._release_blob(blob_id)
+        return len(blob_ids)
+    
     def get_file(self, file_id: int) -> Optional[ScenarioFile]:
         """获取文件记录"""
         return self.db.query(ScenarioFile).filter(ScenarioFile.id == file_id).first()
     
+    def file_etag(self, scenario_file: ScenarioFile) -> Optional[str]:
+        """文件的强ETag：内容哈希决定对象内容，无需访问MinIO"""
+        return f'"{scenario_file.file_hash}"' if scenario_file.file_hash else None
+    
+    def get_file_size(self, scenario_file: ScenarioFile) -> int:
+        """文件大小（记录中缺失时从MinIO获取）"""
+        if scenario_file.file_size is not None:
+            return scenario_file.file_size
+        stat = self.minio_client.stat_object(bucket_name=self.bucket_name, object_name=scenario_file.file_path)
+        return stat.size
+    
+    def open_file_stream(self, scenario_file: ScenarioFile, offset: int = 0, length: int = 0) -> Iterator[bytes]:
+        """
+        打开文件内容的分块流
+        
+        优先读取本地缓存；未命中时向MinIO发起请求（对象不存在等错误在此抛出），
+        再返回逐块读取的迭代器，内容不会整体读入内存。完整读取可缓存的文件时
+        同时写入本地缓存，写入时按file_hash校验内容。
+        
+        Args:
+            scenario_file: 文件记录
+            offset: 起始字节
+            length: 读取长度，0表示读到末尾
+        """
+        local_file = file_cache.open(scenario_file.file_hash)
+        if local_file:
+            return self._iter_local_file(local_file, offset, length)
+        
+        response = self.minio_client.get_object(
+            bucket_name=self.bucket_name,
+            object_name=scenario_file.file_path,
+            offset=offset,
+            length=length
+        )
+        cache_writer = None
+        if offset == 0 and length == 0 and file_cache.is_cacheable(scenario_file.file_hash, scenario_file.file_size):
+            cache_writer = file_cache.writer(scenario_file.file_hash)
+        
+        def iter_chunks():
+            completed = False
+            try:
+                for chunk in response.stream(STREAM_CHUNK_SIZE):
+                    if cache_writer:
+                        cache_writer.write(chunk)
+                    yield chunk
+                completed = True
+            finally:
+                response.close()
+                response.release_conn()
+                if cache_writer:
+                    # 调用方中途停止读取时不缓存不完整的内容
+                    cache_writer.commit() if completed else cache_writer.abort()
+        
+        return iter_chunks()
+    
+    def _iter_local_file(self, local_file, offset: int, length: int) -> Iterator[bytes]:
+        """逐块读取本地缓存文件的指定范围"""
+        try:
+            local_file.seek(offset)
+            remaining = length or None
+            while remaining is None or remaining > 0:
+                chunk = local_file.read(STREAM_CHUNK_SIZE if remaining is None else min(STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            local_file.close()
+    
+    def presigned_download_url(self, scenario_file: ScenarioFile) -> str:
+        """生成直接从MinIO下载的预签名GET地址"""
+        return shared_minio_client.get_presign_client().presigned_get_object(
+            self.bucket_name,
+            scenario_file.file_path,
+            expires=timedelta(seconds=settings.MINIO_PRESIGNED_EXPIRE_SECONDS),
+            response_headers={"response-content-disposition": content_disposition(scenario_file.file_name)}
+        )
+    
+    def create_presigned_upload(
+        self,
+        scenario_id: int,
+        file_name: str,
+        sha256: str,
+        size: int,
+        description: str = None
+    ) -> Dict[str, Any]:
+        """
+        申请预签名直传
+        
+        内容已存在时直接创建文件记录；否则返回直传MinIO暂存对象的PUT地址，
+        客户端上传完成后调用complete_presigned_upload校验并登记。
+        
+        Raises:
+            FileTooLargeError: 文件超过大小上限或单次PUT上限
+        """
+        sha256 = sha256.lower()
+        scenario_file = self.save_file_by_hash(scenario_id, file_name, sha256, description)
+        if scenario_file:
+            return {"file": scenario_file}
+        
+        max_size = min(self.max_file_size(file_name), PRESIGNED_PUT_MAX_SIZE)
+        if size > max_size:
+            raise FileTooLargeError(f"File size exceeds maximum allowed size of {max_size} bytes for direct upload")
+        
+        upload_id = uuid.uuid4().hex
+        upload_url = shared_minio_client.get_presign_client().presigned_put_object(
+            self.bucket_name,
+            self._upload_object_name(sha256, upload_id),
+            expires=timedelta(seconds=settings.MINIO_PRESIGNED_EXPIRE_SECONDS)
+        )
+        return {
+            "upload_id": upload_id,
+            "upload_url": upload_url,
+            "expires_in": settings.MINIO_PRESIGNED_EXPIRE_SECONDS
+        }
+    
+    def complete_presigned_upload(
+        self,
+        scenario_id: int,
+        file_name: str,
+        sha256: str,
+        upload_id: str,
+        description: str = None
+    ) -> Optional[ScenarioFile]:
+        """
+        登记预签名直传的文件
+        
+        从MinIO流式读取暂存对象校验SHA-256和大小（数据只在MinIO与服务端之间传输），
+        通过后复制为内容对象并创建文件记录。
+        
+        Returns:
+            ScenarioFile: 保存的文件记录，暂存对象不存在时返回None
+        
+        Raises:
+            FileTooLargeError: 文件超过大小上限
+            ValueError: 上传内容与声明的哈希不一致
+        """
+        sha256 = sha256.lower()
+        staging_name = self._upload_object_name(sha256, upload_id)
+        try:
+            response = self.minio_client.get_object(bucket_name=self.bucket_name, object_name=staging_name)
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return None
+            raise
+        
+        try:
+            reader = _HashingReader(response, self.max_file_size(file_name))
+            while reader.read(HASH_CHUNK_SIZE):
+                pass
+        except FileTooLargeError:
+            self._remove_legacy_object(staging_name)
+            raise
+        finally:
+            response.close()
+            response.release_conn()
+        
+        if reader.hasher.hexdigest() != sha256:
+            self._remove_legacy_object(staging_name)
+            raise ValueError("Uploaded content does not match the declared sha256")
+        
+        content_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+        blob = self._lock_blob(sha256)
+        if not blob:
+            object_name = self._blob_object_name(sha256)
+            self.minio_client.copy_object(
+                self.bucket_name, object_name, CopySource(self.bucket_name, staging_name)
+            )
+            blob = self._register_blob(sha256, object_name, reader.size, content_type)
+        self._remove_legacy_object(staging_name)
+        
+        scenario_file = self._create_record(scenario_id, file_name, blob, content_type, description)
+        logger.info(f"Presigned upload completed: {file_name} -> {blob.object_name}")
+        return scenario_file
+    
+    def purge_stale_uploads(self) -> int:
+        """清理预签名过期后仍未登记的暂存对象"""
+        expired_before = datetime.now(timezone.utc) - timedelta(seconds=settings.MINIO_PRESIGNED_EXPIRE_SECONDS * 2)
+        purged = 0
+        for obj in self.minio_client.list_objects(self.bucket_name, prefix=UPLOAD_STAGING_PREFIX, recursive=True):
+            if obj.last_modified and obj.last_modified < expired_before:
+                self._remove_legacy_object(obj.object_name)
+                purged += 1
+        return purged
+    
     def get_file_content(self, file_id: int) -> Optional[str]:
         """
         获取文件内容
         
         Args:
             file_id: 文件ID
-            
+        
         Returns:
             str: 文件内容
         """
@@ -114,21 +660,13 @@ class FileStorageService:
         if not scenario_file:
             return None
         
-        # 如果数据库中有内容，直接返回
-        if scenario_file.file_content:
-            return scenario_file.file_content
-        
-        # 否则从MinIO读取
+        # 从本地缓存或MinIO读取
         try:
-            response = self.minio_client.get_object(
-                bucket_name=self.bucket_name,
-                object_name=scenario_file.file_path
-            )
-            content = response.read().decode('utf-8')
-            response.close()
-            response.release_conn()
-            return content
+            return b"".join(self.open_file_stream(scenario_file)).decode('utf-8')
         except Exception as e:
+            # 尚未迁移的历史记录可能仍在数据库中保存内容（延迟加载列，仅此处读取）
+            if scenario_file.file_content:
+                return scenario_file.file_content
             logger.error(f"Failed to read file from MinIO {scenario_file.file_path}: {e}")
             return None
     
@@ -136,10 +674,12 @@ class FileStorageService:
         """
         更新文件内容
         
+        内容变化后指向新内容对应的对象，原对象在无引用时删除。
+        
         Args:
             file_id: 文件ID
             content: 新内容
-            
+        
         Returns:
             bool: 是否成功
         """
@@ -148,35 +688,77 @@ class FileStorageService:
             if not scenario_file:
                 return False
             
-            # 更新MinIO中的文件
             content_bytes = content.encode('utf-8')
-            self.minio_client.put_object(
-                bucket_name=self.bucket_name,
-                object_name=scenario_file.file_path,
-                data=io.BytesIO(content_bytes),
-                length=len(content_bytes),
-                content_type=scenario_file.file_type
+            sha256 = hashlib.sha256(content_bytes).hexdigest()
+            old_blob_id = scenario_file.blob_id
+            legacy_object = scenario_file.file_path if old_blob_id is None else None
+            
+            blob = self._acquire_blob(
+                sha256, len(content_bytes), scenario_file.file_type or "application/octet-stream",
+                lambda: io.BytesIO(content_bytes)
             )
             
-            # 更新数据库记录
-            scenario_file.file_content = content
+            # 更新数据库记录（引用计数由更新事件维护）
+            scenario_file.blob_id = blob.id
+            scenario_file.file_path = blob.object_name
+            scenario_file.file_content = None
             scenario_file.file_size = len(content_bytes)
-            scenario_file.file_hash = hashlib.md5(content_bytes).hexdigest()
+            scenario_file.file_hash = sha256
             
             self.db.commit()
-            return True
             
+            if legacy_object:
+                self._remove_legacy_object(legacy_object)
+            elif old_blob_id != blob.id:
+                self._release_blob(old_blob_id)
+            return True
+        
         except Exception as e:
             logger.error(f"Failed to update file content {file_id}: {e}")
+            self.db.rollback()
             return False
     
+    def offload_inline_content(self, scenario_file: ScenarioFile) -> bool:
+        """
+        将历史记录内联在数据库中的文件内容移出（迁移用，不提交事务）
+        
+        历史上传的文件在MinIO中已有对象，只需清空数据库内容；对象缺失时按内容寻址重新上传。
+        
+        Returns:
+            bool: 是否重新上传了内容
+        """
+        content = scenario_file.file_content
+        if content is None:
+            return False
+        
+        try:
+            self.minio_client.stat_object(bucket_name=self.bucket_name, object_name=scenario_file.file_path)
+            uploaded = False
+        except S3Error as e:
+            if e.code != "NoSuchKey":
+                raise
+            content_bytes = content.encode('utf-8')
+            sha256 = hashlib.sha256(content_bytes).hexdigest()
+            blob = self._acquire_blob(
+                sha256, len(content_bytes), scenario_file.file_type or "application/octet-stream",
+                lambda: io.BytesIO(content_bytes)
+            )
+            scenario_file.blob_id = blob.id
+            scenario_file.file_path = blob.object_name
+            scenario_file.file_size = len(content_bytes)
+            scenario_file.file_hash = sha256
+            uploaded = True
+        
+        scenario_file.file_content = None
+        return uploaded
+    
     def delete_file(self, file_id: int) -> bool:
         """
         删除文件
         
         Args:
             file_id: 文件ID
-            
+        
         Returns:
             bool: 是否成功
         """
@@ -185,63 +767,54 @@ class FileStorageService:
             if not scenario_file:
                 return False
             
-            # 删除MinIO中的文件
-            self.minio_client.remove_object(
-                bucket_name=self.bucket_name,
-                object_name=scenario_file.file_path
-            )
+            blob_id = scenario_file.blob_id
+            file_name = scenario_file.file_name
+            legacy_object = scenario_file.file_path if blob_id is None else None
             
-            # 删除数据库记录
+            # 删除数据库记录（引用计数由删除事件维护）
             self.db.delete(scenario_file)
             self.db.commit()
             
-            logger.info(f"File deleted successfully from MinIO: {scenario_file.file_name}")
-            return True
+            # 删除MinIO中不再被引用的对象
+            if legacy_object:
+                self._remove_legacy_object(legacy_object)
+            else:
+                self._release_blob(blob_id)
             
+            logger.info(f"File deleted successfully: {file_name}")
+            return True
+        
         except Exception as e:
             logger.error(f"Failed to delete file {file_id} from MinIO: {e}")
+            self.db.rollback()
             return False
     
     def get_scenario_files(self, scenario_id: int) -> list[ScenarioFile]:
-        """获取场景的所有文件"""
+        """获取场景的所有文件（file_content为延迟加载列，列表只读取元数据）"""
         return self.db.query(ScenarioFile).filter(
             ScenarioFile.scenario_id == scenario_id
         ).order_by(ScenarioFile.created_at.desc()).all()
     
-    def _ensure_bucket_exists(self):
-        """确保MinIO bucket存在"""
-        try:
-            if not self.minio_client.bucket_exists(self.bucket_name):
-                self.minio_client.make_bucket(self.bucket_name)
-                logger.info(f"Created MinIO bucket: {self.bucket_name}")
-        except S3Error as e:
-            logger.error(f"Failed to create MinIO bucket {self.bucket_name}: {e}")
-            raise
+    def _blob_object_name(self, sha256: str) -> str:
+        """按内容哈希生成MinIO对象名称，无需探测重名"""
+        return f"blobs/{sha256[:2]}/{sha256}"
     
-    def _generate_object_name(self, scenario_id: int, filename: str) -> str:
-        """生成MinIO对象名称"""
-        # 生成唯一对象名称（避免重名）
-        file_stem = filename.rsplit('.', 1)[0] if '.' in filename else filename
-        file_suffix = '.' + filename.rsplit('.', 1)[1] if '.' in filename else ''
-        counter = 1
-        base_name = f"scenario_{scenario_id}/{file_stem}{file_suffix}"
-        
-        # 检查对象是否已存在
-        while self._object_exists(base_name):
-            base_name = f"scenario_{scenario_id}/{file_stem}_{counter}{file_suffix}"
-            counter += 1
-        
-        return base_name
+    def _upload_object_name(self, sha256: str, upload_id: str) -> str:
+        """预签名直传的暂存对象名称"""
+        return f"{UPLOAD_STAGING_PREFIX}{sha256}/{upload_id}"
     
-    def _object_exists(self, object_name: str) -> bool:
-        """检查MinIO对象是否存在"""
+    def _remove_legacy_object(self, object_name: str):
+        """删除不经引用计数管理的对象（内容寻址之前上传的独占对象、直传暂存对象）"""
         try:
-            self.minio_client.stat_object(self.bucket_name, object_name)
-            return True
-        except S3Error:
-            return False
+            self.minio_client.remove_object(bucket_name=self.bucket_name, object_name=object_name)
+        except S3Error as e:
+            logger.warning(f"Failed to remove object {object_name}: {e}")
+    
+    def max_file_size(self, filename: str) -> int:
+        """文件大小上限：脚本文件较小，数据文件允许GB级"""
+        return settings.MAX_FILE_SIZE if self._is_script_file(filename) else settings.MAX_DATA_FILE_SIZE
     
     def _is_script_file(self, filename: str) -> bool:
         """判断是否为脚本文件"""
         script_extensions = {'.py', '.js', '.ts', '.java', '.go', '.rs', '.sh', '.bat'}
-        return filename.rsplit('.', 1)[-1].lower() in script_extensions
+        return '.' + filename.rsplit('.', 1)[-1].lower() in script_extensions
@@ -0,0 +1,109 @@
+"""
+压测机集群状态汇总服务
+
+用一次分组查询统计各状态数量、执行中和失联的压测机，结果缓存在Redis中，
+心跳写入、状态变化和执行状态转换时失效。
+"""
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict
+from sqlalchemy import and_, case, exists, func
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..core.redis import redis_client
+from ..models.load_generator import LoadGenerator
+from ..models.test_management import TestExecution
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = "pfp:fleet_status"
+
+
+async def invalidate_fleet_status():
+    """使集群状态汇总缓存失效"""
+    try:
+        redis = await redis_client.get_redis()
+        await redis.delete(CACHE_KEY)
+    except Exception as e:
+        logger.warning(f"Failed to invalidate fleet status cache: {str(e)}")
+
+
+class FleetStatusService:
+    """压测机集群状态汇总服务"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    async def get_summary(self) -> Dict[str, Any]:
+        """获取集群状态汇总（优先读取缓存）"""
+        try:
+            redis = await redis_client.get_redis()
+            cached = await redis.get(CACHE_KEY)
+            if cached:
+                return json.loads(cached)
+        except Exception as e:
+            redis = None
+            logger.warning(f"Failed to read fleet status cache: {str(e)}")
+        
+        summary = self._compute()
+        
+        if redis is not None:
+            try:
+                await redis.set(CACHE_KEY, json.dumps(summary), ex=settings.FLEET_STATUS_CACHE_TTL)
+            except Exception as e:
+                logger.warning(f"Failed to write fleet status cache: {str(e)}")
+        return summary
+    
+    def _compute(self) -> Dict[str, Any]:
+        stale_time = datetime.utcnow() - timedelta(minutes=settings.HEARTBEAT_STALE_MINUTES)
+        busy = exists().where(
+            and_(
+                TestExecution.load_generator_id == LoadGenerator.id,
+                TestExecution.status == "running"
+            )
+        )
+        stale = and_(LoadGenerator.status == "online", LoadGenerator.last_heartbeat < stale_time)
+        
+        # 一次分组查询得到各状态数量及其中执行中、失联的数量
+        rows = self.db.query(
+            LoadGenerator.status,
+            func.count(LoadGenerator.id),
+            func.sum(case((busy, 1), else_=0)),
+            func.sum(case((stale, 1), else_=0))
+        ).filter(
+            LoadGenerator.is_active == True
+        ).group_by(LoadGenerator.status).all()
+        
+        counts = {"online": 0, "offline": 0, "maintenance": 0}
+        busy_count = 0
+        stale_count = 0
+        for status, count, busy_in_status, stale_in_status in rows:
+            counts[status or "offline"] = counts.get(status or "offline", 0) + count
+            busy_count += int(busy_in_status or 0)
+            stale_count += int(stale_in_status or 0)
+        
+        stale_load_generators = []
+        if stale_count:
+            stale_load_generators = [
+                {
+                    "id": row.id,
+                    "name": row.name,
+                    "last_heartbeat": row.last_heartbeat.isoformat() if row.last_heartbeat else None
+                }
+                for row in self.db.query(
+                    LoadGenerator.id, LoadGenerator.name, LoadGenerator.last_heartbeat
+                ).filter(and_(LoadGenerator.is_active == True, stale)).all()
+            ]
+        
+        return {
+            "total_count": sum(counts.values()),
+            "online_count": counts["online"],
+            "offline_count": counts["offline"],
+            "maintenance_count": counts["maintenance"],
+            "busy_count": busy_count,
+            "status_counts": counts,
+            "stale_count": stale_count,
+            "stale_load_generators": stale_load_generators,
+            "generated_at": datetime.utcnow().isoformat()
+        }
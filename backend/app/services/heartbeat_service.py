@@ -2,15 +2,21 @@
 心跳检测服务
 """
 import asyncio
-import socket
-import paramiko
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
-from sqlalchemy.orm import Session
+from typing import List, Dict, Any, Optional
+from sqlalchemy.orm import Session, load_only
 from sqlalchemy import and_
 from ..core.database import get_db
 from ..models.load_generator import LoadGenerator
 from ..core.config import settings
+from ..core.remote_executor import remote_executor
+from .agent_service import agent_registry
+from .resource_history_service import ResourceHistoryService
+from .status_event_service import StatusEventService
+from .event_bus import publish_status_changes
+from .fleet_status_service import invalidate_fleet_status
+from ..core.redis import redis_client
+from .remote_probes import RESOURCE_PROBE, build_probe_command, parse_probe_output
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,12 +27,28 @@ class HeartbeatService:
     
     def __init__(self, db: Session):
         self.db = db
+        # 本轮心跳采集到的资源样本，按压测机ID记录，用于写入资源历史
+        self._samples: Dict[int, Dict[str, Any]] = {}
+        # 本轮心跳需要写入的字段，按压测机ID记录
+        self._usage: Dict[int, Dict[str, Any]] = {}
     
     async def check_all_load_generators(self) -> Dict[str, Any]:
-        """检查所有活跃压测机的心跳"""
+        """
+        检查所有活跃压测机的心跳
+        
+        各压测机并发检查（HEARTBEAT_CONCURRENCY限制并发数），单台超时为HEARTBEAT_HOST_TIMEOUT，
+        整体在HEARTBEAT_TOTAL_DEADLINE内结束；超过总时限仍未完成的压测机保持原状态。
+        结果通过一次批量UPDATE写入，状态变化时记录状态变更事件。
+        """
         try:
-            # 获取所有活跃的压测机（包括online和offline状态）
-            active_load_generators = self.db.query(LoadGenerator).filter(
+            # 获取所有活跃的压测机（包括online和offline状态），只加载连接所需字段
+            active_load_generators = self.db.query(LoadGenerator).options(
+                load_only(
+                    LoadGenerator.id, LoadGenerator.name, LoadGenerator.host, LoadGenerator.port,
+                    LoadGenerator.username, LoadGenerator.password, LoadGenerator.ssh_key_path,
+                    LoadGenerator.status
+                )
+            ).filter(
                 LoadGenerator.is_active == True
             ).all()
             
@@ -34,52 +56,80 @@ class HeartbeatService:
                 "total_checked": len(active_load_generators),
                 "successful": 0,
                 "failed": 0,
+                "timed_out": 0,
+                "status_changes": 0,
                 "details": []
             }
+            updates: List[Dict[str, Any]] = []
+            reasons: Dict[int, str] = {}
+            
+            semaphore = asyncio.Semaphore(settings.HEARTBEAT_CONCURRENCY)
+            
+            async def check(load_generator: LoadGenerator):
+                async with semaphore:
+                    try:
+                        # 检查心跳
+                        is_alive = await asyncio.wait_for(
+                            self._check_single_heartbeat(load_generator),
+                            timeout=settings.HEARTBEAT_HOST_TIMEOUT
+                        )
+                        message = "Heartbeat successful" if is_alive else "Heartbeat failed - connection lost"
+                    except asyncio.TimeoutError:
+                        is_alive = False
+                        message = f"Heartbeat timed out after {settings.HEARTBEAT_HOST_TIMEOUT}s"
+                    except Exception as e:
+                        is_alive = False
+                        message = f"Heartbeat error: {str(e)}"
+                        logger.error(f"Heartbeat check failed for {load_generator.name}: {str(e)}")
+                
+                # 记录待写入的状态与资源字段
+                new_status = "online" if is_alive else "offline"
+                update = {"id": load_generator.id, "status": new_status}
+                if is_alive:
+                    update.update(self._usage.get(load_generator.id, {}))
+                updates.append(update)
+                reasons[load_generator.id] = message
+                results["successful" if is_alive else "failed"] += 1
+                results["details"].append({
+                    "id": load_generator.id,
+                    "name": load_generator.name,
+                    "status": new_status,
+                    "message": message
+                })
             
-            for load_generator in active_load_generators:
-                try:
-                    # 检查心跳
-                    is_alive = await self._check_single_heartbeat(load_generator)
-                    
-                    if is_alive:
-                        # 更新状态为在线
-                        load_generator.status = "online"
-                        load_generator.updated_at = datetime.utcnow()
-                        results["successful"] += 1
-                        results["details"].append({
-                            "id": load_generator.id,
-                            "name": load_generator.name,
-                            "status": "online",
-                            "message": "Heartbeat successful"
-                        })
-                    else:
-                        # 更新状态为离线
-                        load_generator.status = "offline"
-                        load_generator.updated_at = datetime.utcnow()
-                        results["failed"] += 1
-                        results["details"].append({
-                            "id": load_generator.id,
-                            "name": load_generator.name,
-                            "status": "offline",
-                            "message": "Heartbeat failed - connection lost"
-                        })
-                        
-                except Exception as e:
-                    # 更新状态为离线
-                    load_generator.status = "offline"
-                    load_generator.updated_at = datetime.utcnow()
-                    results["failed"] += 1
+            tasks = {
+                asyncio.ensure_future(check(load_generator)): load_generator
+                for load_generator in active_load_generators
+            }
+            if tasks:
+                done, pending = await asyncio.wait(tasks, timeout=settings.HEARTBEAT_TOTAL_DEADLINE)
+                for task in pending:
+                    task.cancel()
+                    load_generator = tasks[task]
+                    results["timed_out"] += 1
                     results["details"].append({
                         "id": load_generator.id,
                         "name": load_generator.name,
-                        "status": "offline",
-                        "message": f"Heartbeat error: {str(e)}"
+                        "status": load_generator.status,
+                        "message": "Heartbeat check not finished before deadline, status unchanged"
                     })
-                    logger.error(f"Heartbeat check failed for {load_generator.name}: {str(e)}")
+                if pending:
+                    await asyncio.wait(pending)
+                    logger.warning(f"{len(pending)} heartbeat checks exceeded the {settings.HEARTBEAT_TOTAL_DEADLINE}s deadline")
+            
+            # 批量写入状态与资源字段，状态变化时记录事件
+            previous_status = {load_generator.id: load_generator.status for load_generator in active_load_generators}
+            changes = StatusEventService(self.db).apply_updates(updates, previous_status, "heartbeat", reasons)
+            results["status_changes"] = len(changes)
+            
+            # 本轮采集到的资源样本写入历史表
+            if self._samples:
+                ResourceHistoryService(self.db).record_samples(self._samples.items())
             
             # 提交所有更改
             self.db.commit()
+            await invalidate_fleet_status()
+            await publish_status_changes(changes)
             
             return results
             
@@ -95,47 +145,41 @@ class HeartbeatService:
             }
     
     async def _check_single_heartbeat(self, load_generator: LoadGenerator) -> bool:
-        """检查单个压测机的心跳"""
+        """检查单个压测机的心跳（成功时将资源使用和心跳时间记入self._usage）"""
         try:
+            # 已部署Agent的压测机以推送的样本作为心跳，无需SSH轮询（样本存于Redis，Celery进程同样可见）
+            agent_sample = await agent_registry.latest_sample(load_generator.id)
+            if agent_sample is not None:
+                # Agent样本由agent_service写入历史，这里不重复记录
+                self._usage[load_generator.id] = {
+                    "cpu_usage": agent_sample.get("cpu_usage", 0.0),
+                    "memory_usage": agent_sample.get("memory_usage", 0.0),
+                    "network_usage": agent_sample.get("network_usage", 0.0),
+                    "last_heartbeat": datetime.utcnow()
+                }
+                return True
+            if await agent_registry.is_live(load_generator.id):
+                # Agent刚连接、尚未推送首个样本
+                self._usage[load_generator.id] = {"last_heartbeat": datetime.utcnow()}
+                return True
+            
             # 首先检查网络连通性
             if not await self._check_network_connectivity(load_generator.host, load_generator.port):
                 return False
             
-            # 尝试SSH连接
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            connect_kwargs = {
-                "hostname": load_generator.host,
-                "port": load_generator.port,
-                "username": load_generator.username,
-                "timeout": 5  # 较短的超时时间用于心跳检测
-            }
-            
-            if load_generator.ssh_key_path:
-                connect_kwargs["key_filename"] = load_generator.ssh_key_path
-            elif load_generator.password:
-                connect_kwargs["password"] = load_generator.password
-            else:
+            if not load_generator.ssh_key_path and not load_generator.password:
                 return False
             
-            # 建立连接
-            ssh.connect(**connect_kwargs)
-            
-            # 执行简单的心跳命令
-            stdin, stdout, stderr = ssh.exec_command("echo 'heartbeat'")
-            result = stdout.read().decode().strip()
-            
-            if result == "heartbeat":
-                # 收集资源使用情况
-                await self._collect_resource_usage(ssh, load_generator)
-                
-                # 更新最后心跳时间
-                load_generator.last_heartbeat = datetime.utcnow()
-            
-            ssh.close()
+            # 执行简单的心跳命令（较短的超时时间用于心跳检测）
+            result = await remote_executor.run(
+                load_generator, "echo 'heartbeat'", timeout=10, connect_timeout=5
+            )
+            if result["stdout"].strip() != "heartbeat":
+                return False
             
-            return result == "heartbeat"
+            # 收集资源使用情况并更新最后心跳时间
+            await self._collect_resource_usage(load_generator)
+            return True
             
         except Exception as e:
             logger.warning(f"Heartbeat check failed for {load_generator.name}: {str(e)}")
@@ -144,82 +188,63 @@ class HeartbeatService:
     async def _check_network_connectivity(self, host: str, port: int) -> bool:
         """检查网络连通性"""
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(3)  # 3秒超时
-            result = sock.connect_ex((host, port))
-            sock.close()
-            return result == 0
+            # 非阻塞连接，3秒超时
+            return await remote_executor.check_port(host, port, timeout=3) == 0
         except Exception:
             return False
     
-    async def _collect_resource_usage(self, ssh: paramiko.SSHClient, load_generator: LoadGenerator):
+    async def _collect_resource_usage(self, load_generator: LoadGenerator):
         """收集资源使用情况"""
+        sample = await self.sample_resource_usage(load_generator)
+        self._samples[load_generator.id] = sample
+        self._usage[load_generator.id] = {
+            "cpu_usage": sample["cpu_usage"],
+            "memory_usage": sample["memory_usage"],
+            "network_usage": sample["network_usage"],
+            "last_heartbeat": datetime.utcnow()
+        }
+    
+    async def sample_resource_usage(self, load_generator: LoadGenerator) -> Dict[str, Any]:
+        """采集一次资源使用样本（不修改压测机记录）"""
+        # 优先使用Agent推送的样本
+        agent_sample = await agent_registry.latest_sample(load_generator.id)
+        if agent_sample is not None:
+            return {
+                "cpu_usage": agent_sample.get("cpu_usage", 0.0),
+                "cpu_per_core": agent_sample.get("cpu_per_core", []),
+                "memory_usage": agent_sample.get("memory_usage", 0.0),
+                "network_usage": agent_sample.get("network_usage", 0.0),
+                "network_mbps": agent_sample.get("network_mbps", 0.0),
+                "interfaces": agent_sample.get("interfaces", [])
+            }
+        
         try:
-            # 收集CPU使用率 - 方法1：使用top命令
-            stdin, stdout, stderr = ssh.exec_command("top -bn1 | grep 'Cpu(s)' | awk '{print $2}' | awk -F'%' '{print $1}'")
-            cpu_usage_str = stdout.read().decode().strip()
-            stderr_output = stderr.read().decode().strip()
-            
-            if cpu_usage_str and cpu_usage_str.replace('.', '').isdigit():
-                load_generator.cpu_usage = float(cpu_usage_str)
-                logger.info(f"CPU usage collected for {load_generator.name}: {cpu_usage_str}%")
-            else:
-                # 备用方法1：使用vmstat
-                stdin, stdout, stderr = ssh.exec_command("vmstat 1 2 | tail -1 | awk '{print 100-$15}'")
-                cpu_usage_str = stdout.read().decode().strip()
-                if cpu_usage_str and cpu_usage_str.replace('.', '').isdigit():
-                    load_generator.cpu_usage = float(cpu_usage_str)
-                    logger.info(f"CPU usage collected via vmstat for {load_generator.name}: {cpu_usage_str}%")
-                else:
-                    # 备用方法2：使用sar命令
-                    stdin, stdout, stderr = ssh.exec_command("sar 1 1 | tail -1 | awk '{print 100-$8}'")
-                    cpu_usage_str = stdout.read().decode().strip()
-                    if cpu_usage_str and cpu_usage_str.replace('.', '').isdigit():
-                        load_generator.cpu_usage = float(cpu_usage_str)
-                        logger.info(f"CPU usage collected via sar for {load_generator.name}: {cpu_usage_str}%")
-                    else:
-                        # 备用方法3：使用iostat
-                        stdin, stdout, stderr = ssh.exec_command("iostat -c 1 1 | tail -1 | awk '{print 100-$6}'")
-                        cpu_usage_str = stdout.read().decode().strip()
-                        if cpu_usage_str and cpu_usage_str.replace('.', '').isdigit():
-                            load_generator.cpu_usage = float(cpu_usage_str)
-                            logger.info(f"CPU usage collected via iostat for {load_generator.name}: {cpu_usage_str}%")
-                        else:
-                            load_generator.cpu_usage = 0.0
-                            logger.warning(f"Failed to collect CPU usage for {load_generator.name}, all methods failed")
-            
-            # 收集内存使用率
-            stdin, stdout, stderr = ssh.exec_command("free | grep Mem | awk '{printf \"%.1f\", $3/$2 * 100.0}'")
-            memory_usage_str = stdout.read().decode().strip()
-            if memory_usage_str and memory_usage_str.replace('.', '').isdigit():
-                load_generator.memory_usage = float(memory_usage_str)
-                logger.info(f"Memory usage collected for {load_generator.name}: {memory_usage_str}%")
-            else:
-                load_generator.memory_usage = 0.0
-                logger.warning(f"Failed to collect memory usage for {load_generator.name}")
-            
-            # 收集网络使用率（简化版本，基于网络接口统计）
-            stdin, stdout, stderr = ssh.exec_command("cat /proc/net/dev | grep -E 'eth0|ens|enp' | head -1 | awk '{print $2,$10}'")
-            network_stats = stdout.read().decode().strip()
-            if network_stats:
-                # 这里简化处理，实际应该计算网络带宽使用率
-                # 暂时设置为一个模拟值，实际项目中需要更复杂的计算
-                load_generator.network_usage = 0.0
-            else:
-                load_generator.network_usage = 0.0
-                
+            # 一次远程调用完成差值采样
+            result = await remote_executor.run(
+                load_generator, build_probe_command(RESOURCE_PROBE), timeout=15, connect_timeout=5
+            )
+            if result["exit_code"] != 0:
+                raise RuntimeError(result["stderr"].strip()[-200:])
+            return parse_probe_output(result["stdout"])
         except Exception as e:
             logger.warning(f"Failed to collect resource usage for {load_generator.name}: {str(e)}")
-            # 设置默认值
-            load_generator.cpu_usage = 0.0
-            load_generator.memory_usage = 0.0
-            load_generator.network_usage = 0.0
+            return {
+                "cpu_usage": 0.0,
+                "cpu_per_core": [],
+                "memory_usage": 0.0,
+                "network_usage": 0.0,
+                "network_mbps": 0.0,
+                "interfaces": []
+            }
     
-    async def get_stale_load_generators(self, stale_minutes: int = 10) -> List[LoadGenerator]:
-        """获取长时间没有心跳的压测机"""
+    async def get_stale_load_generators(self, stale_minutes: Optional[int] = None) -> List[LoadGenerator]:
+        """获取长时间没有心跳的压测机（默认阈值HEARTBEAT_STALE_MINUTES）"""
+        stale_minutes = stale_minutes or settings.HEARTBEAT_STALE_MINUTES
         stale_time = datetime.utcnow() - timedelta(minutes=stale_minutes)
         
-        return self.db.query(LoadGenerator).filter(
+        return self.db.query(LoadGenerator).options(
+            load_only(LoadGenerator.id, LoadGenerator.name, LoadGenerator.status, LoadGenerator.last_heartbeat)
+        ).filter(
             and_(
                 LoadGenerator.status == "online",
                 LoadGenerator.is_active == True,
@@ -227,16 +252,23 @@ class HeartbeatService:
             )
         ).all()
     
-    async def mark_stale_as_offline(self, stale_minutes: int = 10) -> int:
+    async def mark_stale_as_offline(self, stale_minutes: Optional[int] = None) -> int:
         """将长时间没有心跳的压测机标记为离线"""
         try:
             stale_load_generators = await self.get_stale_load_generators(stale_minutes)
             
-            for load_generator in stale_load_generators:
-                load_generator.status = "offline"
-                load_generator.updated_at = datetime.utcnow()
+            changes = StatusEventService(self.db).apply_updates(
+                [{"id": load_generator.id, "status": "offline"} for load_generator in stale_load_generators],
+                {load_generator.id: load_generator.status for load_generator in stale_load_generators},
+                "stale",
+                {
+                    load_generator.id: f"No heartbeat since {load_generator.last_heartbeat}"
+                    for load_generator in stale_load_generators
+                }
+            )
             
             self.db.commit()
+            await publish_status_changes(changes)
             return len(stale_load_generators)
             
         except Exception as e:
@@ -267,5 +299,6 @@ async def heartbeat_check_task():
         logger.error(f"Heartbeat check task failed: {str(e)}")
         return {"error": str(e)}
     finally:
+        await redis_client.close()
         db.close()
 
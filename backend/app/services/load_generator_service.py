@@ -3,15 +3,28 @@
 """
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
 from datetime import datetime, timedelta
 import paramiko
 import json
 import asyncio
+from app.core.ssh_pool import ssh_pool
+from app.core.remote_executor import remote_executor
+from app.core.config import settings
 from app.models.load_generator import LoadGenerator, LoadGeneratorConfig
+from app.models.test_management import TestExecution
 from app.schemas.load_generator import (
     LoadGeneratorCreate, LoadGeneratorUpdate, LoadGeneratorConfigCreate, LoadGeneratorConfigUpdate
 )
+from app.services.remote_probes import SYSTEM_PROBE, build_probe_command, parse_probe_output
+from app.services.config_recommender import extract_topology, recommend_config
+from app.services.agent_service import agent_registry
+from app.services.status_event_service import StatusEventService
+from app.services.event_bus import publish_status_changes
+from app.services.fleet_status_service import invalidate_fleet_status
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class LoadGeneratorService:
@@ -68,6 +81,9 @@ class LoadGeneratorService:
         load_generator.updated_at = datetime.utcnow()
         self.db.commit()
         self.db.refresh(load_generator)
+        
+        # 连接参数可能已变化，关闭旧的池化连接
+        ssh_pool.evict(load_generator_id)
         return load_generator
     
     async def delete_load_generator(self, load_generator_id: int) -> bool:
@@ -79,6 +95,8 @@ class LoadGeneratorService:
         load_generator.is_active = False
         load_generator.updated_at = datetime.utcnow()
         self.db.commit()
+        
+        ssh_pool.evict(load_generator_id)
         return True
     
     async def test_connection(self, load_generator_id: int) -> Dict[str, Any]:
@@ -87,20 +105,93 @@ class LoadGeneratorService:
         if not load_generator:
             return {"success": False, "message": "Load generator not found"}
         
-        # 首先测试网络连通性
-        import socket
+        result, changes = await self._check_connection(load_generator)
+        if changes:
+            await self._save_connection_results(
+                [{"id": load_generator.id, **changes}],
+                {load_generator.id: load_generator.status},
+                {load_generator.id: result["message"]}
+            )
+        return result
+    
+    async def bulk_test_connection(
+        self,
+        load_generator_ids: List[int],
+        concurrency: int,
+        timeout: float
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        并发测试多台压测机连接
+        
+        每台压测机的结果在完成时立即产出；状态更新在全部完成后一次性批量写入。
+        
+        Args:
+            load_generator_ids: 压测机ID列表
+            concurrency: 最大并发数
+            timeout: 单台压测机超时时间(秒)
+        """
+        load_generators = self.db.query(LoadGenerator).filter(
+            and_(
+                LoadGenerator.id.in_(load_generator_ids),
+                LoadGenerator.is_active == True
+            )
+        ).all()
+        
+        for missing_id in sorted(set(load_generator_ids) - {lg.id for lg in load_generators}):
+            yield {"load_generator_id": missing_id, "success": False, "message": "Load generator not found"}
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def check(load_generator: LoadGenerator):
+            async with semaphore:
+                try:
+                    result, changes = await asyncio.wait_for(self._check_connection(load_generator), timeout=timeout)
+                except asyncio.TimeoutError:
+                    result = {"success": False, "message": f"Connection test timed out after {timeout}s"}
+                    changes = {"status": "offline"}
+            return load_generator, result, changes
+        
+        previous_status = {lg.id: lg.status for lg in load_generators}
+        updates = []
+        reasons = {}
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(5)
-            result = sock.connect_ex((load_generator.host, load_generator.port))
-            sock.close()
+            for next_done in asyncio.as_completed([check(lg) for lg in load_generators]):
+                load_generator, result, changes = await next_done
+                if changes:
+                    updates.append({"id": load_generator.id, **changes})
+                    reasons[load_generator.id] = result["message"]
+                yield {"load_generator_id": load_generator.id, "name": load_generator.name, **result}
+        finally:
+            # 已完成的结果一次性写入数据库
+            if updates:
+                await self._save_connection_results(updates, previous_status, reasons)
+    
+    async def _save_connection_results(
+        self,
+        updates: List[Dict[str, Any]],
+        previous_status: Dict[int, Optional[str]],
+        reasons: Dict[int, str]
+    ):
+        """写入连接测试结果：与心跳相同，状态变化时记录事件、刷新集群状态缓存并推送"""
+        changes = StatusEventService(self.db).apply_updates(updates, previous_status, "connection_test", reasons)
+        self.db.commit()
+        await invalidate_fleet_status()
+        await publish_status_changes(changes)
+    
+    async def _check_connection(self, load_generator: LoadGenerator) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        检测压测机连接并收集系统信息（不写数据库）
+        
+        Returns:
+            Tuple: (返回给调用方的结果, 需要更新到压测机的字段)
+        """
+        offline = {"status": "offline"}
+        
+        # 首先测试网络连通性（非阻塞连接）
+        try:
+            result = await remote_executor.check_port(load_generator.host, load_generator.port, timeout=5)
             
             if result != 0:
-                # 网络连接失败，更新状态为离线
-                load_generator.status = "offline"
-                load_generator.updated_at = datetime.utcnow()
-                self.db.commit()
-                
                 error_messages = {
                     11: "Connection refused - SSH service may not be running or firewall blocking",
                     110: "Connection timed out - Host may be unreachable",
@@ -111,120 +202,110 @@ class LoadGeneratorService:
                 return {
                     "success": False, 
                     "message": f"Network connection failed: {error_msg}. Please check if SSH service is running on {load_generator.host}:{load_generator.port}"
-                }
+                }, offline
         except Exception as e:
-            # 网络测试异常，更新状态为离线
-            load_generator.status = "offline"
-            load_generator.updated_at = datetime.utcnow()
-            self.db.commit()
-            
             return {
                 "success": False, 
                 "message": f"Network test failed: {str(e)}"
-            }
+            }, offline
+        
+        if not load_generator.ssh_key_path and not load_generator.password:
+            return {"success": False, "message": "No authentication method configured (password or SSH key required)"}, {}
         
         try:
-            # 创建SSH连接
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            # 连接参数
-            connect_kwargs = {
-                "hostname": load_generator.host,
-                "port": load_generator.port,
-                "username": load_generator.username,
-                "timeout": 10
-            }
-            
-            if load_generator.ssh_key_path:
-                connect_kwargs["key_filename"] = load_generator.ssh_key_path
-            elif load_generator.password:
-                connect_kwargs["password"] = load_generator.password
-            else:
-                return {"success": False, "message": "No authentication method configured (password or SSH key required)"}
-            
-            # 建立连接
-            ssh.connect(**connect_kwargs)
-            
-            # 测试基本命令
-            stdin, stdout, stderr = ssh.exec_command("python3 --version")
-            python_version = stdout.read().decode().strip()
-            
-            stdin, stdout, stderr = ssh.exec_command("locust --version")
-            locust_version = stdout.read().decode().strip()
-            
-            # 获取系统信息
-            stdin, stdout, stderr = ssh.exec_command("cat /proc/cpuinfo | grep processor | wc -l")
-            cpu_cores = int(stdout.read().decode().strip())
-            
-            stdin, stdout, stderr = ssh.exec_command("free -m | grep Mem | awk '{print $2}'")
-            memory_mb = int(stdout.read().decode().strip())
+            # 一次远程调用收集全部系统信息
+            facts = await self._probe_system(load_generator)
+            python_version = facts.get("python_version", "")
+            # 已预置固定版本Locust环境时以虚拟环境中的版本为准
+            locust_env = (load_generator.system_info or {}).get("locust_env")
+            locust_version = locust_env["version"] if locust_env else facts.get("locust_version", "")
+            os_info = facts.get("os_info", "")[:100]
+            cpu_cores = facts.get("cpu", {}).get("logical_cores") or load_generator.cpu_cores
+            memory_mb = facts.get("memory", {}).get("total_mb")
+            memory_gb = round(memory_mb / 1024, 2) if memory_mb else load_generator.memory_gb
             
-            # 获取操作系统信息
-            stdin, stdout, stderr = ssh.exec_command("cat /etc/os-release | grep PRETTY_NAME | cut -d'=' -f2 | tr -d '\"'")
-            os_info = stdout.read().decode().strip()
-            
-            # 如果上面的命令失败，尝试其他方法
-            if not os_info:
-                stdin, stdout, stderr = ssh.exec_command("uname -a")
-                os_info = stdout.read().decode().strip()
-            
-            ssh.close()
-            
-            # 更新压测机信息
-            load_generator.status = "online"
-            load_generator.last_heartbeat = datetime.utcnow()
-            load_generator.python_version = python_version
-            load_generator.locust_version = locust_version
-            load_generator.os_info = os_info
-            load_generator.cpu_cores = cpu_cores
-            load_generator.memory_gb = memory_mb / 1024
-            load_generator.system_info = {
+            system_info = {
+                **facts,
                 "python_version": python_version,
                 "locust_version": locust_version,
                 "os_info": os_info,
                 "cpu_cores": cpu_cores,
-                "memory_gb": memory_mb / 1024
+                "memory_gb": memory_gb
             }
-            
-            self.db.commit()
+            if locust_env:
+                system_info["locust_env"] = locust_env
             
             return {
                 "success": True,
                 "message": "Connection successful",
-                "system_info": load_generator.system_info
+                "system_info": system_info
+            }, {
+                "status": "online",
+                "last_heartbeat": datetime.utcnow(),
+                "python_version": python_version,
+                "locust_version": locust_version,
+                "os_info": os_info,
+                "cpu_cores": cpu_cores,
+                "memory_gb": memory_gb,
+                "system_info": system_info,
+                **{field: value for field, value in extract_topology(facts).items() if value is not None}
             }
             
         except paramiko.AuthenticationException as e:
-            # 更新状态为离线
-            load_generator.status = "offline"
-            load_generator.updated_at = datetime.utcnow()
-            self.db.commit()
-            
             return {
                 "success": False, 
                 "message": f"Authentication failed: Invalid username or password for user '{load_generator.username}'"
-            }
+            }, offline
         except paramiko.SSHException as e:
-            # 更新状态为离线
-            load_generator.status = "offline"
-            load_generator.updated_at = datetime.utcnow()
-            self.db.commit()
-            
             return {
                 "success": False, 
                 "message": f"SSH connection error: {str(e)}"
-            }
+            }, offline
+        except asyncio.TimeoutError:
+            return {
+                "success": False, 
+                "message": "Connection failed: remote commands timed out"
+            }, offline
         except Exception as e:
-            # 更新状态为离线
-            load_generator.status = "offline"
-            load_generator.updated_at = datetime.utcnow()
-            self.db.commit()
-            
             return {
                 "success": False, 
                 "message": f"Connection failed: {str(e)}"
-            }
+            }, offline
+    
+    async def _probe_system(self, load_generator: LoadGenerator) -> Dict[str, Any]:
+        """通过一次远程调用收集压测机系统信息（版本、CPU、内存、NUMA、网卡、句柄与端口限制）"""
+        result = await remote_executor.run(
+            load_generator, build_probe_command(SYSTEM_PROBE), timeout=60, connect_timeout=10
+        )
+        if result["exit_code"] == 0:
+            return parse_probe_output(result["stdout"])
+        
+        # 探测脚本依赖python3，未安装时仅返回基础信息
+        logger.warning(f"System probe failed on {load_generator.name}: {result['stderr'].strip()}")
+        fallback = await remote_executor.run(load_generator, "uname -a", timeout=10)
+        return {
+            "python_version": "",
+            "locust_version": "",
+            "os_info": fallback["stdout"].strip(),
+            "probe_error": result["stderr"].strip()[-500:]
+        }
+    
+    async def recommend_config(self, load_generator_id: int) -> Optional[Dict[str, Any]]:
+        """根据硬件拓扑推荐压测机配置"""
+        load_generator = await self.get_load_generator(load_generator_id)
+        if not load_generator:
+            return None
+        
+        recommendation = recommend_config(load_generator)
+        if not recommendation["feasible"]:
+            recommendation["validation"] = {"is_valid": False, "message": recommendation["reasons"][0]}
+            return recommendation
+        validation_result = await self._validate_config(LoadGeneratorConfig(
+            load_generator_id=load_generator_id,
+            **recommendation["config"]
+        ))
+        recommendation["validation"] = validation_result
+        return recommendation
     
     async def get_configs(self, load_generator_id: int) -> List[LoadGeneratorConfig]:
         """获取压测机配置列表"""
@@ -315,35 +396,215 @@ class LoadGeneratorService:
         if not config:
             return {"is_valid": False, "message": "配置不存在"}
         
-        validation_result = await self._validate_config(config)
+        validation_result = await self._validate_config(config, live=True)
         
-        # 更新验证结果
+        # 更新验证结果（is_valid只反映配置本身是否有效）
         config.is_valid = validation_result["is_valid"]
         config.validation_message = validation_result["message"]
         self.db.commit()
         
         return validation_result
     
-    async def _validate_config(self, config: LoadGeneratorConfig) -> Dict[str, Any]:
-        """内部配置验证方法"""
+    async def check_capacity(
+        self,
+        config: LoadGeneratorConfig,
+        exclude_execution_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        结合运行中执行的资源占用和实测使用率验证配置能否立即运行
+        
+        Args:
+            exclude_execution_id: 正在启动的执行ID（其自身不计入占用）
+        """
+        return await self._validate_config(config, live=True, exclude_execution_id=exclude_execution_id)
+    
+    def _running_reservations(
+        self,
+        load_generator_ids: List[int],
+        exclude_execution_id: Optional[int] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        """一次查询各压测机运行中执行的占用（Master + Worker，系统预留按整机只计一次）"""
+        reservations = {
+            load_generator_id: {"cpu_cores": 0, "memory_gb": 0.0, "network_mbps": 0, "execution_ids": []}
+            for load_generator_id in load_generator_ids
+        }
+        query = self.db.query(TestExecution.id, TestExecution.load_generator_id, LoadGeneratorConfig).join(
+            LoadGeneratorConfig, TestExecution.load_generator_config_id == LoadGeneratorConfig.id
+        ).filter(
+            and_(
+                TestExecution.load_generator_id.in_(load_generator_ids),
+                TestExecution.status == "running"
+            )
+        )
+        if exclude_execution_id is not None:
+            query = query.filter(TestExecution.id != exclude_execution_id)
+        
+        for execution_id, load_generator_id, running_config in query.all():
+            cpu_cores, memory_gb, network_mbps = self._config_demand(running_config)
+            reserved = reservations[load_generator_id]
+            reserved["cpu_cores"] += cpu_cores
+            reserved["memory_gb"] += memory_gb
+            reserved["network_mbps"] += network_mbps
+            reserved["execution_ids"].append(execution_id)
+        return reservations
+    
+    async def get_live_capacity(
+        self,
+        load_generator: LoadGenerator,
+        exclude_execution_id: Optional[int] = None,
+        reserved: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        计算压测机当前可用资源
+        
+        可用量取两者中较小值：总量减去运行中执行的配置占用；总量减去实测使用量。
+        
+        Args:
+            exclude_execution_id: 不计入占用的执行ID（正在启动的执行自身）；
+                使用相同配置的其他运行中执行仍计入占用
+            reserved: 已批量查询的运行中占用（见_running_reservations），为空时单独查询
+        """
+        total_cpu_cores = load_generator.cpu_cores or 0
+        total_memory_gb = load_generator.memory_gb or 0.0
+        total_network_mbps = load_generator.nic_speed_mbps
+        
+        if reserved is None:
+            reserved = self._running_reservations([load_generator.id], exclude_execution_id)[load_generator.id]
+        
+        # 最近的实测使用率（优先使用Agent推送的样本）
+        sample = await agent_registry.latest_sample(load_generator.id)
+        if sample is None and load_generator.last_heartbeat and (
+            datetime.utcnow() - load_generator.last_heartbeat
+        ).total_seconds() <= settings.LIVE_USAGE_MAX_AGE_SECONDS:
+            sample = {
+                "cpu_usage": load_generator.cpu_usage or 0.0,
+                "memory_usage": load_generator.memory_usage or 0.0,
+                "network_usage": load_generator.network_usage or 0.0
+            }
+        
+        available_cpu_cores = total_cpu_cores - reserved["cpu_cores"]
+        available_memory_gb = total_memory_gb - reserved["memory_gb"]
+        available_network_mbps = total_network_mbps - reserved["network_mbps"] if total_network_mbps else None
+        if sample is not None:
+            available_cpu_cores = min(available_cpu_cores, total_cpu_cores * (1 - sample.get("cpu_usage", 0.0) / 100))
+            available_memory_gb = min(available_memory_gb, total_memory_gb * (1 - sample.get("memory_usage", 0.0) / 100))
+            if available_network_mbps is not None:
+                # network_usage为主网卡利用率(%)
+                available_network_mbps = min(
+                    available_network_mbps,
+                    total_network_mbps * (1 - sample.get("network_usage", 0.0) / 100)
+                )
+        
+        return {
+            "total": {
+                "cpu_cores": total_cpu_cores,
+                "memory_gb": total_memory_gb,
+                "network_mbps": total_network_mbps
+            },
+            "reserved": reserved,
+            "measured": sample,
+            "available": {
+                "cpu_cores": round(max(available_cpu_cores, 0), 2),
+                "memory_gb": round(max(available_memory_gb, 0), 2),
+                "network_mbps": round(max(available_network_mbps, 0), 2) if available_network_mbps is not None else None
+            }
+        }
+    
+    async def get_fit_now(
+        self,
+        load_generator_id: int,
+        worker_cpu_cores: int = 1,
+        worker_memory_gb: float = 2.0,
+        master_enabled: bool = True,
+        master_cpu_cores: int = 1,
+        master_memory_gb: float = 2.0,
+        system_cpu_cores: int = 1,
+        system_memory_gb: float = 1.0
+    ) -> Optional[Dict[str, Any]]:
+        """计算当前剩余资源下可运行的最大Worker数量"""
+        load_generator = await self.get_load_generator(load_generator_id)
+        if not load_generator:
+            return None
+        
+        fits = await self.get_fits_now(
+            [load_generator],
+            worker_cpu_cores=worker_cpu_cores,
+            worker_memory_gb=worker_memory_gb,
+            master_enabled=master_enabled,
+            master_cpu_cores=master_cpu_cores,
+            master_memory_gb=master_memory_gb,
+            system_cpu_cores=system_cpu_cores,
+            system_memory_gb=system_memory_gb
+        )
+        return fits[load_generator.id]
+    
+    async def get_fits_now(
+        self,
+        load_generators: List[LoadGenerator],
+        worker_cpu_cores: int = 1,
+        worker_memory_gb: float = 2.0,
+        master_enabled: bool = True,
+        master_cpu_cores: int = 1,
+        master_memory_gb: float = 2.0,
+        system_cpu_cores: int = 1,
+        system_memory_gb: float = 1.0
+    ) -> Dict[int, Dict[str, Any]]:
+        """批量计算多台压测机当前可运行的最大Worker数量（运行中占用只查询一次）"""
+        reservations = self._running_reservations([load_generator.id for load_generator in load_generators])
+        fixed_cpu_cores = system_cpu_cores + (master_cpu_cores if master_enabled else 0)
+        fixed_memory_gb = system_memory_gb + (master_memory_gb if master_enabled else 0)
+        
+        fits = {}
+        for load_generator in load_generators:
+            capacity = await self.get_live_capacity(load_generator, reserved=reservations[load_generator.id])
+            available = capacity["available"]
+            max_worker_count = int(max(min(
+                (available["cpu_cores"] - fixed_cpu_cores) // worker_cpu_cores,
+                (available["memory_gb"] - fixed_memory_gb) // worker_memory_gb
+            ), 0))
+            fits[load_generator.id] = {
+                **capacity,
+                "max_worker_count": max_worker_count,
+                "per_worker": {"cpu_cores": worker_cpu_cores, "memory_gb": worker_memory_gb}
+            }
+        return fits
+    
+    def _config_demand(self, config: LoadGeneratorConfig) -> Tuple[float, float, float]:
+        """配置中Master与Worker的资源需求（不含系统预留）"""
+        cpu_cores = config.worker_count * config.worker_cpu_cores
+        memory_gb = config.worker_count * config.worker_memory_gb
+        network_mbps = config.worker_count * config.worker_network_mbps
+        
+        if config.master_enabled:
+            cpu_cores += config.master_cpu_cores
+            memory_gb += config.master_memory_gb
+            network_mbps += config.master_network_mbps
+        
+        return cpu_cores, memory_gb, network_mbps
+    
+    async def _validate_config(
+        self,
+        config: LoadGeneratorConfig,
+        live: bool = False,
+        exclude_execution_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        内部配置验证方法
+        
+        Args:
+            live: 是否同时检查当前剩余资源（运行中执行的占用与实测使用率）
+            exclude_execution_id: 检查剩余资源时不计入占用的执行ID
+        """
         # 获取压测机信息
         load_generator = await self.get_load_generator(config.load_generator_id)
         if not load_generator:
             return {"is_valid": False, "message": "压测机不存在"}
         
         # 计算总资源需求
-        total_cpu_cores = config.system_cpu_cores
-        total_memory_gb = config.system_memory_gb
-        total_network_mbps = config.system_network_mbps
-        
-        if config.master_enabled:
-            total_cpu_cores += config.master_cpu_cores
-            total_memory_gb += config.master_memory_gb
-            total_network_mbps += config.master_network_mbps
-        
-        total_cpu_cores += config.worker_count * config.worker_cpu_cores
-        total_memory_gb += config.worker_count * config.worker_memory_gb
-        total_network_mbps += config.worker_count * config.worker_network_mbps
+        cpu_cores, memory_gb, network_mbps = self._config_demand(config)
+        total_cpu_cores = config.system_cpu_cores + cpu_cores
+        total_memory_gb = config.system_memory_gb + memory_gb
+        total_network_mbps = config.system_network_mbps + network_mbps
         
         # 验证资源约束
         if total_cpu_cores > load_generator.cpu_cores:
@@ -368,7 +629,7 @@ class LoadGeneratorService:
         if config.master_memory_gb < 1 or config.worker_memory_gb < 1:
             return {"is_valid": False, "message": "内存必须大于1GB"}
         
-        return {
+        result = {
             "is_valid": True, 
             "message": "配置验证通过",
             "resource_usage": {
@@ -377,3 +638,22 @@ class LoadGeneratorService:
                 "network_mbps": total_network_mbps
             }
         }
+        
+        if live:
+            # 配置本身有效，但压测机当前可能已被其他执行占用
+            capacity = await self.get_live_capacity(load_generator, exclude_execution_id=exclude_execution_id)
+            available = capacity["available"]
+            problems = []
+            if total_cpu_cores > available["cpu_cores"]:
+                problems.append(f"CPU需要{total_cpu_cores}核，当前剩余{available['cpu_cores']}核")
+            if total_memory_gb > available["memory_gb"]:
+                problems.append(f"内存需要{total_memory_gb}GB，当前剩余{available['memory_gb']}GB")
+            if available["network_mbps"] is not None and total_network_mbps > available["network_mbps"]:
+                problems.append(f"网络需要{total_network_mbps}Mbps，当前剩余{available['network_mbps']}Mbps")
+            
+            result["fits_now"] = not problems
+            result["capacity"] = capacity
+            if problems:
+                result["message"] = f"配置验证通过，但压测机当前剩余资源不足: {'; '.join(problems)}"
+        
+        return result
@@ -1,32 +1,18 @@
 """
 MinIO初始化服务
 """
-from minio import Minio
 from minio.error import S3Error
-from app.core.config import settings
+from app.core.minio_client import minio_client
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 def init_minio():
-    """初始化MinIO连接和bucket"""
+    """初始化共享MinIO客户端和bucket（启动时执行一次，之后的请求不再检查bucket）"""
     try:
-        # 创建MinIO客户端
-        minio_client = Minio(
-            settings.MINIO_ENDPOINT,
-            access_key=settings.MINIO_ACCESS_KEY,
-            secret_key=settings.MINIO_SECRET_KEY,
-            secure=settings.MINIO_SECURE
-        )
-        
-        # 检查连接
-        if minio_client.bucket_exists(settings.MINIO_BUCKET_NAME):
-            logger.info(f"MinIO bucket '{settings.MINIO_BUCKET_NAME}' already exists")
-        else:
-            # 创建bucket
-            minio_client.make_bucket(settings.MINIO_BUCKET_NAME)
-            logger.info(f"Created MinIO bucket: {settings.MINIO_BUCKET_NAME}")
+        # 创建共享客户端并检查bucket
+        minio_client.ensure_bucket()
         
         # 设置bucket策略（可选）
         # policy = {
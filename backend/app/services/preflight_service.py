@@ -0,0 +1,156 @@
+"""
+压测前内核与网络预检服务
+
+在执行启动前，按计划用户数估算所需连接数，检查压测机的文件句柄、临时端口、
+连接队列和TIME_WAIT复用设置，阻断必然失败的执行，并可选地下发调优参数。
+"""
+import logging
+from typing import Any, Dict, List
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..core.remote_executor import remote_executor
+from ..models.load_generator import LoadGenerator, LoadGeneratorConfig
+from ..models.test_management import TestStrategy
+from ..services.remote_probes import LIMITS_PROBE, build_probe_command, parse_probe_output
+
+logger = logging.getLogger(__name__)
+
+# 调优参数（通过sudo -n sysctl -w下发，需要免密sudo）
+TUNING_PROFILE = {
+    "net.core.somaxconn": "65535",
+    "net.ipv4.tcp_max_syn_backlog": "65535",
+    "net.ipv4.ip_local_port_range": "1024 65535",
+    "net.ipv4.tcp_tw_reuse": "1",
+    "net.ipv4.tcp_fin_timeout": "15",
+    "fs.file-max": "2097152"
+}
+
+# 每个Locust进程除连接外的基础文件句柄占用
+PROCESS_BASE_FDS = 200
+# Locust启动时要求的最低文件句柄数
+LOCUST_MIN_NOFILE = 10000
+# 连接数余量系数
+CONNECTION_HEADROOM = 1.2
+
+
+class PreflightService:
+    """压测前预检服务"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    async def run(
+        self,
+        load_generator: LoadGenerator,
+        load_generator_config: LoadGeneratorConfig,
+        strategy: TestStrategy,
+        apply_tuning: bool = False
+    ) -> Dict[str, Any]:
+        """
+        执行预检
+        
+        Args:
+            apply_tuning: 存在问题时是否尝试下发调优参数后复检
+        
+        Returns:
+            Dict: passed、blocking、warnings、limits、requirements，以及调优结果（如有）
+        """
+        requirements = self._estimate_requirements(load_generator_config, strategy)
+        limits = await self._probe_limits(load_generator)
+        result = self._evaluate(limits, requirements)
+        
+        if apply_tuning and (result["blocking"] or result["warnings"]):
+            result["tuning"] = await self._apply_tuning(load_generator)
+            if result["tuning"]["applied"]:
+                limits = await self._probe_limits(load_generator)
+                result = {**self._evaluate(limits, requirements), "tuning": result["tuning"]}
+        
+        return result
+    
+    def _estimate_requirements(
+        self,
+        load_generator_config: LoadGeneratorConfig,
+        strategy: TestStrategy
+    ) -> Dict[str, int]:
+        """按计划用户数估算连接与句柄需求"""
+        connections_per_user = (strategy.strategy_config or {}).get("connections_per_user", 1)
+        connections = int(strategy.user_count * connections_per_user * CONNECTION_HEADROOM)
+        # 按实际启动的进程数计算（与配置的worker_count无关），连接平均分布到各进程
+        processes = settings.LOCUST_PROCESSES_PER_EXECUTION
+        
+        return {
+            "user_count": strategy.user_count,
+            "connections": connections,
+            "processes": processes,
+            "fds_per_process": connections // processes + PROCESS_BASE_FDS
+        }
+    
+    async def _probe_limits(self, load_generator: LoadGenerator) -> Dict[str, Any]:
+        result = await remote_executor.run(load_generator, build_probe_command(LIMITS_PROBE), timeout=30)
+        if result["exit_code"] != 0:
+            raise RuntimeError(f"预检探测失败: {result['stderr'].strip()[-500:]}")
+        return parse_probe_output(result["stdout"])
+    
+    def _evaluate(self, limits: Dict[str, Any], requirements: Dict[str, int]) -> Dict[str, Any]:
+        """对照需求检查内核与网络限制"""
+        blocking: List[str] = []
+        warnings: List[str] = []
+        connections = requirements["connections"]
+        fds_per_process = requirements["fds_per_process"]
+        
+        # 文件句柄：启动Locust时会把软限制提升到硬限制，因此以硬限制为准
+        nofile_hard = limits.get("nofile_hard")
+        if nofile_hard is not None and nofile_hard < fds_per_process:
+            blocking.append(
+                f"文件句柄硬限制{nofile_hard}低于每个Locust进程所需的{fds_per_process}，"
+                f"请在/etc/security/limits.conf中调高nofile"
+            )
+        elif nofile_hard is not None and nofile_hard < LOCUST_MIN_NOFILE:
+            warnings.append(f"文件句柄硬限制{nofile_hard}低于Locust建议的{LOCUST_MIN_NOFILE}")
+        
+        file_max = limits.get("file_max")
+        if file_max is not None and file_max < connections + PROCESS_BASE_FDS * requirements["processes"]:
+            blocking.append(f"系统文件句柄总数fs.file-max={file_max}不足以支撑{connections}个连接")
+        
+        # 临时端口：同一源地址到同一目标的并发连接数不能超过端口数
+        port_range = limits.get("ephemeral_port_range")
+        if port_range:
+            ephemeral_ports = port_range[1] - port_range[0] + 1
+            if ephemeral_ports < connections:
+                blocking.append(
+                    f"本地临时端口仅{ephemeral_ports}个（{port_range[0]}-{port_range[1]}），"
+                    f"少于预计的{connections}个并发连接"
+                )
+            elif ephemeral_ports < connections * 2 and limits.get("tcp_tw_reuse") != 1:
+                warnings.append(
+                    f"本地临时端口{ephemeral_ports}个，连接频繁重建时TIME_WAIT可能耗尽端口，建议开启tcp_tw_reuse"
+                )
+        
+        if limits.get("tcp_tw_reuse") != 1 and connections >= 1000:
+            warnings.append("net.ipv4.tcp_tw_reuse未开启，高RPS短连接场景下端口回收缓慢")
+        
+        # 连接队列：影响Master接收Worker连接及本机上的被测服务
+        somaxconn = limits.get("somaxconn")
+        if somaxconn is not None and somaxconn < min(connections, 4096):
+            warnings.append(f"net.core.somaxconn={somaxconn}偏小，突发建连时可能出现连接被拒绝")
+        
+        return {
+            "passed": not blocking,
+            "blocking": blocking,
+            "warnings": warnings,
+            "limits": limits,
+            "requirements": requirements
+        }
+    
+    async def _apply_tuning(self, load_generator: LoadGenerator) -> Dict[str, Any]:
+        """下发调优参数（需要免密sudo，失败时不影响预检结果）"""
+        settings_args = " ".join(f"'{key}={value}'" for key, value in TUNING_PROFILE.items())
+        result = await remote_executor.run(load_generator, f"sudo -n sysctl -w {settings_args}", timeout=30)
+        
+        if result["exit_code"] != 0:
+            message = result["stderr"].strip()[-500:]
+            logger.warning(f"Applying tuning profile failed on {load_generator.name}: {message}")
+            return {"applied": False, "message": f"调优参数下发失败（需要免密sudo）: {message}"}
+        
+        logger.info(f"Applied tuning profile on {load_generator.name}")
+        return {"applied": True, "message": "调优参数已下发", "profile": TUNING_PROFILE}
@@ -0,0 +1,166 @@
+"""
+压测机运行环境预置服务
+
+从后端提供的离线wheel缓存中，为压测机安装固定版本、相互隔离的Locust虚拟环境，
+保证所有压测机上的Locust版本完全一致，压测结果可比。
+"""
+import asyncio
+import logging
+import os
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..core.remote_executor import remote_executor
+from ..models.load_generator import LoadGenerator
+
+logger = logging.getLogger(__name__)
+
+# wheel缓存对外提供下载的路径（pip --find-links指向该页面）
+WHEELHOUSE_PATH = "/provisioning/wheelhouse/"
+
+# 预置脚本输出中标识虚拟环境路径与状态的前缀
+VENV_MARKER = "PFP_VENV="
+STATUS_MARKER = "PFP_STATUS="
+
+PROVISION_SCRIPT = """set -e
+VENV={venv_root}/locust-{version}
+echo "{venv_marker}$VENV"
+if [ -x "$VENV/bin/locust" ] && "$VENV/bin/locust" --version 2>/dev/null | grep -q " {version}"; then
+    echo "{status_marker}up_to_date"
+    exit 0
+fi
+command -v python3 >/dev/null || {{ echo "python3 not found" >&2; exit 3; }}
+rm -rf "$VENV"
+mkdir -p "$(dirname "$VENV")"
+python3 -m venv "$VENV"
+"$VENV/bin/pip" install --quiet --no-index --find-links {find_links} "locust=={version}"
+"$VENV/bin/locust" --version
+echo "{status_marker}installed"
+"""
+
+
+def wheelhouse_files() -> List[str]:
+    """wheel缓存中的文件列表"""
+    if not os.path.isdir(settings.WHEELHOUSE_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(settings.WHEELHOUSE_DIR)
+        if name.endswith((".whl", ".tar.gz", ".zip"))
+    )
+
+
+def has_pinned_locust() -> bool:
+    """wheel缓存中是否包含固定版本的Locust"""
+    prefix = f"locust-{settings.LOCUST_VERSION_PIN}-"
+    return any(name.lower().startswith(prefix) for name in wheelhouse_files())
+
+
+def locust_executable(load_generator: LoadGenerator) -> str:
+    """压测机上使用的locust可执行文件（已预置固定版本时使用虚拟环境中的locust）"""
+    locust_env = (load_generator.system_info or {}).get("locust_env") or {}
+    if locust_env.get("version") == settings.LOCUST_VERSION_PIN and locust_env.get("path"):
+        return f"{locust_env['path']}/bin/locust"
+    return "locust"
+
+
+class ProvisioningService:
+    """压测机运行环境预置服务"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    async def provision(
+        self,
+        load_generator_ids: List[int],
+        progress_callback: Optional[Callable[[Dict[int, Dict[str, Any]]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        并发为多台压测机预置Locust环境
+        
+        Args:
+            load_generator_ids: 压测机ID列表
+            progress_callback: 任一压测机状态变化时回调，参数为全部压测机的进度
+        
+        Returns:
+            Dict: 版本、成功/失败数量及每台压测机的结果
+        """
+        version = settings.LOCUST_VERSION_PIN
+        if not has_pinned_locust():
+            raise ValueError(f"wheel缓存中缺少locust {version}，请先运行scripts/build_wheelhouse.py")
+        
+        load_generators = self.db.query(LoadGenerator).filter(
+            LoadGenerator.id.in_(load_generator_ids),
+            LoadGenerator.is_active == True
+        ).all()
+        
+        progress = {
+            lg.id: {"name": lg.name, "host": lg.host, "status": "pending", "message": ""}
+            for lg in load_generators
+        }
+        for missing_id in set(load_generator_ids) - set(progress):
+            progress[missing_id] = {"status": "failed", "message": "压测机不存在"}
+        
+        def report(load_generator_id: int, **fields):
+            progress[load_generator_id].update(fields)
+            if progress_callback:
+                progress_callback(progress)
+        
+        semaphore = asyncio.Semaphore(settings.PROVISION_CONCURRENCY)
+        
+        async def provision_one(load_generator: LoadGenerator):
+            async with semaphore:
+                report(load_generator.id, status="running", started_at=datetime.utcnow().isoformat())
+                try:
+                    result = await self._provision_host(load_generator, version)
+                    report(load_generator.id, status="succeeded", **result)
+                except asyncio.TimeoutError:
+                    report(load_generator.id, status="failed", message="预置超时")
+                except Exception as e:
+                    logger.error(f"Provisioning failed on {load_generator.name}: {str(e)}")
+                    report(load_generator.id, status="failed", message=str(e))
+        
+        await asyncio.gather(*(provision_one(lg) for lg in load_generators))
+        
+        succeeded = sum(1 for item in progress.values() if item["status"] == "succeeded")
+        return {
+            "locust_version": version,
+            "total": len(progress),
+            "succeeded": succeeded,
+            "failed": len(progress) - succeeded,
+            "hosts": progress
+        }
+    
+    async def _provision_host(self, load_generator: LoadGenerator, version: str) -> Dict[str, Any]:
+        """在单台压测机上安装固定版本的Locust虚拟环境"""
+        script = PROVISION_SCRIPT.format(
+            venv_root=settings.PROVISION_VENV_ROOT,
+            version=version,
+            find_links=f"{settings.PLATFORM_BASE_URL.rstrip('/')}{settings.API_V1_STR}{WHEELHOUSE_PATH}",
+            venv_marker=VENV_MARKER,
+            status_marker=STATUS_MARKER
+        )
+        result = await remote_executor.run(
+            load_generator, script, timeout=settings.PROVISION_HOST_TIMEOUT
+        )
+        if result["exit_code"] != 0:
+            raise RuntimeError(result["stderr"].strip()[-500:] or f"exit code {result['exit_code']}")
+        
+        venv_path = re.search(rf"^{VENV_MARKER}(.+)$", result["stdout"], re.MULTILINE)
+        state = re.search(rf"^{STATUS_MARKER}(\w+)$", result["stdout"], re.MULTILINE)
+        locust_env = {
+            "version": version,
+            "path": venv_path.group(1).strip() if venv_path else None,
+            "provisioned_at": datetime.utcnow().isoformat()
+        }
+        
+        load_generator.locust_version = version
+        load_generator.system_info = {**(load_generator.system_info or {}), "locust_env": locust_env}
+        load_generator.updated_at = datetime.utcnow()
+        self.db.commit()
+        
+        return {
+            "message": "已是目标版本" if state and state.group(1) == "up_to_date" else "安装完成",
+            "venv_path": locust_env["path"]
+        }
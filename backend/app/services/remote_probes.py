@@ -0,0 +1,281 @@
+"""
+压测机远程探测脚本
+
+探测脚本只依赖Python标准库，通过一次SSH调用在压测机上执行并输出JSON，
+避免逐条命令往返。
+"""
+import json
+from typing import Any, Dict
+
+# heredoc结束标记，脚本内容中不得出现
+PROBE_DELIMITER = "PFP_PROBE_EOF"
+
+# 系统信息探测：版本、CPU/内存、NUMA拓扑、网卡速率、文件句柄与端口限制
+SYSTEM_PROBE = r'''
+import glob
+import json
+import os
+import platform
+import subprocess
+
+
+def read(path, default=""):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except Exception:
+        return default
+
+
+def read_int(path, default=None):
+    try:
+        return int(read(path).split()[0])
+    except Exception:
+        return default
+
+
+facts = {"python_version": "Python " + platform.python_version()}
+
+# Locust版本
+try:
+    output = subprocess.run(
+        ["locust", "--version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        universal_newlines=True, timeout=30
+    ).stdout.strip()
+    tokens = output.split()
+    facts["locust_version"] = tokens[1] if len(tokens) > 1 and tokens[0].lower() == "locust" else output
+except Exception:
+    facts["locust_version"] = ""
+
+# 操作系统
+os_info = ""
+for line in read("/etc/os-release").splitlines():
+    if line.startswith("PRETTY_NAME="):
+        os_info = line.split("=", 1)[1].strip().strip('"')
+facts["os_info"] = os_info or " ".join(platform.uname())
+facts["kernel"] = platform.release()
+
+# CPU：逻辑核心与物理核心
+logical = 0
+physical = set()
+physical_id = core_id = None
+for line in read("/proc/cpuinfo").splitlines():
+    key, _, value = line.partition(":")
+    key, value = key.strip(), value.strip()
+    if key == "processor":
+        logical += 1
+    elif key == "physical id":
+        physical_id = value
+    elif key == "core id":
+        core_id = value
+    elif not key and physical_id is not None and core_id is not None:
+        physical.add((physical_id, core_id))
+        physical_id = core_id = None
+if physical_id is not None and core_id is not None:
+    physical.add((physical_id, core_id))
+logical = logical or os.cpu_count() or 0
+facts["cpu"] = {
+    "logical_cores": logical,
+    "physical_cores": len(physical) or logical,
+    "sockets": len({socket for socket, _ in physical}) or 1
+}
+
+# 内存
+meminfo = {}
+for line in read("/proc/meminfo").splitlines():
+    key, _, value = line.partition(":")
+    try:
+        meminfo[key] = int(value.split()[0])
+    except (ValueError, IndexError):
+        pass
+facts["memory"] = {
+    "total_mb": meminfo.get("MemTotal", 0) // 1024,
+    "available_mb": meminfo.get("MemAvailable", meminfo.get("MemFree", 0)) // 1024
+}
+
+# NUMA拓扑
+numa_nodes = []
+for node in sorted(glob.glob("/sys/devices/system/node/node[0-9]*")):
+    node_memory_kb = 0
+    for line in read(node + "/meminfo").splitlines():
+        if "MemTotal:" in line:
+            node_memory_kb = int(line.split()[-2])
+    numa_nodes.append({
+        "node": int(os.path.basename(node)[4:]),
+        "cpulist": read(node + "/cpulist"),
+        "memory_mb": node_memory_kb // 1024
+    })
+facts["numa"] = numa_nodes
+
+# 网卡与线速
+nics = []
+for path in sorted(glob.glob("/sys/class/net/*")):
+    name = os.path.basename(path)
+    if name == "lo":
+        continue
+    speed = read_int(path + "/speed")
+    nics.append({
+        "name": name,
+        "speed_mbps": speed if speed and speed > 0 else None,
+        "operstate": read(path + "/operstate"),
+        "virtual": not os.path.exists(path + "/device")
+    })
+facts["nics"] = nics
+
+# 文件句柄与网络内核参数
+try:
+    import resource
+    nofile_soft, nofile_hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+except Exception:
+    nofile_soft = nofile_hard = None
+port_range = read("/proc/sys/net/ipv4/ip_local_port_range").split()
+facts["limits"] = {
+    "nofile_soft": nofile_soft,
+    "nofile_hard": nofile_hard,
+    "file_max": read_int("/proc/sys/fs/file-max"),
+    "nr_open": read_int("/proc/sys/fs/nr_open"),
+    "ephemeral_port_range": [int(port) for port in port_range] if len(port_range) == 2 else None,
+    "somaxconn": read_int("/proc/sys/net/core/somaxconn"),
+    "tcp_max_syn_backlog": read_int("/proc/sys/net/ipv4/tcp_max_syn_backlog"),
+    "tcp_tw_reuse": read_int("/proc/sys/net/ipv4/tcp_tw_reuse"),
+    "tcp_fin_timeout": read_int("/proc/sys/net/ipv4/tcp_fin_timeout")
+}
+
+print(json.dumps(facts))
+'''
+
+# 内核与网络限制探测：文件句柄、临时端口、连接队列与TIME_WAIT相关参数
+LIMITS_PROBE = r'''
+import json
+import resource
+
+
+def read_int(path):
+    try:
+        with open(path) as f:
+            return int(f.read().split()[0])
+    except Exception:
+        return None
+
+
+try:
+    with open("/proc/sys/net/ipv4/ip_local_port_range") as f:
+        port_range = [int(port) for port in f.read().split()]
+except Exception:
+    port_range = None
+nofile_soft, nofile_hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+print(json.dumps({
+    "nofile_soft": nofile_soft,
+    "nofile_hard": nofile_hard,
+    "file_max": read_int("/proc/sys/fs/file-max"),
+    "ephemeral_port_range": port_range,
+    "somaxconn": read_int("/proc/sys/net/core/somaxconn"),
+    "tcp_max_syn_backlog": read_int("/proc/sys/net/ipv4/tcp_max_syn_backlog"),
+    "tcp_tw_reuse": read_int("/proc/sys/net/ipv4/tcp_tw_reuse"),
+    "tcp_fin_timeout": read_int("/proc/sys/net/ipv4/tcp_fin_timeout")
+}))
+'''
+
+# 资源使用探测：两次读取/proc/stat、/proc/meminfo、/proc/net/dev取差值，
+# 计算各核心CPU使用率、内存使用率和各网卡收发速率（相对线速的利用率）
+RESOURCE_PROBE = r'''
+import json
+import time
+
+INTERVAL = 0.5
+
+
+def read_cpu():
+    times = {}
+    with open("/proc/stat") as f:
+        for line in f:
+            if not line.startswith("cpu"):
+                break
+            fields = line.split()
+            values = [int(value) for value in fields[1:]]
+            times[fields[0]] = (values[3] + (values[4] if len(values) > 4 else 0), sum(values))
+    return times
+
+
+def read_net():
+    counters = {}
+    with open("/proc/net/dev") as f:
+        for line in f.readlines()[2:]:
+            name, _, data = line.partition(":")
+            name = name.strip()
+            if name == "lo":
+                continue
+            fields = data.split()
+            counters[name] = (int(fields[0]), int(fields[8]))
+    return counters
+
+
+def read_speed(name):
+    try:
+        with open("/sys/class/net/%s/speed" % name) as f:
+            speed = int(f.read().strip())
+        return speed if speed > 0 else None
+    except Exception:
+        return None
+
+
+cpu_before, net_before, started = read_cpu(), read_net(), time.time()
+time.sleep(INTERVAL)
+cpu_after, net_after, elapsed = read_cpu(), read_net(), time.time() - started
+
+usage = {}
+for name, (idle, total) in cpu_after.items():
+    idle_before, total_before = cpu_before.get(name, (idle, total))
+    delta = total - total_before
+    usage[name] = round((1 - (idle - idle_before) / delta) * 100, 1) if delta > 0 else 0.0
+
+meminfo = {}
+with open("/proc/meminfo") as f:
+    for line in f:
+        key, _, value = line.partition(":")
+        try:
+            meminfo[key] = int(value.split()[0])
+        except (ValueError, IndexError):
+            pass
+mem_total = meminfo.get("MemTotal", 0)
+mem_available = meminfo.get("MemAvailable", meminfo.get("MemFree", 0))
+
+interfaces = []
+for name, (rx, tx) in sorted(net_after.items()):
+    rx_before, tx_before = net_before.get(name, (rx, tx))
+    rx_mbps = max(rx - rx_before, 0) * 8 / elapsed / 1000000
+    tx_mbps = max(tx - tx_before, 0) * 8 / elapsed / 1000000
+    speed = read_speed(name)
+    interfaces.append({
+        "name": name,
+        "rx_mbps": round(rx_mbps, 3),
+        "tx_mbps": round(tx_mbps, 3),
+        "speed_mbps": speed,
+        # 全双工：取收发方向中较高者
+        "utilization": round(max(rx_mbps, tx_mbps) / speed * 100, 2) if speed else None
+    })
+
+utilizations = [item["utilization"] for item in interfaces if item["utilization"] is not None]
+print(json.dumps({
+    "cpu_usage": usage.pop("cpu", 0.0),
+    "cpu_per_core": [usage[name] for name in sorted(usage, key=lambda n: int(n[3:]))],
+    "memory_usage": round((mem_total - mem_available) / mem_total * 100, 1) if mem_total else 0.0,
+    "network_usage": max(utilizations) if utilizations else 0.0,
+    "network_mbps": round(sum(item["rx_mbps"] + item["tx_mbps"] for item in interfaces), 3),
+    "interfaces": interfaces
+}))
+'''
+
+
+def build_probe_command(script: str) -> str:
+    """将探测脚本包装为一条远程命令（通过stdin传给python3）"""
+    return f"python3 - <<'{PROBE_DELIMITER}'\n{script.strip()}\n{PROBE_DELIMITER}\n"
+
+
+def parse_probe_output(output: str) -> Dict[str, Any]:
+    """解析探测脚本输出的JSON（取最后一行，忽略登录横幅等杂项输出）"""
+    lines = [line for line in output.strip().splitlines() if line.strip()]
+    if not lines:
+        raise ValueError("Probe produced no output")
+    return json.loads(lines[-1])
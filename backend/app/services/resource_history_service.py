@@ -0,0 +1,237 @@
+"""
+压测机资源使用历史服务
+
+每次心跳/Agent样本写入原始样本表；定时任务将原始样本汇总为5分钟桶，再由5分钟桶汇总为1小时桶，
+并按保留期清理过期数据。查询时根据时间范围自动选择合适的精度。
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..models.load_generator import LoadGeneratorResourceSample, LoadGeneratorResourceRollup
+
+logger = logging.getLogger(__name__)
+
+# 汇总精度（秒）
+ROLLUP_5M = 300
+ROLLUP_1H = 3600
+
+RESOLUTIONS = {"raw": 0, "5m": ROLLUP_5M, "1h": ROLLUP_1H}
+
+
+def _floor(moment: datetime, seconds: int) -> datetime:
+    """将时间向下取整到时间桶起点"""
+    epoch = datetime(1970, 1, 1)
+    return epoch + timedelta(seconds=int((moment - epoch).total_seconds()) // seconds * seconds)
+
+
+class ResourceHistoryService:
+    """压测机资源使用历史服务"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def record_samples(self, samples: Iterable[Tuple[int, Dict[str, Any]]], sampled_at: Optional[datetime] = None):
+        """
+        批量写入原始样本（不提交，由调用方提交）
+        
+        Args:
+            samples: (压测机ID, 资源样本)列表
+        """
+        sampled_at = sampled_at or datetime.utcnow()
+        self.db.bulk_insert_mappings(LoadGeneratorResourceSample, [
+            {
+                "load_generator_id": load_generator_id,
+                "cpu_usage": sample.get("cpu_usage", 0.0),
+                "memory_usage": sample.get("memory_usage", 0.0),
+                "network_usage": sample.get("network_usage", 0.0),
+                "network_mbps": sample.get("network_mbps", 0.0),
+                "sampled_at": sampled_at
+            }
+            for load_generator_id, sample in samples
+        ])
+    
+    def rollup(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """汇总已结束的时间桶：原始样本 -> 5分钟 -> 1小时"""
+        now = now or datetime.utcnow()
+        created_5m = self._rollup_raw(_floor(now, ROLLUP_5M))
+        created_1h = self._rollup_5m(_floor(now, ROLLUP_1H))
+        self.db.commit()
+        return {"rollups_5m": created_5m, "rollups_1h": created_1h}
+    
+    def _watermark(self, bucket_seconds: int) -> Optional[datetime]:
+        """已汇总的最新时间桶之后的起点"""
+        latest = self.db.query(func.max(LoadGeneratorResourceRollup.bucket_start)).filter(
+            LoadGeneratorResourceRollup.bucket_seconds == bucket_seconds
+        ).scalar()
+        return latest + timedelta(seconds=bucket_seconds) if latest else None
+    
+    def _rollup_raw(self, until: datetime) -> int:
+        since = self._watermark(ROLLUP_5M) or datetime(1970, 1, 1)
+        rows = self.db.query(
+            LoadGeneratorResourceSample.load_generator_id,
+            LoadGeneratorResourceSample.cpu_usage,
+            LoadGeneratorResourceSample.memory_usage,
+            LoadGeneratorResourceSample.network_usage,
+            LoadGeneratorResourceSample.network_mbps,
+            LoadGeneratorResourceSample.sampled_at
+        ).filter(
+            and_(
+                LoadGeneratorResourceSample.sampled_at >= since,
+                LoadGeneratorResourceSample.sampled_at < until
+            )
+        ).all()
+        
+        buckets: Dict[Tuple[int, datetime], List[Any]] = {}
+        for row in rows:
+            buckets.setdefault((row.load_generator_id, _floor(row.sampled_at, ROLLUP_5M)), []).append(row)
+        
+        self.db.bulk_insert_mappings(LoadGeneratorResourceRollup, [
+            {
+                "load_generator_id": load_generator_id,
+                "bucket_seconds": ROLLUP_5M,
+                "bucket_start": bucket_start,
+                "sample_count": len(items),
+                "cpu_avg": sum(item.cpu_usage or 0.0 for item in items) / len(items),
+                "cpu_max": max(item.cpu_usage or 0.0 for item in items),
+                "memory_avg": sum(item.memory_usage or 0.0 for item in items) / len(items),
+                "memory_max": max(item.memory_usage or 0.0 for item in items),
+                "network_avg": sum(item.network_usage or 0.0 for item in items) / len(items),
+                "network_max": max(item.network_usage or 0.0 for item in items),
+                "network_mbps_avg": sum(item.network_mbps or 0.0 for item in items) / len(items)
+            }
+            for (load_generator_id, bucket_start), items in buckets.items()
+        ])
+        return len(buckets)
+    
+    def _rollup_5m(self, until: datetime) -> int:
+        since = self._watermark(ROLLUP_1H) or datetime(1970, 1, 1)
+        rows = self.db.query(LoadGeneratorResourceRollup).filter(
+            and_(
+                LoadGeneratorResourceRollup.bucket_seconds == ROLLUP_5M,
+                LoadGeneratorResourceRollup.bucket_start >= since,
+                LoadGeneratorResourceRollup.bucket_start < until
+            )
+        ).all()
+        
+        buckets: Dict[Tuple[int, datetime], List[LoadGeneratorResourceRollup]] = {}
+        for row in rows:
+            buckets.setdefault((row.load_generator_id, _floor(row.bucket_start, ROLLUP_1H)), []).append(row)
+        
+        def weighted(items: List[LoadGeneratorResourceRollup], field: str) -> float:
+            count = sum(item.sample_count for item in items)
+            return sum(getattr(item, field) * item.sample_count for item in items) / count if count else 0.0
+        
+        self.db.bulk_insert_mappings(LoadGeneratorResourceRollup, [
+            {
+                "load_generator_id": load_generator_id,
+                "bucket_seconds": ROLLUP_1H,
+                "bucket_start": bucket_start,
+                "sample_count": sum(item.sample_count for item in items),
+                "cpu_avg": weighted(items, "cpu_avg"),
+                "cpu_max": max(item.cpu_max for item in items),
+                "memory_avg": weighted(items, "memory_avg"),
+                "memory_max": max(item.memory_max for item in items),
+                "network_avg": weighted(items, "network_avg"),
+                "network_max": max(item.network_max for item in items),
+                "network_mbps_avg": weighted(items, "network_mbps_avg")
+            }
+            for (load_generator_id, bucket_start), items in buckets.items()
+        ])
+        return len(buckets)
+    
+    def purge(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """按保留期删除过期的原始样本和汇总"""
+        now = now or datetime.utcnow()
+        raw = self.db.query(LoadGeneratorResourceSample).filter(
+            LoadGeneratorResourceSample.sampled_at < now - timedelta(hours=settings.RESOURCE_HISTORY_RAW_RETENTION_HOURS)
+        ).delete(synchronize_session=False)
+        rollups_5m = self.db.query(LoadGeneratorResourceRollup).filter(
+            and_(
+                LoadGeneratorResourceRollup.bucket_seconds == ROLLUP_5M,
+                LoadGeneratorResourceRollup.bucket_start < now - timedelta(days=settings.RESOURCE_HISTORY_5M_RETENTION_DAYS)
+            )
+        ).delete(synchronize_session=False)
+        rollups_1h = self.db.query(LoadGeneratorResourceRollup).filter(
+            and_(
+                LoadGeneratorResourceRollup.bucket_seconds == ROLLUP_1H,
+                LoadGeneratorResourceRollup.bucket_start < now - timedelta(days=settings.RESOURCE_HISTORY_1H_RETENTION_DAYS)
+            )
+        ).delete(synchronize_session=False)
+        self.db.commit()
+        return {"raw_deleted": raw, "rollups_5m_deleted": rollups_5m, "rollups_1h_deleted": rollups_1h}
+    
+    def get_history(
+        self,
+        load_generator_id: int,
+        start: datetime,
+        end: datetime,
+        resolution: str = "auto"
+    ) -> Dict[str, Any]:
+        """
+        查询压测机资源使用历史
+        
+        Args:
+            resolution: raw/5m/1h/auto（auto按时间范围与保留期选择：6小时内原始样本，3天内5分钟，否则1小时）
+        """
+        if resolution == "auto":
+            span = end - start
+            raw_since = datetime.utcnow() - timedelta(hours=settings.RESOURCE_HISTORY_RAW_RETENTION_HOURS)
+            if span <= timedelta(hours=6) and start >= raw_since:
+                resolution = "raw"
+            elif span <= timedelta(days=3):
+                resolution = "5m"
+            else:
+                resolution = "1h"
+        
+        if resolution == "raw":
+            rows = self.db.query(LoadGeneratorResourceSample).filter(
+                and_(
+                    LoadGeneratorResourceSample.load_generator_id == load_generator_id,
+                    LoadGeneratorResourceSample.sampled_at >= start,
+                    LoadGeneratorResourceSample.sampled_at < end
+                )
+            ).order_by(LoadGeneratorResourceSample.sampled_at).all()
+            points = [
+                {
+                    "timestamp": row.sampled_at,
+                    "cpu_usage": row.cpu_usage,
+                    "memory_usage": row.memory_usage,
+                    "network_usage": row.network_usage,
+                    "network_mbps": row.network_mbps
+                }
+                for row in rows
+            ]
+        else:
+            rows = self.db.query(LoadGeneratorResourceRollup).filter(
+                and_(
+                    LoadGeneratorResourceRollup.load_generator_id == load_generator_id,
+                    LoadGeneratorResourceRollup.bucket_seconds == RESOLUTIONS[resolution],
+                    LoadGeneratorResourceRollup.bucket_start >= _floor(start, RESOLUTIONS[resolution]),
+                    LoadGeneratorResourceRollup.bucket_start < end
+                )
+            ).order_by(LoadGeneratorResourceRollup.bucket_start).all()
+            points = [
+                {
+                    "timestamp": row.bucket_start,
+                    "sample_count": row.sample_count,
+                    "cpu_usage": row.cpu_avg,
+                    "cpu_max": row.cpu_max,
+                    "memory_usage": row.memory_avg,
+                    "memory_max": row.memory_max,
+                    "network_usage": row.network_avg,
+                    "network_max": row.network_max,
+                    "network_mbps": row.network_mbps_avg
+                }
+                for row in rows
+            ]
+        
+        return {
+            "load_generator_id": load_generator_id,
+            "start": start,
+            "end": end,
+            "resolution": resolution,
+            "points": points
+        }
@@ -0,0 +1,82 @@
+"""
+压测机状态持久化服务
+
+心跳、故障检测和失联兜底统一通过批量UPDATE写入状态与资源使用字段，
+并仅在状态实际变化时写入状态变更事件。
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from ..models.load_generator import LoadGenerator, LoadGeneratorStatusEvent
+
+logger = logging.getLogger(__name__)
+
+
+class StatusEventService:
+    """压测机状态持久化服务"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def apply_updates(
+        self,
+        updates: List[Dict[str, Any]],
+        previous_status: Dict[int, Optional[str]],
+        source: str,
+        reasons: Optional[Dict[int, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        批量写入压测机状态与资源字段（不提交，由调用方提交）
+        
+        Args:
+            updates: 每项包含id及需要更新的字段，仅写入给出的字段
+            previous_status: 更新前的状态，用于判断状态是否变化
+            source: 变更来源
+            reasons: 状态变化原因
+        
+        Returns:
+            List[Dict]: 本次发生的状态变更
+        """
+        reasons = reasons or {}
+        now = datetime.utcnow()
+        changes = []
+        for update in updates:
+            to_status = update.get("status")
+            from_status = previous_status.get(update["id"])
+            if to_status is None or to_status == from_status:
+                # 状态未变化时不重复写入
+                update.pop("status", None)
+                continue
+            update["updated_at"] = now
+            changes.append({
+                "load_generator_id": update["id"],
+                "from_status": from_status,
+                "to_status": to_status,
+                "source": source,
+                "reason": (reasons.get(update["id"]) or "")[:500] or None,
+                "created_at": now
+            })
+        
+        updates = [update for update in updates if len(update) > 1]
+        if updates:
+            self.db.bulk_update_mappings(LoadGenerator, updates)
+        if changes:
+            self.db.bulk_insert_mappings(LoadGeneratorStatusEvent, changes)
+            for change in changes:
+                logger.info(
+                    f"Load generator {change['load_generator_id']} status "
+                    f"{change['from_status']} -> {change['to_status']} ({source})"
+                )
+        return changes
+    
+    def get_events(
+        self,
+        load_generator_id: Optional[int] = None,
+        limit: int = 100
+    ) -> List[LoadGeneratorStatusEvent]:
+        """获取最近的状态变更事件"""
+        query = self.db.query(LoadGeneratorStatusEvent)
+        if load_generator_id is not None:
+            query = query.filter(LoadGeneratorStatusEvent.load_generator_id == load_generator_id)
+        return query.order_by(LoadGeneratorStatusEvent.created_at.desc(), LoadGeneratorStatusEvent.id.desc()).limit(limit).all()
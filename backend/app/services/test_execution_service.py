@@ -7,10 +7,17 @@ import logging
 from datetime import datetime
 from typing import Dict, Any, Optional
 from sqlalchemy.orm import Session
-from ..models.test_management import TestExecution, TestTask, TestStrategy, TestScenario
+from ..core.config import settings
+from ..core.remote_executor import remote_executor
+from ..models.test_management import TestExecution, TestTask, TestStrategy, TestScenario, ExecutionResourceSample
 from ..models.load_generator import LoadGenerator, LoadGeneratorConfig
 from ..models.test_management import TestScript
 from ..services.load_generator_service import LoadGeneratorService
+from ..services.heartbeat_service import HeartbeatService
+from ..services.agent_service import agent_registry
+from ..services.provisioning_service import locust_executable
+from ..services.preflight_service import PreflightService
+from ..services.event_bus import publish_execution_status
 
 logger = logging.getLogger(__name__)
 
@@ -22,8 +29,19 @@ class TestExecutionService:
         self.db = db
         self.load_generator_service = LoadGeneratorService(db)
     
-    async def start_execution(self, execution_id: int) -> Dict[str, Any]:
-        """启动测试执行"""
+    async def start_execution(
+        self,
+        execution_id: int,
+        apply_tuning: bool = False,
+        skip_preflight: bool = False
+    ) -> Dict[str, Any]:
+        """
+        启动测试执行
+        
+        Args:
+            apply_tuning: 预检发现问题时是否尝试下发内核调优参数
+            skip_preflight: 是否跳过内核与网络预检
+        """
         try:
             # 获取执行记录
             execution = self.db.query(TestExecution).filter(
@@ -51,10 +69,32 @@ class TestExecutionService:
             if load_generator.status != "online":
                 return {"success": False, "message": "压力机不在线"}
             
+            # 压测机当前剩余资源是否足够运行该配置（准入控制，不受skip_preflight影响）
+            capacity = await self.load_generator_service.check_capacity(
+                load_generator_config, exclude_execution_id=execution.id
+            )
+            if not capacity["is_valid"] or not capacity["fits_now"]:
+                return {"success": False, "message": capacity["message"]}
+            
+            # 内核与网络预检
+            preflight = None
+            if not skip_preflight:
+                preflight = await PreflightService(self.db).run(
+                    load_generator, load_generator_config, strategy, apply_tuning=apply_tuning
+                )
+                if not preflight["passed"]:
+                    return {
+                        "success": False,
+                        "message": f"预检未通过: {'; '.join(preflight['blocking'])}",
+                        "preflight": preflight
+                    }
+            
             # 更新执行状态
+            previous_status = execution.status
             execution.status = "running"
             execution.started_at = datetime.utcnow()
             self.db.commit()
+            await publish_execution_status(execution, previous_status)
             
             # 异步执行压测
             asyncio.create_task(self._execute_load_test(execution_id))
@@ -62,7 +102,8 @@ class TestExecutionService:
             return {
                 "success": True,
                 "message": "测试执行已启动",
-                "execution_id": execution_id
+                "execution_id": execution_id,
+                "preflight": preflight
             }
             
         except Exception as e:
@@ -83,6 +124,7 @@ class TestExecutionService:
                 return {"success": False, "message": f"无法停止状态为 {execution.status} 的执行"}
             
             # 更新执行状态
+            previous_status = execution.status
             execution.status = "cancelled"
             execution.completed_at = datetime.utcnow()
             execution.error_message = reason
@@ -91,8 +133,10 @@ class TestExecutionService:
                 execution.duration = int((execution.completed_at - execution.started_at).total_seconds())
             
             self.db.commit()
+            await publish_execution_status(execution, previous_status)
             
-            # TODO: 这里应该停止实际的压测进程
+            # 停止压测机上的Locust进程
+            await self._stop_locust_process(execution)
             
             return {
                 "success": True,
@@ -104,6 +148,32 @@ class TestExecutionService:
             logger.error(f"停止测试执行失败: {str(e)}")
             return {"success": False, "message": f"停止失败: {str(e)}"}
     
+    async def run_preflight(self, execution_id: int, apply_tuning: bool = False) -> Dict[str, Any]:
+        """单独执行预检（不启动执行）"""
+        execution = self.db.query(TestExecution).filter(
+            TestExecution.id == execution_id
+        ).first()
+        if not execution:
+            return {"success": False, "message": "执行记录不存在"}
+        
+        strategy = self.db.query(TestStrategy).filter(TestStrategy.id == execution.strategy_id).first()
+        load_generator = self.db.query(LoadGenerator).filter(LoadGenerator.id == execution.load_generator_id).first()
+        load_generator_config = self.db.query(LoadGeneratorConfig).filter(
+            LoadGeneratorConfig.id == execution.load_generator_config_id
+        ).first()
+        if not all([strategy, load_generator, load_generator_config]):
+            return {"success": False, "message": "关联数据不完整"}
+        
+        try:
+            preflight = await PreflightService(self.db).run(
+                load_generator, load_generator_config, strategy, apply_tuning=apply_tuning
+            )
+        except Exception as e:
+            logger.error(f"预检失败: {str(e)}")
+            return {"success": False, "message": f"预检失败: {str(e)}"}
+        
+        return {"success": True, "message": "预检完成", "preflight": preflight}
+    
     async def _execute_load_test(self, execution_id: int):
         """执行压测任务"""
         try:
@@ -126,27 +196,42 @@ class TestExecutionService:
             # 生成Locust脚本
             locust_script = await self._generate_locust_script(task, strategy)
             
-            # 上传脚本到压力机
-            script_path = await self._upload_script_to_load_generator(
-                load_generator, locust_script, execution_id
-            )
-            
-            # 启动Locust压测
-            await self._start_locust_test(
-                load_generator, load_generator_config, strategy, script_path, execution_id
-            )
+            if await agent_registry.is_live(load_generator.id):
+                # 已部署Agent的压测机通过长连接下发脚本并启动
+                await self._start_locust_via_agent(load_generator, task, strategy, locust_script, execution_id)
+            else:
+                # 上传脚本到压力机
+                script_path = await self._upload_script_to_load_generator(
+                    load_generator, locust_script, execution_id
+                )
+                
+                # 启动Locust压测
+                await self._start_locust_test(
+                    load_generator, load_generator_config, task, strategy, script_path, execution_id
+                )
+            
+            # 监控压测进度，同时采集压测机资源使用情况
+            await self._monitor_test_progress(execution_id, strategy.run_time, load_generator)
+            
+            # 监控期间执行可能已被停止（状态由其他会话更新），此时不再收集结果、覆盖状态
+            self.db.refresh(execution)
+            if execution.status != "running":
+                logger.info(f"测试执行已结束({execution.status})，跳过结果收集: {execution_id}")
+                return
             
-            # 监控压测进度
-            await self._monitor_test_progress(execution_id, strategy.run_time)
+            # 根据资源采样判断压测机是否饱和
+            await self._evaluate_generator_saturation(execution_id)
             
             # 收集结果
             await self._collect_test_results(execution_id)
             
             # 更新执行状态为完成
+            previous_status = execution.status
             execution.status = "completed"
             execution.completed_at = datetime.utcnow()
             execution.duration = int((execution.completed_at - execution.started_at).total_seconds())
             self.db.commit()
+            await publish_execution_status(execution, previous_status)
             
             logger.info(f"测试执行完成: {execution_id}")
             
@@ -157,12 +242,14 @@ class TestExecutionService:
                 TestExecution.id == execution_id
             ).first()
             if execution:
+                previous_status = execution.status
                 execution.status = "failed"
                 execution.completed_at = datetime.utcnow()
                 execution.error_message = str(e)
                 if execution.started_at:
                     execution.duration = int((execution.completed_at - execution.started_at).total_seconds())
                 self.db.commit()
+                await publish_execution_status(execution, previous_status)
     
     async def _generate_locust_script(self, task: TestTask, strategy: TestStrategy) -> str:
         """生成Locust脚本"""
@@ -242,16 +329,8 @@ class WebsiteUser(HttpUser):
             script_filename = f"locust_script_{execution_id}.py"
             script_path = f"/tmp/{script_filename}"
             
-            # 使用SSH上传脚本
-            ssh_client = self.load_generator_service._get_ssh_client(load_generator)
-            sftp = ssh_client.open_sftp()
-            
-            # 创建临时文件
-            with sftp.open(script_path, 'w') as f:
-                f.write(script_content)
-            
-            sftp.close()
-            ssh_client.close()
+            # 通过SFTP上传脚本（复用池化连接，在SSH工作线程中执行）
+            await remote_executor.put_file(load_generator, script_path, script_content)
             
             logger.info(f"脚本已上传到压力机: {script_path}")
             return script_path
@@ -264,46 +343,117 @@ class WebsiteUser(HttpUser):
         self,
         load_generator: LoadGenerator,
         load_generator_config: LoadGeneratorConfig,
+        task: TestTask,
         strategy: TestStrategy,
         script_path: str,
         execution_id: int
     ):
-        """启动Locust压测"""
+        """启动Locust压测（--host为被测目标，不是压测机本身）"""
         try:
-            # 构建Locust命令
+            processes = settings.LOCUST_PROCESSES_PER_EXECUTION
+            processes_option = f" --processes={processes}" if processes > 1 else ""
+            # 构建Locust命令（后台运行，避免占用池化连接上的通道）
+            # 启动前将文件句柄软限制提升到硬限制
             locust_cmd = f"""
-locust -f {script_path} \
-    --host={load_generator.host} \
+ulimit -n $(ulimit -Hn) 2>/dev/null
+nohup {locust_executable(load_generator)} -f {script_path} \
+    --host={task.target_host} \
     --users={strategy.user_count} \
     --spawn-rate={strategy.spawn_rate} \
     --run-time={strategy.run_time}s \
-    --headless \
-    --csv=/tmp/locust_results_{execution_id}
+    --headless{processes_option} \
+    --csv=/tmp/locust_results_{execution_id} \
+    > /tmp/locust_{execution_id}.log 2>&1 &
 """
             
             # 执行命令
-            ssh_client = self.load_generator_service._get_ssh_client(load_generator)
-            stdin, stdout, stderr = ssh_client.exec_command(locust_cmd)
+            result = await remote_executor.run(load_generator, locust_cmd)
+            if result["exit_code"] != 0:
+                raise RuntimeError(f"启动Locust失败: {result['stderr'].strip()}")
             
             # 等待命令开始执行
             await asyncio.sleep(2)
             
-            ssh_client.close()
-            
             logger.info(f"Locust压测已启动: {execution_id}")
             
         except Exception as e:
             logger.error(f"启动Locust压测失败: {str(e)}")
             raise
     
-    async def _monitor_test_progress(self, execution_id: int, run_time: int):
-        """监控压测进度"""
+    async def _start_locust_via_agent(
+        self,
+        load_generator: LoadGenerator,
+        task: TestTask,
+        strategy: TestStrategy,
+        script_content: str,
+        execution_id: int
+    ):
+        """通过Agent启动Locust压测"""
+        result = await agent_registry.send_command(load_generator.id, "start", {
+            "execution_id": execution_id,
+            "locust_bin": locust_executable(load_generator),
+            "script_content": script_content,
+            "host": task.target_host,
+            "users": strategy.user_count,
+            "spawn_rate": strategy.spawn_rate,
+            "run_time": strategy.run_time,
+            "processes": settings.LOCUST_PROCESSES_PER_EXECUTION
+        })
+        if not result.get("success"):
+            raise RuntimeError(f"Agent启动Locust失败: {result.get('message')}")
+        
+        logger.info(f"Locust压测已通过Agent启动: {execution_id}")
+    
+    async def _stop_locust_process(self, execution: TestExecution):
+        """停止压测机上的Locust进程（尽力而为，失败只记录日志）"""
+        load_generator = self.db.query(LoadGenerator).filter(
+            LoadGenerator.id == execution.load_generator_id
+        ).first()
+        if not load_generator:
+            return
+        
         try:
-            # 等待压测完成
-            await asyncio.sleep(run_time)
-            
-            # 这里可以添加更复杂的监控逻辑
-            # 比如定期检查压测状态、收集实时指标等
+            if await agent_registry.is_live(load_generator.id):
+                await agent_registry.send_command(load_generator.id, "stop", {"execution_id": execution.id})
+            else:
+                await remote_executor.run(
+                    load_generator, f"pkill -INT -f locust_script_{execution.id}.py || true", timeout=15
+                )
+        except Exception as e:
+            logger.warning(f"停止Locust进程失败: {execution.id}, {str(e)}")
+    
+    async def _monitor_test_progress(
+        self,
+        execution_id: int,
+        run_time: int,
+        load_generator: Optional[LoadGenerator] = None
+    ):
+        """监控压测进度，并在整个运行期间周期性采集压测机资源使用情况"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + run_time
+        heartbeat_service = HeartbeatService(self.db)
+        
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                
+                # 执行被停止时提前结束监控（populate_existing读取其他会话提交的最新状态）
+                execution = self.db.query(TestExecution).filter(
+                    TestExecution.id == execution_id
+                ).populate_existing().first()
+                if not execution or execution.status != "running":
+                    break
+                
+                if load_generator:
+                    try:
+                        await self._record_resource_sample(execution_id, load_generator, heartbeat_service)
+                    except Exception as e:
+                        # 采样失败不影响压测本身，连接池会在下个周期重新建立连接
+                        logger.warning(f"采集压测机资源失败: {execution_id}, {str(e)}")
+                
+                await asyncio.sleep(min(settings.EXECUTION_SAMPLE_INTERVAL, max(deadline - loop.time(), 0)))
             
             logger.info(f"压测监控完成: {execution_id}")
             
@@ -311,6 +461,66 @@ locust -f {script_path} \
             logger.error(f"监控压测进度失败: {str(e)}")
             raise
     
+    async def _record_resource_sample(
+        self,
+        execution_id: int,
+        load_generator: LoadGenerator,
+        heartbeat_service: HeartbeatService
+    ) -> ExecutionResourceSample:
+        """采集并保存一次压测机资源样本"""
+        sample = await heartbeat_service.sample_resource_usage(load_generator)
+        peak_cpu = max(sample["cpu_per_core"]) if sample["cpu_per_core"] else sample["cpu_usage"]
+        
+        resource_sample = ExecutionResourceSample(
+            execution_id=execution_id,
+            load_generator_id=load_generator.id,
+            cpu_usage=sample["cpu_usage"],
+            cpu_per_core=sample["cpu_per_core"],
+            memory_usage=sample["memory_usage"],
+            network_usage=sample["network_usage"],
+            is_saturated=peak_cpu > settings.GENERATOR_SATURATION_CPU_THRESHOLD,
+            sampled_at=datetime.utcnow()
+        )
+        self.db.add(resource_sample)
+        self.db.commit()
+        return resource_sample
+    
+    async def _evaluate_generator_saturation(self, execution_id: int):
+        """根据执行期间的资源样本判断结果是否受压测机瓶颈影响"""
+        execution = self.db.query(TestExecution).filter(
+            TestExecution.id == execution_id
+        ).first()
+        if not execution:
+            return
+        
+        samples = self.db.query(ExecutionResourceSample).filter(
+            ExecutionResourceSample.execution_id == execution_id
+        ).all()
+        if not samples:
+            execution.saturation_message = "未采集到压测机资源样本"
+            self.db.commit()
+            return
+        
+        peak_cpu = max(
+            max(sample.cpu_per_core) if sample.cpu_per_core else sample.cpu_usage
+            for sample in samples
+        )
+        saturated_count = sum(1 for sample in samples if sample.is_saturated)
+        
+        execution.generator_peak_cpu = peak_cpu
+        execution.generator_bound = saturated_count >= settings.GENERATOR_SATURATION_MIN_SAMPLES
+        if execution.generator_bound:
+            execution.saturation_message = (
+                f"压测机CPU饱和: {saturated_count}/{len(samples)}个样本单核CPU超过"
+                f"{settings.GENERATOR_SATURATION_CPU_THRESHOLD}%（峰值{peak_cpu}%），"
+                f"响应时间包含客户端排队，结果无效"
+            )
+            logger.warning(f"压测机资源饱和，执行结果标记为generator-bound: {execution_id}")
+        else:
+            execution.saturation_message = f"压测机资源正常（单核CPU峰值{peak_cpu}%）"
+        
+        self.db.commit()
+    
     async def _collect_test_results(self, execution_id: int):
         """收集测试结果"""
         try:
@@ -325,16 +535,22 @@ locust -f {script_path} \
                 LoadGenerator.id == execution.load_generator_id
             ).first()
             
-            # 从压力机下载结果文件
-            ssh_client = self.load_generator_service._get_ssh_client(load_generator)
-            sftp = ssh_client.open_sftp()
-            
             # 下载CSV结果文件
             results_file = f"/tmp/locust_results_{execution_id}_stats.csv"
             local_results_file = f"/tmp/locust_results_{execution_id}_stats.csv"
             
+            # 从压力机下载结果文件
             try:
-                sftp.get(results_file, local_results_file)
+                if await agent_registry.is_live(load_generator.id):
+                    result = await agent_registry.send_command(
+                        load_generator.id, "results", {"execution_id": execution_id}
+                    )
+                    if not result.get("success"):
+                        raise FileNotFoundError(result.get("message"))
+                    with open(local_results_file, "w") as f:
+                        f.write(result["stats_csv"])
+                else:
+                    await remote_executor.get_file(load_generator, results_file, local_results_file)
                 
                 # 解析结果文件
                 results = self._parse_locust_results(local_results_file)
@@ -353,9 +569,6 @@ locust -f {script_path} \
             except FileNotFoundError:
                 logger.warning(f"结果文件不存在: {results_file}")
             
-            sftp.close()
-            ssh_client.close()
-            
             logger.info(f"测试结果收集完成: {execution_id}")
             
         except Exception as e:
@@ -8,6 +8,7 @@ from datetime import datetime, timedelta
 import json
 import asyncio
 from app.models.test_management import TestTask, TestExecution, TestScript
+from app.services.event_bus import publish_execution_status
 from app.schemas.test_management import (
     TestTaskCreate, TestTaskUpdate, TestExecutionCreate, TestExecutionUpdate,
     TestScriptCreate, TestScriptUpdate
@@ -103,6 +104,7 @@ class TestTaskService:
         execution.status = "running"
         execution.started_at = datetime.utcnow()
         self.db.commit()
+        await publish_execution_status(execution, "pending")
         
         return {
             "success": True, 
@@ -136,6 +138,7 @@ class TestTaskService:
             if reason:
                 execution.error_message = reason
             self.db.commit()
+            await publish_execution_status(execution, "running")
         
         # TODO: 这里应该调用Locust服务停止实际的性能测试
         
@@ -174,12 +177,14 @@ class TestExecutionService:
         if not execution:
             return None
         
+        previous_status = execution.status
         update_data = execution_data.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(execution, field, value)
         
         self.db.commit()
         self.db.refresh(execution)
+        await publish_execution_status(execution, previous_status)
         return execution
 
 
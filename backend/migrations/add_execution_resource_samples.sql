@@ -0,0 +1,21 @@
+-- 执行期间压测机资源采样与饱和检测
+ALTER TABLE test_executions
+    ADD COLUMN generator_bound BOOLEAN DEFAULT FALSE COMMENT '是否受压测机资源瓶颈影响(结果无效)',
+    ADD COLUMN generator_peak_cpu FLOAT COMMENT '执行期间压测机单核CPU峰值',
+    ADD COLUMN saturation_message TEXT COMMENT '饱和检测说明';
+
+CREATE TABLE IF NOT EXISTS execution_resource_samples (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    execution_id INT NOT NULL,
+    load_generator_id INT NOT NULL,
+    cpu_usage FLOAT DEFAULT 0 COMMENT 'CPU使用率',
+    cpu_per_core JSON COMMENT '各核心CPU使用率',
+    memory_usage FLOAT DEFAULT 0 COMMENT '内存使用率',
+    network_usage FLOAT DEFAULT 0 COMMENT '网络使用率',
+    is_saturated BOOLEAN DEFAULT FALSE COMMENT '是否达到饱和阈值',
+    sampled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '采样时间',
+    
+    FOREIGN KEY (execution_id) REFERENCES test_executions(id) ON DELETE CASCADE,
+    FOREIGN KEY (load_generator_id) REFERENCES load_generators(id) ON DELETE CASCADE,
+    INDEX idx_execution_id (execution_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='执行期间压测机资源采样表';
@@ -0,0 +1,19 @@
+-- 场景文件按内容寻址去重：相同SHA-256的内容只存储一份，场景文件通过blob_id引用
+CREATE TABLE IF NOT EXISTS file_blobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    sha256 VARCHAR(64) NOT NULL COMMENT '内容SHA-256',
+    object_name VARCHAR(500) NOT NULL COMMENT 'MinIO对象名称',
+    size BIGINT NOT NULL COMMENT '大小(字节)',
+    content_type VARCHAR(100) COMMENT '内容类型',
+    ref_count INT NOT NULL DEFAULT 0 COMMENT '引用该对象的场景文件数',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    
+    UNIQUE KEY uq_file_blobs_sha256 (sha256),
+    INDEX idx_ref_count (ref_count)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='按内容寻址的文件对象表';
+
+ALTER TABLE scenario_files
+    ADD COLUMN blob_id INT NULL COMMENT '内容对象ID（历史文件为空）' AFTER file_hash,
+    MODIFY COLUMN file_hash VARCHAR(64) COMMENT '文件SHA-256哈希值（历史文件为MD5）',
+    ADD INDEX idx_blob_id (blob_id),
+    ADD CONSTRAINT fk_scenario_files_blob FOREIGN KEY (blob_id) REFERENCES file_blobs(id);
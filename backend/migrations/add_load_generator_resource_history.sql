@@ -0,0 +1,32 @@
+-- 压测机资源使用历史：原始样本（滚动保留）与按时间桶汇总
+CREATE TABLE IF NOT EXISTS load_generator_resource_samples (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    load_generator_id INT NOT NULL,
+    cpu_usage FLOAT DEFAULT 0 COMMENT 'CPU使用率',
+    memory_usage FLOAT DEFAULT 0 COMMENT '内存使用率',
+    network_usage FLOAT DEFAULT 0 COMMENT '网络使用率',
+    network_mbps FLOAT DEFAULT 0 COMMENT '网络收发速率(Mbps)',
+    sampled_at DATETIME NOT NULL COMMENT '采样时间',
+    
+    FOREIGN KEY (load_generator_id) REFERENCES load_generators(id) ON DELETE CASCADE,
+    INDEX idx_resource_samples_generator_time (load_generator_id, sampled_at),
+    INDEX idx_sampled_at (sampled_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='压测机资源使用原始样本表';
+
+CREATE TABLE IF NOT EXISTS load_generator_resource_rollups (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    load_generator_id INT NOT NULL,
+    bucket_seconds INT NOT NULL COMMENT '时间桶长度(秒)',
+    bucket_start DATETIME NOT NULL COMMENT '时间桶起始时间',
+    sample_count INT DEFAULT 0 COMMENT '样本数',
+    cpu_avg FLOAT DEFAULT 0 COMMENT 'CPU平均使用率',
+    cpu_max FLOAT DEFAULT 0 COMMENT 'CPU最高使用率',
+    memory_avg FLOAT DEFAULT 0 COMMENT '内存平均使用率',
+    memory_max FLOAT DEFAULT 0 COMMENT '内存最高使用率',
+    network_avg FLOAT DEFAULT 0 COMMENT '网络平均使用率',
+    network_max FLOAT DEFAULT 0 COMMENT '网络最高使用率',
+    network_mbps_avg FLOAT DEFAULT 0 COMMENT '网络平均收发速率(Mbps)',
+    
+    FOREIGN KEY (load_generator_id) REFERENCES load_generators(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_resource_rollup_bucket (load_generator_id, bucket_seconds, bucket_start)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='压测机资源使用汇总表';
@@ -0,0 +1,14 @@
+-- 压测机状态变更事件：心跳、故障检测、失联兜底及Agent上线时，仅在状态实际变化时写入
+CREATE TABLE IF NOT EXISTS load_generator_status_events (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    load_generator_id INT NOT NULL,
+    from_status VARCHAR(20) COMMENT '变更前状态',
+    to_status VARCHAR(20) NOT NULL COMMENT '变更后状态',
+    source VARCHAR(30) NOT NULL COMMENT '来源: heartbeat/failure_detector/stale/agent',
+    reason VARCHAR(500) COMMENT '变更原因',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '发生时间',
+    
+    FOREIGN KEY (load_generator_id) REFERENCES load_generators(id) ON DELETE CASCADE,
+    INDEX idx_status_events_generator_time (load_generator_id, created_at),
+    INDEX idx_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='压测机状态变更事件表';
@@ -0,0 +1,8 @@
+-- 压测机硬件拓扑与系统限制
+ALTER TABLE load_generators
+    ADD COLUMN physical_cores INT COMMENT '物理核心数',
+    ADD COLUMN cpu_sockets INT COMMENT 'CPU插槽数',
+    ADD COLUMN numa_nodes INT COMMENT 'NUMA节点数',
+    ADD COLUMN nic_speed_mbps INT COMMENT '主网卡线速(Mbps)',
+    ADD COLUMN max_open_files INT COMMENT '单进程最大文件句柄数',
+    ADD COLUMN ephemeral_ports INT COMMENT '可用本地临时端口数';
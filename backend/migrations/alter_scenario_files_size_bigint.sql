@@ -0,0 +1,2 @@
+-- 场景文件支持GB级数据文件：文件大小改为BIGINT
+ALTER TABLE scenario_files MODIFY COLUMN file_size BIGINT COMMENT '文件大小(字节)';
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+wheel缓存构建脚本
+下载固定版本的Locust及其全部依赖到WHEELHOUSE_DIR，供压测机离线安装
+"""
+import argparse
+import subprocess
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="构建Locust离线wheel缓存")
+    parser.add_argument("--python-version", help="压测机Python版本，如 3.10（默认与当前解释器一致）")
+    parser.add_argument("--platform", action="append", help="目标平台标签，如 manylinux2014_x86_64，可重复指定")
+    args = parser.parse_args()
+    
+    os.makedirs(settings.WHEELHOUSE_DIR, exist_ok=True)
+    command = [
+        sys.executable, "-m", "pip", "download",
+        f"locust=={settings.LOCUST_VERSION_PIN}",
+        "--dest", settings.WHEELHOUSE_DIR
+    ]
+    if args.python_version or args.platform:
+        # 跨平台下载时只能使用二进制wheel
+        command.append("--only-binary=:all:")
+        if args.python_version:
+            command += ["--python-version", args.python_version]
+        for platform in args.platform or []:
+            command += ["--platform", platform]
+    
+    print(f"🔧 下载 locust=={settings.LOCUST_VERSION_PIN} 到 {settings.WHEELHOUSE_DIR} ...")
+    if subprocess.call(command) != 0:
+        print("❌ wheel缓存构建失败！")
+        sys.exit(1)
+    print("✅ wheel缓存构建完成！")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+场景文件内容迁移脚本
+将历史记录内联在scenario_files.file_content中的文件内容移出数据库，
+MinIO中缺失对象的文件按内容寻址重新上传。可重复执行。
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import undefer
+from app.core.database import SessionLocal
+from app.models.test_management import ScenarioFile
+from app.services.file_storage_service import FileStorageService
+
+BATCH_SIZE = 100
+
+
+def main():
+    """主函数"""
+    print("🔧 开始迁移场景文件内联内容...")
+    
+    db = SessionLocal()
+    try:
+        file_service = FileStorageService(db)
+        last_id = 0
+        offloaded = uploaded = failed = 0
+        while True:
+            # 按ID分批处理，失败的记录不会被重复读取
+            batch = db.query(ScenarioFile).options(undefer(ScenarioFile.file_content)).filter(
+                ScenarioFile.id > last_id,
+                ScenarioFile.file_content.isnot(None)
+            ).order_by(ScenarioFile.id).limit(BATCH_SIZE).all()
+            if not batch:
+                break
+            
+            for scenario_file in batch:
+                last_id = scenario_file.id
+                try:
+                    if file_service.offload_inline_content(scenario_file):
+                        uploaded += 1
+                    db.commit()
+                    offloaded += 1
+                except Exception as e:
+                    db.rollback()
+                    failed += 1
+                    print(f"⚠️  文件 {scenario_file.id} 迁移失败: {e}")
+            db.expunge_all()
+        
+        print(f"✅ 迁移完成: {offloaded} 个文件已移出数据库（其中 {uploaded} 个重新上传到MinIO），{failed} 个失败")
+        if offloaded:
+            print("💡 可执行 OPTIMIZE TABLE scenario_files 回收表空间")
+        if failed:
+            sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -116,8 +116,8 @@ const TestTaskDetail: React.FC = () => {
   // 加载脚本文件到编辑器
   const handleLoadScript = useCallback(async (file: any) => {
     try {
-      // 获取文件内容
-      const response = await fetch(`/api/v1/scenario-files/files/${file.id}/content/`);
+      // 获取文件原始内容
+      const response = await fetch(`/api/v1/scenario-files/files/${file.id}/download/`);
       if (response.ok) {
         const content = await response.text();
         setScriptContent(content);
@@ -230,13 +230,11 @@ class QuickstartUser(HttpUser):
             
             if (scriptFile) {
               console.log('Auto-loading Python script:', scriptFile);
-              // 直接设置脚本内容，因为文件内容已经在API响应中
-              setScriptContent(scriptFile.file_content || '');
-              setCurrentScriptFileName(scriptFile.file_name);
+              // 文件列表只包含元数据，内容单独加载
+              handleLoadScript(scriptFile);
             } else if (files[0]) {
               console.log('Auto-loading first file:', files[0]);
-              setScriptContent(files[0].file_content || '');
-              setCurrentScriptFileName(files[0].file_name);
+              handleLoadScript(files[0]);
             }
             
             // 自动展开第一个场景的文件列表